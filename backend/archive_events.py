@@ -0,0 +1,59 @@
+import os
+import sys
+import argparse
+
+# Add the backend directory to the path so we can import our models
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.database.database import engine
+from src.archive.archive import (
+    EVENT_HOT_MONTHS, EVENT_MONTHS_AHEAD, EVENT_ARCHIVE_DIR,
+    is_partitioned, ensure_event_partitions, cold_partitions, archive_partition,
+)
+
+def archive_events(hot_months, months_ahead, keep_detached, dry_run):
+    """
+    Maintain the monthly event partitions: create upcoming ones, then export
+    partitions older than the hot window to Parquet and detach them.
+    """
+    try:
+        with engine.begin() as connection:
+            if not is_partitioned(connection):
+                print("The event table is not partitioned (run `alembic upgrade head` on PostgreSQL first).")
+                sys.exit(1)
+
+            if dry_run:
+                cold = cold_partitions(connection, hot_months)
+            else:
+                created = ensure_event_partitions(connection, months_ahead)
+                for name in created:
+                    print(f"Created partition {name}")
+                cold = cold_partitions(connection, hot_months)
+
+        if not cold:
+            print(f"No partitions older than {hot_months} months to archive.")
+            return
+
+        print(f"Archiving {len(cold)} partition(s) to {EVENT_ARCHIVE_DIR}...")
+        for name, month in cold:
+            if dry_run:
+                print(f"- would archive {name}")
+                continue
+            result = archive_partition(engine, name, month, keep_detached=keep_detached)
+            action = "dropped" if result["dropped"] else "detached"
+            print(f"- {name}: {result['rows']} rows -> {result['path'] or 'no file (empty)'} ({action})")
+
+        print("Event archival completed successfully.")
+
+    except Exception as e:
+        print(f"Error archiving events: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive cold event partitions to Parquet.")
+    parser.add_argument("--hot-months", type=int, default=EVENT_HOT_MONTHS, help="Months of events to keep in the database")
+    parser.add_argument("--months-ahead", type=int, default=EVENT_MONTHS_AHEAD, help="Future monthly partitions to create")
+    parser.add_argument("--keep-detached", action="store_true", help="Detach archived partitions but don't drop them")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the partitions that would be archived")
+    args = parser.parse_args()
+    archive_events(args.hot_months, args.months_ahead, args.keep_detached, args.dry_run)
@@ -0,0 +1,231 @@
+"""
+Endpoint benchmark and regression suite.
+
+Drives the FastAPI app in-process through httpx's ASGI transport, so no server
+or external service is needed. By default the database is a throwaway SQLite
+file; pass --database-url to run against a locally started Postgres instead.
+The target database is dropped and re-seeded for every dataset size, so never
+point it at a database holding real data.
+
+Usage:
+    python benchmarks/run_benchmarks.py                        # run and compare against baseline (exits 2 if there is none)
+    python benchmarks/run_benchmarks.py --save-baseline        # record a new baseline
+    python benchmarks/run_benchmarks.py --sizes small,medium --iterations 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARK_DIR)
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+
+# Latency and memory metrics may get this much worse (as a fraction) before
+# the run is considered a regression. SQL statement counts are deterministic
+# and must never increase.
+DEFAULT_THRESHOLD = 0.25
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the TSCMF API endpoints in-process.")
+    parser.add_argument("--database-url", help="Database to seed and benchmark against (default: temporary SQLite file)")
+    parser.add_argument("--sizes", default="small,medium,large", help="Comma separated dataset sizes to run")
+    parser.add_argument("--iterations", type=int, default=30, help="Timed requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed requests per endpoint before measuring")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline file to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed relative slowdown before failing")
+    parser.add_argument("--output", help="Also write the raw results to this JSON file")
+    parser.add_argument("--show-app-output", action="store_true", help="Keep the app's request logging enabled")
+    return parser.parse_args()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = (len(ordered) - 1) * pct / 100
+    lower = int(index)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (index - lower)
+
+
+class StatementCounter:
+    """Counts SQL statements sent to the database through the app's engine."""
+
+    def __init__(self, engine):
+        self.count = 0
+        from sqlalchemy import event
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def build_endpoints(transaction_ids):
+    """The endpoints under test. Paths may be callables taking the request index."""
+    return {
+        "/api/events": lambda i: "/api/events",
+        "/api/transactions": lambda i: "/api/transactions",
+        "/api/transactions/{id}": lambda i: f"/api/transactions/{transaction_ids[i % len(transaction_ids)]}",
+        "/api/transactions/{id}/aggregate": lambda i: f"/api/transactions/{transaction_ids[i % len(transaction_ids)]}/aggregate",
+        "/api/dashboard/stats": lambda i: "/api/dashboard/stats",
+    }
+
+
+class EmptyResult(Exception):
+    """A list endpoint returned no rows, so its timings would measure nothing."""
+
+
+async def measure_endpoint(client, counter, path_for, iterations, warmup):
+    for i in range(warmup):
+        response = await client.get(path_for(i))
+        response.raise_for_status()
+    response = await client.get(path_for(0))
+    response.raise_for_status()
+    if response.json() == []:
+        raise EmptyResult(path_for(0))
+
+    # Timed pass: latency, throughput and statement counts
+    latencies = []
+    statements_before = counter.count
+    started = time.perf_counter()
+    for i in range(iterations):
+        request_started = time.perf_counter()
+        response = await client.get(path_for(i))
+        latencies.append((time.perf_counter() - request_started) * 1000)
+        response.raise_for_status()
+    elapsed = time.perf_counter() - started
+    statements = (counter.count - statements_before) / iterations
+
+    # Separate pass for memory, since tracing allocations skews the timings
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    response = await client.get(path_for(0))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "throughput_rps": round(iterations / elapsed, 2) if elapsed else 0.0,
+        "sql_statements": round(statements, 2),
+        "peak_memory_kb": round(peak / 1024, 1),
+        "response_bytes": len(response.content),
+    }
+
+
+async def run_size(app, engine, counter, size_name, transaction_count, args):
+    from seed import seed_database
+    import httpx
+
+    print(f"\nSeeding '{size_name}' dataset ({transaction_count} transactions)...")
+    seeded = seed_database(engine, transaction_count)
+    print(f"Seeded {seeded['entities']} entities, {seeded['transactions']} transactions, {seeded['events']} events")
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for name, path_for in build_endpoints(seeded["transaction_ids"]).items():
+            results[name] = await measure_endpoint(client, counter, path_for, args.iterations, args.warmup)
+            metrics = results[name]
+            print(f"  {name:<34} p50 {metrics['p50_ms']:>9.2f}ms  p95 {metrics['p95_ms']:>9.2f}ms  "
+                  f"p99 {metrics['p99_ms']:>9.2f}ms  {metrics['throughput_rps']:>8.1f} req/s  "
+                  f"{metrics['sql_statements']:>8.1f} stmts  {metrics['peak_memory_kb']:>10.1f} KiB")
+    return results
+
+
+def compare_to_baseline(results, baseline, threshold):
+    """Return a list of human readable regression descriptions."""
+    regressions = []
+    for size_name, endpoints in results.items():
+        for endpoint, metrics in endpoints.items():
+            previous = baseline.get(size_name, {}).get(endpoint)
+            if not previous:
+                continue
+            label = f"[{size_name}] {endpoint}"
+            for metric in ("p50_ms", "p95_ms", "p99_ms", "peak_memory_kb"):
+                if previous.get(metric) and metrics[metric] > previous[metric] * (1 + threshold):
+                    regressions.append(f"{label}: {metric} {previous[metric]} -> {metrics[metric]}")
+            if previous.get("throughput_rps") and metrics["throughput_rps"] < previous["throughput_rps"] / (1 + threshold):
+                regressions.append(f"{label}: throughput_rps {previous['throughput_rps']} -> {metrics['throughput_rps']}")
+            if metrics["sql_statements"] > previous.get("sql_statements", float("inf")):
+                regressions.append(f"{label}: sql_statements {previous['sql_statements']} -> {metrics['sql_statements']}")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    if not args.save_baseline and not os.path.exists(args.baseline):
+        # Checked before running: nothing to compare against must not read as "no regressions"
+        print(f"No baseline at {args.baseline}: record one on this machine with --save-baseline "
+              f"(timings are only comparable between runs on the same machine).")
+        sys.exit(2)
+
+    temp_dir = None
+    if args.database_url:
+        database_url = args.database_url
+    else:
+        temp_dir = tempfile.TemporaryDirectory()
+        database_url = f"sqlite:///{os.path.join(temp_dir.name, 'benchmark.db')}"
+
+    # The app reads its configuration at import time, so it must be set first
+    os.environ["DATABASE_URL"] = database_url
+    if not args.show_app_output:
+        os.environ["LOG_LEVEL"] = "WARNING"
+    sys.path.append(BACKEND_DIR)
+    from seed import DATASET_SIZES
+    from src.database.database import engine
+    from src.main import app
+
+    sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+    unknown = [size for size in sizes if size not in DATASET_SIZES]
+    if unknown:
+        print(f"Unknown dataset sizes: {', '.join(unknown)} (choose from {', '.join(DATASET_SIZES)})")
+        sys.exit(2)
+
+    print(f"Benchmarking against {engine.url.render_as_string(hide_password=True)}")
+    counter = StatementCounter(engine)
+    results = {}
+    try:
+        for size_name in sizes:
+            results[size_name] = asyncio.run(
+                run_size(app, engine, counter, size_name, DATASET_SIZES[size_name], args)
+            )
+    except EmptyResult as empty:
+        print(f"\n{empty} returned no rows from the seeded dataset: the benchmark would time an empty response.")
+        sys.exit(2)
+    finally:
+        engine.dispose()
+        if temp_dir:
+            temp_dir.cleanup()
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+        return
+
+    with open(args.baseline, "r") as file:
+        baseline = json.load(file)
+    regressions = compare_to_baseline(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%} of baseline:")
+        for regression in regressions:
+            print(f"- {regression}")
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.threshold:.0%} of baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from src.database.database import Base
+from src.models.models import Transaction, Event, Entity, Transaction_Entity, Transaction_Goods
+
+# Dataset sizes expressed as number of transactions. Every transaction gets
+# EVENTS_PER_TRANSACTION events, two related parties and two goods rows, and
+# the entity table is sized at roughly one client per ten transactions.
+DATASET_SIZES = {
+    "small": 100,
+    "medium": 1_000,
+    "large": 10_000,
+}
+
+EVENTS_PER_TRANSACTION = 3
+BATCH_SIZE = 5_000
+
+COUNTRIES = ["USA", "China", "Germany", "Singapore", "India", "Brazil", "Vietnam", "Kenya"]
+CURRENCIES = ["USD", "EUR", "CNY", "SGD", "INR"]
+RISK_RATINGS = ["AA", "A+", "A", "A-", "BBB+", "BBB", "BB"]
+CLIENT_TYPES = ["CORPORATE", "FINANCIAL_INSTITUTION", "SME"]
+PRODUCTS = [(1, "Credit Guarantee"), (2, "Revolving Credit Facility"), (3, "Unfunded Risk Participation")]
+INDUSTRIES = ["Manufacturing", "Agriculture", "Energy", "Textiles", "Electronics"]
+SOURCES = ["Email", "SWIFT", "System"]
+TYPES = ["Request", "Amendment", "Closure"]
+STATUSES = ["Pending Review", "In Progress", "Booked", "Sanction Check Failed", "Rejected"]
+GOODS = ["Industrial Machinery", "Steel Components", "Wheat", "Cotton Yarn", "Solar Panels", "Copper Wire"]
+PARTY_TYPES = ["Beneficiary", "Issuing Bank", "Supplier"]
+
+
+def _insert_batches(connection, table, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        connection.execute(insert(table), rows[start:start + BATCH_SIZE])
+
+
+def seed_database(engine, transaction_count, seed=42):
+    """
+    Drop and recreate all tables, then fill them with a deterministic synthetic
+    dataset of the requested size.
+    """
+    rng = random.Random(seed)
+    # The dataset ends now, so its events lie inside the hot window the
+    # event endpoints read (seven minutes between transactions, a few hours
+    # between a transaction's events)
+    base_date = datetime.now().replace(second=0, microsecond=0) - timedelta(minutes=transaction_count * 7, days=1)
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    entity_count = max(transaction_count // 10, 1)
+    entities = [{
+        "entity_id": entity_id,
+        "entity_name": f"Client {entity_id} Ltd.",
+        "entity_address": f"{entity_id} Trade Avenue",
+        "country": rng.choice(COUNTRIES),
+        "client_type": rng.choice(CLIENT_TYPES),
+        "risk_rating": rng.choice(RISK_RATINGS),
+        "onboard_date": base_date - timedelta(days=rng.randint(0, 720)),
+    } for entity_id in range(1, entity_count + 1)]
+
+    transactions = []
+    events = []
+    parties = []
+    goods = []
+    event_id = 1
+    for offset in range(transaction_count):
+        transaction_id = 10001 + offset
+        entity_id = rng.randint(1, entity_count)
+        created_at = base_date + timedelta(minutes=offset * 7)
+        product_id, product_name = rng.choice(PRODUCTS)
+        tenor = rng.choice([90, 120, 180, 360])
+        transactions.append({
+            "created_at": created_at,
+            "transaction_id": transaction_id,
+            "entity_id": entity_id,
+            "product_id": product_id,
+            "product_name": product_name,
+            "industry": rng.choice(INDUSTRIES),
+            "amount": float(rng.randint(50, 5_000) * 1_000),
+            "currency": rng.choice(CURRENCIES),
+            "country": rng.choice(COUNTRIES),
+            "location": "Head Office",
+            "beneficiary": f"Beneficiary {rng.randint(1, transaction_count)} GmbH",
+            "tenor": tenor,
+            "maturity_date": created_at + timedelta(days=tenor),
+            "price": round(rng.uniform(1.5, 7.5), 2),
+        })
+        for step in range(EVENTS_PER_TRANSACTION):
+            events.append({
+                "event_id": event_id,
+                "transaction_id": transaction_id,
+                "entity_id": entity_id,
+                "source": rng.choice(SOURCES),
+                "source_content": f"Message {event_id} regarding transaction {transaction_id}",
+                "type": TYPES[min(step, len(TYPES) - 1)],
+                "created_at": created_at + timedelta(hours=step),
+                "status": rng.choice(STATUSES),
+            })
+            event_id += 1
+        for party_type in rng.sample(PARTY_TYPES, 2):
+            parties.append({
+                "transaction_id": transaction_id,
+                "type": party_type,
+                "address": f"{rng.randint(1, 999)} Harbour Road",
+                "country": rng.choice(COUNTRIES),
+            })
+        for item_name in rng.sample(GOODS, 2):
+            goods.append({
+                "transaction_id": transaction_id,
+                "item_name": item_name,
+                "quantity": rng.randint(1, 500),
+                "unit": "units",
+            })
+
+    with engine.begin() as connection:
+        _insert_batches(connection, Entity.__table__, entities)
+        _insert_batches(connection, Transaction.__table__, transactions)
+        _insert_batches(connection, Event.__table__, events)
+        _insert_batches(connection, Transaction_Entity.__table__, parties)
+        _insert_batches(connection, Transaction_Goods.__table__, goods)
+
+    return {
+        "entities": len(entities),
+        "transactions": len(transactions),
+        "events": len(events),
+        "transaction_ids": [row["transaction_id"] for row in transactions],
+    }
@@ -0,0 +1,201 @@
+"""
+Server startup and throughput benchmark.
+
+Starts the API as a real server in each requested mode, measures the time
+from launch until /health reports ready, then drives it over HTTP from
+concurrent clients for a fixed duration and reports throughput and latency.
+The database is seeded first (dropped and recreated, so never point it at a
+database holding real data); by default it is a throwaway SQLite file, but the
+numbers only mean much against Postgres.
+
+Modes:
+    development  uvicorn with --reload, the container's default
+    production   gunicorn with --workers uvicorn workers (gunicorn.conf.py)
+
+Usage:
+    python benchmarks/serve_benchmark.py --database-url postgresql://...
+    python benchmarks/serve_benchmark.py --modes production --workers 4 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARK_DIR)
+
+STARTUP_TIMEOUT = 120
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure server startup time and throughput per launch mode.")
+    parser.add_argument("--database-url", help="Database to seed and serve from (default: temporary SQLite file)")
+    parser.add_argument("--size", default="medium", help="Dataset size to seed (see seed.DATASET_SIZES)")
+    parser.add_argument("--modes", default="development,production", help="Comma separated launch modes to compare")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes in production mode")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent client connections")
+    parser.add_argument("--duration", type=float, default=15, help="Seconds of load per mode")
+    parser.add_argument("--paths", default="/api/transactions/{transaction_id},/api/entities,/api/dashboard/stats",
+                        help="Comma separated paths requested in turn; {transaction_id} is filled in")
+    parser.add_argument("--output", help="Also write the results, with the settings and machine, to this JSON file")
+    return parser.parse_args()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def server_command(mode, port, workers):
+    if mode == "development":
+        return [sys.executable, "-m", "uvicorn", "src.main:app", "--host", "127.0.0.1", "--port", str(port), "--reload"]
+    if mode == "production":
+        return [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}",
+                "--workers", str(workers), "src.main:app"]
+    raise ValueError(f"Unknown mode '{mode}'")
+
+
+def wait_until_ready(base_url, process):
+    """Milliseconds until /health returns 200."""
+    started = time.perf_counter()
+    while time.perf_counter() - started < STARTUP_TIMEOUT:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return (time.perf_counter() - started) * 1000
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError(f"Server not ready after {STARTUP_TIMEOUT}s")
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+async def generate_load(base_url, paths, concurrency, duration):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def client_loop(client, offset):
+        nonlocal errors
+        index = offset
+        while time.perf_counter() < deadline:
+            path = paths[index % len(paths)]
+            index += 1
+            started = time.perf_counter()
+            try:
+                response = await client.get(path)
+                if response.status_code != 200:
+                    errors += 1
+                    continue
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client, offset) for offset in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+def run_mode(mode, database_url, paths, args):
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "DATABASE_URL": database_url, "LOG_LEVEL": "WARNING", "PYTHONPATH": BACKEND_DIR}
+    process = subprocess.Popen(
+        server_command(mode, port, args.workers), cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        startup_ms = wait_until_ready(base_url, process)
+        # A short untimed burst so every worker has served a request
+        asyncio.run(generate_load(base_url, paths, args.concurrency, 1))
+        result = asyncio.run(generate_load(base_url, paths, args.concurrency, args.duration))
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return {"startup_ms": round(startup_ms, 1), **result}
+
+
+def main():
+    args = parse_args()
+
+    temp_dir = None
+    if args.database_url:
+        database_url = args.database_url
+    else:
+        temp_dir = tempfile.TemporaryDirectory()
+        database_url = f"sqlite:///{os.path.join(temp_dir.name, 'benchmark.db')}"
+
+    os.environ["DATABASE_URL"] = database_url
+    sys.path.append(BACKEND_DIR)
+    from seed import DATASET_SIZES, seed_database
+    from src.database.database import engine
+
+    if args.size not in DATASET_SIZES:
+        print(f"Unknown dataset size: {args.size} (choose from {', '.join(DATASET_SIZES)})")
+        sys.exit(2)
+
+    try:
+        seeded = seed_database(engine, DATASET_SIZES[args.size])
+        engine.dispose()
+        print(f"Seeded {seeded['entities']} entities, {seeded['transactions']} transactions, {seeded['events']} events")
+        transaction_id = seeded["transaction_ids"][len(seeded["transaction_ids"]) // 2]
+        paths = [path.strip().format(transaction_id=transaction_id) for path in args.paths.split(",") if path.strip()]
+
+        results = {}
+        for mode in [mode.strip() for mode in args.modes.split(",") if mode.strip()]:
+            label = f"{mode} ({args.workers} workers)" if mode == "production" else mode
+            print(f"Running {label}...")
+            results[label] = run_mode(mode, database_url, paths, args)
+    finally:
+        if temp_dir:
+            temp_dir.cleanup()
+
+    print(f"\n{args.concurrency} concurrent clients, {args.duration:.0f}s per mode, paths: {', '.join(paths)}")
+    print(f"{'mode':<28} {'startup ms':>10} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for label, result in results.items():
+        print(f"{label:<28} {result['startup_ms']:>10} {result['requests_per_second']:>8} {result['p50_ms']:>8} "
+              f"{result['p95_ms']:>8} {result['p99_ms']:>8} {result['errors']:>7}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({
+                "settings": {"size": args.size, "concurrency": args.concurrency, "duration_seconds": args.duration,
+                             "paths": paths, "database": engine.url.get_backend_name()},
+                "machine": {"cpus": os.cpu_count(), "python": platform.python_version(), "platform": platform.platform()},
+                "results": results,
+            }, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
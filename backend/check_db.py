@@ -1,75 +1,91 @@
 import os
 import sys
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine, text
+import json
+import argparse
 
 # Add the backend directory to the path so we can import our models
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from src.database.database import engine
+from src.instrumentation.diagnostics import collect_diagnostics
 
-def check_database():
-    """Check database tables and content."""
+def format_bytes(size):
+    if size is None:
+        return "-"
+    for unit in ("B", "kB", "MB", "GB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+def format_ratio(ratio):
+    return "-" if ratio is None else f"{ratio:.1%}"
+
+def print_report(report):
+    database = report["database"]
+    print(f"Database {database['name']} (PostgreSQL {database['server_version']}), {format_bytes(database['size_bytes'])}")
+    print(f"Cache hit ratio: {format_ratio(database['cache_hit_ratio'])}, statistics since {database['stats_reset'] or 'cluster start'}")
+
+    print("\nTables (row counts are planner estimates unless marked exact):")
+    for table in report["tables"]:
+        if table.get("exact_rows") is not None:
+            rows = f"{table['exact_rows']} rows (exact)"
+        elif table["estimated_rows"] is not None:
+            rows = f"~{table['estimated_rows']} rows"
+        else:
+            rows = "never analyzed"
+        kind = " (partitioned)" if table["partitioned"] else (f" (partition of {table['partition_of']})" if table["partition_of"] else "")
+        print(f"- {table['name']}{kind}: {rows}, {table['dead_rows'] or 0} dead, "
+              f"table {format_bytes(table['table_bytes'])}, indexes {format_bytes(table['index_bytes'])}, "
+              f"bloat ~{format_bytes(table['estimated_bloat_bytes'])}, "
+              f"{table['seq_scans'] or 0} seq / {table['index_scans'] or 0} index scans, "
+              f"cache hits {format_ratio(table['heap_cache_hit_ratio'])}")
+
+    print("\nIndexes:")
+    for index in report["indexes"]:
+        flags = "".join((" [unused]" if index["unused"] else "", "" if index["is_valid"] else " [invalid]"))
+        print(f"- {index['name']} on {index['table']}: {format_bytes(index['size_bytes'])}, {index['idx_scan']} scans{flags}")
+
+    if report["missing_indexes"]:
+        print("\nColumns the API filters by without an index:")
+        for missing in report["missing_indexes"]:
+            print(f"- {missing['table']}.{missing['column']} ({missing['used_by']})")
+
+    for table, rows in report.get("samples", {}).items():
+        print(f"\nSample data from {table} table:")
+        for row in rows:
+            print("  " + ", ".join(f"{key}: {value}" for key, value in row.items()))
+
+    if report["warnings"]:
+        print("\nWarnings:")
+        for warning in report["warnings"]:
+            print(f"- {warning}")
+
+def check_database(exact_counts, samples, output_format):
+    """
+    Report database health from PostgreSQL's catalog and statistics views
+    without scanning tables: sizes, row estimates, bloat, index usage, missing
+    indexes and cache hit ratios.
+    """
     try:
-        # Create a session
-        Session = sessionmaker(bind=engine)
-        session = Session()
-        
-        # Check tables
-        print("Checking database tables...")
-        tables_query = text("""
-            SELECT table_name 
-            FROM information_schema.tables 
-            WHERE table_schema = 'public' 
-            ORDER BY table_name;
-        """)
-        tables = session.execute(tables_query).fetchall()
-        
-        if not tables:
-            print("No tables found in the database.")
-            return
-        
-        print("\nTables in the database:")
-        for table in tables:
-            print(f"- {table[0]}")
+        with engine.connect() as connection:
+            report = collect_diagnostics(connection, exact_counts=exact_counts, samples=samples)
+
+        if output_format == "json":
+            # One line per run, so runs can be appended to a file and compared over time
+            print(json.dumps(report, default=str))
+        else:
+            print_report(report)
 
-        # Count rows in each table
-        print("\nRow counts in each table:")
-        for table in tables:
-            table_name = table[0]
-            count_query = text(f'SELECT COUNT(*) FROM "{table_name}"')
-            count = session.execute(count_query).scalar()
-            print(f"- {table_name}: {count} rows")
-        
-        # Sample data from main tables
-        if 'entity' in [t[0] for t in tables]:
-            print("\nSample data from entity table:")
-            entity_query = text("SELECT entity_id, entity_name, country, client_type, risk_rating FROM entity LIMIT 3")
-            entities = session.execute(entity_query).fetchall()
-            for entity in entities:
-                print(f"  ID: {entity[0]}, Name: {entity[1]}, Country: {entity[2]}, Type: {entity[3]}, Rating: {entity[4]}")
-        
-        if 'transaction' in [t[0] for t in tables]:
-            print("\nSample data from transaction table:")
-            transaction_query = text("SELECT transaction_id, product_id, amount, currency, product FROM transaction LIMIT 3")
-            transactions = session.execute(transaction_query).fetchall()
-            for transaction in transactions:
-                print(f"  ID: {transaction[0]}, Product ID: {transaction[1]}, Amount: {transaction[2]}, Currency: {transaction[3]}, Product: {transaction[4]}")
-        
-        if 'event' in [t[0] for t in tables]:
-            print("\nSample data from event table:")
-            event_query = text("SELECT event_id, transaction_id, entity_id, source, type, status FROM event LIMIT 3")
-            events = session.execute(event_query).fetchall()
-            for event in events:
-                print(f"  ID: {event[0]}, Transaction ID: {event[1]}, Entity ID: {event[2]}, Source: {event[3]}, Type: {event[4]}, Status: {event[5]}")
-        
-        print("\nDatabase check completed successfully.")
-    
     except Exception as e:
-        print(f"Error checking database: {e}")
+        print(f"Error checking database: {e}", file=sys.stderr)
         sys.exit(1)
-    finally:
-        session.close()
 
 if __name__ == "__main__":
-    check_database() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Report database sizes, statistics and index health.")
+    parser.add_argument("--exact-counts", nargs="*", metavar="TABLE",
+                        help="Also COUNT(*) these tables (all tables if none are named); this scans them")
+    parser.add_argument("--samples", action="store_true", help="Include a few rows from the main tables")
+    parser.add_argument("--format", choices=("text", "json"), default="text", help="Output format")
+    args = parser.parse_args()
+    check_database(args.exact_counts, args.samples, args.format)
@@ -0,0 +1,41 @@
+import os
+import sys
+import argparse
+
+# Add the backend directory to the path so we can import our models
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.database.database import engine, SessionLocal
+from src.duplicates.detector import backfill, check_transactions
+
+def detect_duplicates(backfill_all, processes, transaction_ids):
+    """
+    Flag near-duplicate transactions: check the given transactions, or all
+    those not checked yet, against the signature index; or rebuild the index
+    for the whole book across a process pool and flag every pair in it.
+    """
+    try:
+        if backfill_all:
+            result = backfill(engine, processes=processes,
+                              progress=lambda fraction, message: print(f"[{fraction:4.0%}] {message}"))
+            print(f"Checked {result['checked']} transactions with {result['processes']} processes: "
+                  f"{result['candidates']} candidate pairs, {result['flagged']} flagged, {result['recorded']} newly recorded.")
+            return
+
+        with SessionLocal() as db:
+            result = check_transactions(db, transaction_ids)
+        for pair in result["pairs"]:
+            print(f"- transaction {pair['transaction_id']} looks like {pair['duplicate_of']} (similarity {pair['similarity']})")
+        print(f"Checked {result['checked']} transactions: {result['flagged']} flagged, {result['recorded']} newly recorded.")
+
+    except Exception as e:
+        print(f"Error detecting duplicates: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Flag near-duplicate transactions.")
+    parser.add_argument("transaction_ids", nargs="*", type=int, help="Transactions to check (default: all not checked yet)")
+    parser.add_argument("--backfill", action="store_true", help="Rebuild the index for the whole book and flag every pair")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes for --backfill (default: one per CPU)")
+    args = parser.parse_args()
+    detect_duplicates(args.backfill, args.processes, args.transaction_ids or None)
@@ -0,0 +1,53 @@
+# Gunicorn settings for SERVER_MODE=production (see the Dockerfile).
+# Gunicorn manages the processes; each worker runs the app on uvicorn.
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(2 * (os.cpu_count() or 1) + 1, 8))))
+
+# Import the app once in the master and fork the workers from it: startup
+# pays for the imports once and the workers share those pages. Nothing opens
+# a database connection at import time, so no pooled connection is shared
+# across the fork. The import does start the log writer thread, which
+# configure_logging restarts in each forked worker.
+preload_app = True
+
+# Requests like the columnar export stream for a while; restart a worker
+# stuck longer than this
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = None
+errorlog = "-"
+
+# Metrics live in each worker's memory; the workers also write them to this
+# directory, so /metrics (served by any one worker) reports them all. Set
+# here, before the app is imported and reads it.
+os.environ.setdefault("METRICS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="tscmf-metrics-"))
+
+
+def on_starting(server):
+    # Counts left by a previous server in a configured directory aren't ours
+    directory = os.environ["METRICS_MULTIPROC_DIR"]
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith(".json"):
+            os.remove(os.path.join(directory, name))
+
+
+def child_exit(server, worker):
+    from src.instrumentation.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
+
+
+def post_fork(server, worker):
+    # Belt and braces: a worker must never use a connection opened by the
+    # master. Threads started at import time don't survive the fork; the only
+    # one, the log writer, is restarted by an os.register_at_fork hook.
+    from src.database.database import engine
+    from src.database.replicas import replica_engines
+    for any_engine in (engine, *replica_engines()):
+        any_engine.dispose(close=False)
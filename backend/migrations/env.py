@@ -1,4 +1,5 @@
 import os
+import re
 import sys
 from logging.config import fileConfig
 
@@ -34,6 +35,18 @@ fileConfig(config.config_file_name)
 # for 'autogenerate' support
 target_metadata = Base.metadata
 
+
+EVENT_PARTITION = re.compile(r"^event_(\d{4}_\d{2}|default)$")
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Keep autogenerate from dropping tables and indexes that are managed by hand."""
+    if type_ == "table" and reflected and compare_to is None:
+        # Monthly event partitions (and their indexes) are created by archive_events.py
+        return not EVENT_PARTITION.match(name)
+    if type_ == "index" and reflected and compare_to is None:
+        return not name.endswith(("_tsv", "_trgm")) and not EVENT_PARTITION.match(object.table.name)
+    return True
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -56,6 +69,7 @@ def run_migrations_offline():
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -79,7 +93,8 @@ def run_migrations_online():
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata,
+            include_object=include_object
         )
 
         with context.begin_transaction():
@@ -0,0 +1,50 @@
+"""job_queue
+
+Revision ID: 23991c4d3f92
+Revises: 819a1e8c79b3
+Create Date: 2026-10-19 12:41:56.118032
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '23991c4d3f92'
+down_revision = '819a1e8c79b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'job',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=True),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('priority', sa.Integer(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('max_attempts', sa.Integer(), nullable=False),
+        sa.Column('run_after', sa.DateTime(), nullable=False),
+        sa.Column('progress', sa.Float(), nullable=True),
+        sa.Column('progress_message', sa.String(), nullable=True),
+        sa.Column('result', sa.JSON(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('locked_by', sa.String(), nullable=True),
+        sa.Column('locked_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    # Partial index: only queued jobs are scanned when workers claim work
+    op.create_index(
+        'ix_job_queued', 'job', [sa.text('priority DESC'), 'run_after', 'id'], unique=False,
+        postgresql_where=sa.text("status = 'queued'"), sqlite_where=sa.text("status = 'queued'"),
+    )
+
+
+def downgrade():
+    op.drop_index('ix_job_queued', table_name='job')
+    op.drop_table('job')
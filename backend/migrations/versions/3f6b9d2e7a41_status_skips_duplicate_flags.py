@@ -0,0 +1,31 @@
+"""status_skips_duplicate_flags
+
+Revision ID: 3f6b9d2e7a41
+Revises: e8a3c6f1b2d4
+Create Date: 2026-10-19 18:12:07.532864
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from src.transactions.status import install_status_trigger, rebuild_transaction_status
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6b9d2e7a41'
+down_revision = 'e8a3c6f1b2d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The trigger now skips near-duplicate flag events. Rebuilding restores
+    # the status of transactions a flag was recorded on.
+    bind = op.get_bind()
+    install_status_trigger(bind)
+    rebuild_transaction_status(bind)
+
+
+def downgrade():
+    # The previous trigger only differs in letting flags through
+    pass
@@ -0,0 +1,44 @@
+"""transaction_signature
+
+Revision ID: 5c2e8b41d7a9
+Revises: 7749192f0c11
+Create Date: 2026-10-19 15:41:12.206384
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c2e8b41d7a9'
+down_revision = '7749192f0c11'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'transaction_signature',
+        sa.Column('transaction_id', sa.Integer(), nullable=False),
+        sa.Column('signature', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['transaction_id'], ['transaction.transaction_id'], ),
+        sa.PrimaryKeyConstraint('transaction_id')
+    )
+    # The primary key serves candidate lookups by (band, bucket); the
+    # transaction_id index serves removing a transaction's rows
+    op.create_table(
+        'transaction_signature_bucket',
+        sa.Column('band', sa.Integer(), nullable=False),
+        sa.Column('bucket', sa.BigInteger(), nullable=False),
+        sa.Column('transaction_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['transaction_id'], ['transaction.transaction_id'], ),
+        sa.PrimaryKeyConstraint('band', 'bucket', 'transaction_id')
+    )
+    op.create_index(op.f('ix_transaction_signature_bucket_transaction_id'), 'transaction_signature_bucket', ['transaction_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_transaction_signature_bucket_transaction_id'), table_name='transaction_signature_bucket')
+    op.drop_table('transaction_signature_bucket')
+    op.drop_table('transaction_signature')
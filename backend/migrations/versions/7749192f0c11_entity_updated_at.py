@@ -0,0 +1,51 @@
+"""entity_updated_at
+
+Revision ID: 7749192f0c11
+Revises: 23991c4d3f92
+Create Date: 2026-10-19 14:02:37.504118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7749192f0c11'
+down_revision = '23991c4d3f92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    column = sa.Column('updated_at', sa.DateTime(), server_default=sa.func.current_timestamp(), nullable=False)
+    if op.get_bind().dialect.name != 'postgresql':
+        # SQLite can't add a column with a non-constant default in place
+        with op.batch_alter_table('entity', recreate='always') as batch_op:
+            batch_op.add_column(column)
+        op.create_index(op.f('ix_entity_updated_at'), 'entity', ['updated_at'], unique=False)
+        return
+
+    op.add_column('entity', column)
+    op.create_index(op.f('ix_entity_updated_at'), 'entity', ['updated_at'], unique=False)
+    # The model sets updated_at on ORM updates; the trigger also covers plain SQL ones
+    op.execute("""
+        CREATE OR REPLACE FUNCTION touch_entity_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := now();
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute(
+        "CREATE TRIGGER entity_updated_at BEFORE UPDATE ON entity "
+        "FOR EACH ROW EXECUTE FUNCTION touch_entity_updated_at()"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP TRIGGER IF EXISTS entity_updated_at ON entity")
+        op.execute("DROP FUNCTION IF EXISTS touch_entity_updated_at()")
+    op.drop_index(op.f('ix_entity_updated_at'), table_name='entity')
+    with op.batch_alter_table('entity') as batch_op:
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,30 @@
+"""event_idempotency_key
+
+Revision ID: 819a1e8c79b3
+Revises: 97dcd5aa6b8a
+Create Date: 2026-10-19 11:58:03.417530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '819a1e8c79b3'
+down_revision = '97dcd5aa6b8a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'event_idempotency_key',
+        sa.Column('idempotency_key', sa.String(), nullable=False),
+        sa.Column('event_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('idempotency_key')
+    )
+
+
+def downgrade():
+    op.drop_table('event_idempotency_key')
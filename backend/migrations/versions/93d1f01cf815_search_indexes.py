@@ -0,0 +1,59 @@
+"""search_indexes
+
+Revision ID: 93d1f01cf815
+Revises: 880595d032b3
+Create Date: 2026-10-19 09:12:41.518302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '93d1f01cf815'
+down_revision = '880595d032b3'
+branch_labels = None
+depends_on = None
+
+
+# (index name, table, indexed expression). The tsvector expressions must match
+# the ones used by src/search/search.py exactly, or the planner won't use them.
+FULL_TEXT_INDEXES = [
+    ('ix_entity_search_tsv', 'entity',
+     "to_tsvector('simple', coalesce(entity_name, '') || ' ' || coalesce(entity_address, ''))"),
+    ('ix_transaction_beneficiary_tsv', 'transaction', "to_tsvector('simple', coalesce(beneficiary, ''))"),
+    ('ix_transaction_entity_address_tsv', 'transaction_entity', "to_tsvector('simple', coalesce(address, ''))"),
+    ('ix_event_source_content_tsv', 'event', "to_tsvector('simple', coalesce(source_content, ''))"),
+]
+
+TRIGRAM_INDEXES = [
+    ('ix_entity_entity_name_trgm', 'entity', 'entity_name'),
+    ('ix_entity_entity_address_trgm', 'entity', 'entity_address'),
+    ('ix_transaction_beneficiary_trgm', 'transaction', 'beneficiary'),
+    ('ix_transaction_entity_address_trgm', 'transaction_entity', 'address'),
+    ('ix_event_source_content_trgm', 'event', 'source_content'),
+]
+
+
+def upgrade():
+    # Full-text search indexes are Postgres specific; the SQLite stand-in
+    # builds its FTS5 table at startup instead (see ensure_fts_index)
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # Build concurrently so large tables stay writable during the migration
+    with op.get_context().autocommit_block():
+        for name, table, expression in FULL_TEXT_INDEXES:
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON "{table}" USING gin ({expression})')
+        for name, table, column in TRIGRAM_INDEXES:
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON "{table}" USING gin ({column} gin_trgm_ops)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    with op.get_context().autocommit_block():
+        for name, _, _ in TRIGRAM_INDEXES + FULL_TEXT_INDEXES:
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
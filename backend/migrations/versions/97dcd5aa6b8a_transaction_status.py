@@ -0,0 +1,51 @@
+"""transaction_status
+
+Revision ID: 97dcd5aa6b8a
+Revises: bfd15de7c9b7
+Create Date: 2026-10-19 11:20:44.906215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from src.transactions.status import install_status_trigger, rebuild_transaction_status
+
+
+# revision identifiers, used by Alembic.
+revision = '97dcd5aa6b8a'
+down_revision = 'bfd15de7c9b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'transaction_status',
+        sa.Column('transaction_id', sa.Integer(), nullable=False),
+        sa.Column('event_id', sa.Integer(), nullable=True),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('type', sa.String(), nullable=True),
+        sa.Column('source', sa.String(), nullable=True),
+        sa.Column('event_created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['transaction_id'], ['transaction.transaction_id'], ),
+        sa.PrimaryKeyConstraint('transaction_id')
+    )
+    op.create_index(op.f('ix_transaction_status_status'), 'transaction_status', ['status'], unique=False)
+    op.create_index(op.f('ix_transaction_status_type'), 'transaction_status', ['type'], unique=False)
+
+    # Trigger first, so events inserted while the backfill runs aren't missed
+    # (the trigger's upsert and the backfill's agree on which event is latest)
+    bind = op.get_bind()
+    install_status_trigger(bind)
+    rebuild_transaction_status(bind)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP TRIGGER IF EXISTS event_transaction_status ON event')
+        op.execute('DROP FUNCTION IF EXISTS refresh_transaction_status()')
+    else:
+        op.execute('DROP TRIGGER IF EXISTS event_transaction_status')
+    op.drop_index(op.f('ix_transaction_status_type'), table_name='transaction_status')
+    op.drop_index(op.f('ix_transaction_status_status'), table_name='transaction_status')
+    op.drop_table('transaction_status')
@@ -0,0 +1,130 @@
+"""partition_event_by_month
+
+Revision ID: bfd15de7c9b7
+Revises: 93d1f01cf815
+Create Date: 2026-10-19 10:02:17.204861
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'bfd15de7c9b7'
+down_revision = '93d1f01cf815'
+branch_labels = None
+depends_on = None
+
+
+# Partitions created past the current month, so inserts never land in the
+# default partition before archive_events.py has run again
+MONTHS_AHEAD = 3
+
+EVENT_COLUMNS = 'event_id, transaction_id, entity_id, source, source_content, type, created_at, status'
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _create_month_partition(month):
+    end = _add_months(month, 1)
+    op.execute(
+        f"CREATE TABLE event_{month:%Y_%m} PARTITION OF event "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        op.create_index('ix_event_created_at', 'event', ['created_at'])
+        op.create_index('ix_event_transaction_id', 'event', ['transaction_id'])
+        return
+
+    bind = op.get_bind()
+
+    # Move the existing table aside, freeing up the names of its indexes
+    # (constraint names only need to be unique per table, so those can stay)
+    op.execute('DROP INDEX IF EXISTS ix_event_source_content_tsv')
+    op.execute('DROP INDEX IF EXISTS ix_event_source_content_trgm')
+    op.execute('ALTER TABLE event RENAME TO event_unpartitioned')
+    op.execute('ALTER INDEX event_pkey RENAME TO event_unpartitioned_pkey')
+
+    # The partition key has to be part of the primary key, and rows without a
+    # created_at would have no partition to go to
+    op.execute("""
+        CREATE TABLE event (
+            event_id INTEGER NOT NULL DEFAULT nextval('event_event_id_seq'),
+            transaction_id INTEGER CONSTRAINT event_transaction_id_fkey REFERENCES transaction (transaction_id),
+            entity_id INTEGER CONSTRAINT event_entity_id_fkey REFERENCES entity (entity_id),
+            source VARCHAR,
+            source_content VARCHAR,
+            type VARCHAR,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+            status VARCHAR,
+            PRIMARY KEY (event_id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute('ALTER SEQUENCE event_event_id_seq OWNED BY event.event_id')
+
+    # One partition per month from the oldest event up to a few months ahead,
+    # plus a default partition catching anything outside that range
+    oldest = bind.execute(sa.text('SELECT min(created_at) FROM event_unpartitioned')).scalar()
+    today = date.today()
+    month = date(oldest.year, oldest.month, 1) if oldest else date(today.year, today.month, 1)
+    last = _add_months(date(today.year, today.month, 1), MONTHS_AHEAD)
+    while month <= last:
+        _create_month_partition(month)
+        month = _add_months(month, 1)
+    op.execute('CREATE TABLE event_default PARTITION OF event DEFAULT')
+
+    op.execute(f"""
+        INSERT INTO event ({EVENT_COLUMNS})
+        SELECT event_id, transaction_id, entity_id, source, source_content, type,
+               coalesce(created_at, now() AT TIME ZONE 'utc'), status
+        FROM event_unpartitioned
+    """)
+    op.execute('DROP TABLE event_unpartitioned')
+    op.execute("SELECT setval('event_event_id_seq', coalesce((SELECT max(event_id) FROM event), 0) + 1, false)")
+
+    # Indexes on the parent are created on every partition, existing and future
+    op.create_index('ix_event_created_at', 'event', ['created_at'])
+    op.create_index('ix_event_transaction_id', 'event', ['transaction_id'])
+    op.execute("CREATE INDEX ix_event_source_content_tsv ON event USING gin (to_tsvector('simple', coalesce(source_content, '')))")
+    op.execute('CREATE INDEX ix_event_source_content_trgm ON event USING gin (source_content gin_trgm_ops)')
+    op.execute('ANALYZE event')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        op.drop_index('ix_event_transaction_id', table_name='event')
+        op.drop_index('ix_event_created_at', table_name='event')
+        return
+
+    op.execute('ALTER TABLE event RENAME TO event_partitioned')
+    op.execute('ALTER INDEX event_pkey RENAME TO event_partitioned_pkey')
+    op.execute('DROP INDEX ix_event_source_content_tsv')
+    op.execute('DROP INDEX ix_event_source_content_trgm')
+    op.execute('DROP INDEX ix_event_created_at')
+    op.execute('DROP INDEX ix_event_transaction_id')
+    op.execute("""
+        CREATE TABLE event (
+            event_id INTEGER NOT NULL DEFAULT nextval('event_event_id_seq'),
+            transaction_id INTEGER CONSTRAINT event_transaction_id_fkey REFERENCES transaction (transaction_id),
+            entity_id INTEGER CONSTRAINT event_entity_id_fkey REFERENCES entity (entity_id),
+            source VARCHAR,
+            source_content VARCHAR,
+            type VARCHAR,
+            created_at TIMESTAMP WITHOUT TIME ZONE,
+            status VARCHAR,
+            PRIMARY KEY (event_id)
+        )
+    """)
+    op.execute('ALTER SEQUENCE event_event_id_seq OWNED BY event.event_id')
+    op.execute(f'INSERT INTO event ({EVENT_COLUMNS}) SELECT {EVENT_COLUMNS} FROM event_partitioned')
+    op.execute('DROP TABLE event_partitioned')
+    op.execute("CREATE INDEX ix_event_source_content_tsv ON event USING gin (to_tsvector('simple', coalesce(source_content, '')))")
+    op.execute('CREATE INDEX ix_event_source_content_trgm ON event USING gin (source_content gin_trgm_ops)')
@@ -0,0 +1,31 @@
+"""job_unique_key
+
+Revision ID: e8a3c6f1b2d4
+Revises: 5c2e8b41d7a9
+Create Date: 2026-10-19 16:05:48.117392
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8a3c6f1b2d4'
+down_revision = '5c2e8b41d7a9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('job') as batch_op:
+        batch_op.add_column(sa.Column('unique_key', sa.String(), nullable=True))
+    op.create_index(
+        'ix_job_unique_key_queued', 'job', ['unique_key'], unique=True,
+        postgresql_where=sa.text("status = 'queued'"), sqlite_where=sa.text("status = 'queued'"),
+    )
+
+
+def downgrade():
+    op.drop_index('ix_job_unique_key_queued', table_name='job')
+    with op.batch_alter_table('job') as batch_op:
+        batch_op.drop_column('unique_key')
@@ -0,0 +1,27 @@
+import os
+import sys
+
+# Add the backend directory to the path so we can import our models
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.database.database import engine
+from src.transactions.status import install_status_trigger, rebuild_transaction_status
+
+def rebuild_status():
+    """
+    Recompute transaction_status from the event table and recreate the
+    trigger that maintains it, e.g. after events were loaded with the
+    trigger disabled or edited in place.
+    """
+    try:
+        with engine.begin() as connection:
+            install_status_trigger(connection)
+            count = rebuild_transaction_status(connection)
+        print(f"Rebuilt the current status of {count} transactions.")
+
+    except Exception as e:
+        print(f"Error rebuilding transaction status: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    rebuild_status()
@@ -0,0 +1,53 @@
+import os
+import sys
+import signal
+import argparse
+import multiprocessing
+
+# Add the backend directory to the path so we can import our models
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+def worker_process(index, stop):
+    # Imported here so each spawned process creates its own engine and pool
+    from src.database.database import engine
+    from src.instrumentation.log import configure_logging
+    from src.jobs.queue import DatabaseJobQueue
+    from src.jobs.worker import run_worker, worker_name
+
+    # The parent handles Ctrl+C and tells the workers to stop after their current job
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    configure_logging()
+    run_worker(DatabaseJobQueue(engine), worker_name(index), stop)
+
+def run_workers(processes):
+    """
+    Run job workers in separate processes, each claiming jobs from the job
+    table independently. SIGINT/SIGTERM let every worker finish its current
+    job before exiting.
+    """
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    workers = [context.Process(target=worker_process, args=(index, stop), name=f"job-worker-{index}") for index in range(processes)]
+    for worker in workers:
+        worker.start()
+    print(f"Started {processes} job worker(s).")
+
+    # SIGTERM is handled like Ctrl+C (setting the event from inside a signal
+    # handler could deadlock on its lock)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        pass
+    stop.set()
+    print("Stopping job workers after their current jobs...")
+    for worker in workers:
+        worker.join()
+    print("Job workers stopped.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run background job workers.")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="Worker processes to run")
+    args = parser.parse_args()
+    run_workers(args.processes)
@@ -0,0 +1,301 @@
+import asyncio
+import collections
+import json
+import math
+import os
+import time
+
+from starlette.datastructures import Headers
+from starlette.routing import Match
+
+from ..database.database import DB_MAX_OVERFLOW, DB_POOL_SIZE
+from ..instrumentation.metrics import registry
+
+# Admission control keeps a burst of expensive requests (several dashboards
+# refreshing at once) from taking every database connection and worker
+# thread, so cheap requests still get through. Every /api route belongs to a
+# cost class with its own concurrency limit and bounded wait queue; the heavy
+# routes also have a limit each. A request that finds the queue full, or
+# waits too long, is answered at once with 429 or 503 and Retry-After.
+# Limits are per worker process.
+ADMISSION_CONTROL_ENABLED = os.getenv("ADMISSION_CONTROL_ENABLED", "true").lower() == "true"
+
+# Full-table reads, scans and streams; every other /api route is "light".
+# Routes outside /api (/health, /metrics, the docs) are never limited.
+HEAVY_ROUTES = {
+    "/api/events", "/api/events-simple", "/api/transactions", "/api/dashboard/stats", "/api/search",
+    "/api/export/{dataset}", "/api/risk/stress",
+}
+
+# (concurrent requests, waiting requests, seconds a request may wait) per
+# cost class. Heavy requests get a share of the connection pool, leaving the
+# rest to light ones.
+ADMISSION_CLASSES = {
+    "heavy": (
+        int(os.getenv("ADMISSION_HEAVY_CONCURRENCY", "4")),
+        int(os.getenv("ADMISSION_HEAVY_QUEUE", "32")),
+        float(os.getenv("ADMISSION_HEAVY_TIMEOUT_SECONDS", "10")),
+    ),
+    "light": (
+        int(os.getenv("ADMISSION_LIGHT_CONCURRENCY", str(DB_POOL_SIZE + DB_MAX_OVERFLOW))),
+        int(os.getenv("ADMISSION_LIGHT_QUEUE", "128")),
+        float(os.getenv("ADMISSION_LIGHT_TIMEOUT_SECONDS", "5")),
+    ),
+}
+
+# The same for each heavy route on its own, so one of them can't take the
+# whole heavy class
+ADMISSION_ROUTE_CONCURRENCY = int(os.getenv("ADMISSION_ROUTE_CONCURRENCY", "2"))
+ADMISSION_ROUTE_QUEUE = int(os.getenv("ADMISSION_ROUTE_QUEUE", "16"))
+
+# GET routes whose identical in-flight requests share one response
+REQUEST_COALESCING_ENABLED = os.getenv("REQUEST_COALESCING_ENABLED", "true").lower() == "true"
+COALESCED_ROUTES = HEAVY_ROUTES - {"/api/export/{dataset}", "/api/risk/stress"}
+
+# Bounds of the Retry-After estimate, in seconds
+RETRY_AFTER_MIN_SECONDS = 1
+RETRY_AFTER_MAX_SECONDS = 60
+
+ADMISSION_SHED = registry.counter(
+    "tscmf_admission_shed_total", "Requests rejected by admission control", ("route", "cost_class", "reason")
+)
+ADMISSION_QUEUED = registry.counter(
+    "tscmf_admission_queued_total", "Requests that waited for admission", ("route", "cost_class")
+)
+ADMISSION_WAIT = registry.histogram(
+    "tscmf_admission_wait_seconds", "Time requests waited for admission", ("cost_class",)
+)
+ADMISSION_IN_FLIGHT = registry.gauge(
+    "tscmf_admission_in_flight", "Admitted requests being served", ("limiter",)
+)
+ADMISSION_WAITING = registry.gauge(
+    "tscmf_admission_waiting", "Requests waiting for admission", ("limiter",)
+)
+COALESCED_REQUESTS = registry.counter(
+    "tscmf_http_coalesced_requests_total", "Requests answered with an identical in-flight request's response", ("route",)
+)
+
+
+class Rejected(Exception):
+    """No slot: the wait queue is full or the wait timed out."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Limiter:
+    """
+    At most `limit` holders, at most `queue_size` waiters served in arrival
+    order, each waiting at most `timeout` seconds. Runs on the event loop, so
+    it needs no locks.
+    """
+
+    def __init__(self, name, limit, queue_size, timeout):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.waiters = collections.deque()
+        # Moving average of how long a slot is held, for Retry-After
+        self.average_hold = None
+
+    def retry_after(self):
+        """Seconds until the queue has likely drained enough for a retry to get in."""
+        if self.average_hold is None:
+            return RETRY_AFTER_MIN_SECONDS
+        estimate = math.ceil(self.average_hold * (len(self.waiters) + 1) / self.limit)
+        return min(max(estimate, RETRY_AFTER_MIN_SECONDS), RETRY_AFTER_MAX_SECONDS)
+
+    def _update_gauges(self):
+        ADMISSION_IN_FLIGHT.set(self.active, limiter=self.name)
+        ADMISSION_WAITING.set(len(self.waiters), limiter=self.name)
+
+    async def acquire(self):
+        """Take a slot, waiting in line if need be. Returns the seconds waited."""
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            self._update_gauges()
+            return 0.0
+        if len(self.waiters) >= self.queue_size:
+            raise Rejected("queue_full", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        self._update_gauges()
+        started = time.monotonic()
+        try:
+            # The releasing request hands its slot over by resolving the future
+            await asyncio.wait_for(waiter, self.timeout)
+        except asyncio.TimeoutError:
+            raise Rejected("timeout", self.retry_after())
+        except asyncio.CancelledError:
+            # The client went away, maybe just after being handed a slot
+            if waiter.done() and not waiter.cancelled():
+                self._hand_over()
+            raise
+        finally:
+            if not waiter.done() or waiter.cancelled():
+                try:
+                    self.waiters.remove(waiter)
+                except ValueError:
+                    pass
+            self._update_gauges()
+        return time.monotonic() - started
+
+    def release(self, held):
+        self.average_hold = held if self.average_hold is None else 0.8 * self.average_hold + 0.2 * held
+        self._hand_over()
+
+    def _hand_over(self):
+        """Give a freed slot to the first waiter still waiting, if any."""
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._update_gauges()
+                return
+        self.active -= 1
+        self._update_gauges()
+
+
+def route_template(scope):
+    """
+    The path template of the route a request will be routed to, or None.
+    Middleware runs before routing, so this matches the app's routes itself.
+    """
+    app = scope.get("app")
+    for route in getattr(app, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", None)
+    return None
+
+
+def cost_class(route):
+    if route is None or not route.startswith("/api/"):
+        return None
+    return "heavy" if route in HEAVY_ROUTES else "light"
+
+
+async def _send_rejection(send, status_code, detail, retry_after):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionControlMiddleware:
+    """
+    ASGI middleware admitting each /api request once its route (heavy routes
+    only) and its cost class have a free slot. Answers 429 when the route's
+    own limiter turns the request away (queue full or wait timed out) and
+    503 when the class's does, both with Retry-After.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.classes = {name: Limiter(name, *settings) for name, settings in ADMISSION_CLASSES.items()}
+        self.routes = {
+            route: Limiter(route, ADMISSION_ROUTE_CONCURRENCY, ADMISSION_ROUTE_QUEUE, ADMISSION_CLASSES["heavy"][2])
+            for route in HEAVY_ROUTES
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = route_template(scope)
+        name = cost_class(route)
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        held = []
+        waited = 0.0
+        try:
+            for limiter, status_code in ((self.routes.get(route), 429), (self.classes[name], 503)):
+                if limiter is None:
+                    continue
+                try:
+                    waited += await limiter.acquire()
+                except Rejected as e:
+                    ADMISSION_SHED.inc(route=route, cost_class=name, reason=e.reason)
+                    detail = f"Too many concurrent requests for {route}" if status_code == 429 \
+                        else "The server is at capacity"
+                    await _send_rejection(send, status_code, f"{detail}, retry in {e.retry_after}s", e.retry_after)
+                    return
+                held.append((limiter, time.monotonic()))
+
+            ADMISSION_WAIT.observe(waited, cost_class=name)
+            if waited:
+                ADMISSION_QUEUED.inc(route=route, cost_class=name)
+            await self.app(scope, receive, send)
+        finally:
+            for limiter, acquired in reversed(held):
+                limiter.release(time.monotonic() - acquired)
+
+
+class RequestCoalescingMiddleware:
+    """
+    ASGI middleware collapsing identical GET requests (same path, query and
+    read-routing headers) to COALESCED_ROUTES that arrive while one of them is
+    being served: only the first runs, and the others get a copy of its
+    response without taking an admission slot or a database connection.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.in_flight = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        route = route_template(scope)
+        headers = Headers(scope=scope)
+        if route not in COALESCED_ROUTES or "x-profile" in headers:
+            await self.app(scope, receive, send)
+            return
+
+        # Cookies and X-Last-Write can send a read to the primary, so they're part of the key
+        key = (scope["path"], scope["query_string"], headers.get("cookie"), headers.get("x-last-write"))
+        leader = self.in_flight.get(key)
+        if leader is not None:
+            messages = await asyncio.shield(leader)
+            if messages is not None:
+                COALESCED_REQUESTS.inc(route=route)
+                for message in messages:
+                    await send(dict(message, headers=list(message["headers"])) if "headers" in message else message)
+                return
+            # The first request failed without a response; serve this one on its own
+            await self.app(scope, receive, send)
+            return
+
+        leader = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = leader
+        messages = []
+        complete = False
+
+        async def send_and_record(message):
+            nonlocal complete
+            # Copied before sending: the middleware further out edits the headers in place
+            messages.append(dict(message, headers=list(message["headers"])) if "headers" in message else message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                complete = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_record)
+        finally:
+            del self.in_flight[key]
+            leader.set_result(messages if complete else None)
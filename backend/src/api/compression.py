@@ -0,0 +1,137 @@
+import os
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from ..instrumentation.metrics import registry
+
+try:
+    import brotli
+except ImportError:  # optional; without it only gzip is offered
+    brotli = None
+
+# Responses smaller than this are sent as they are: compressing them saves
+# little and costs CPU on both ends
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+
+# Levels tuned for on-the-fly compression of JSON: most of the size reduction
+# of the maximum levels at a fraction of their CPU time
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# Only text-like content is worth compressing (Parquet is compressed already)
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+RESPONSE_BYTES = registry.counter(
+    "tscmf_http_response_bytes_total", "Response body bytes, before and after compression", ("encoding", "stage")
+)
+
+
+class _Gzip:
+    name = "gzip"
+
+    def __init__(self):
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data, final):
+        output = self._compressor.compress(data)
+        return output + (self._compressor.flush() if final else self._compressor.flush(zlib.Z_SYNC_FLUSH))
+
+
+class _Brotli:
+    name = "br"
+
+    def __init__(self):
+        self._compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY)
+
+    def compress(self, data, final):
+        output = self._compressor.process(data)
+        return output + (self._compressor.finish() if final else self._compressor.flush())
+
+
+def negotiate_encoding(accept_encoding):
+    """The preferred encoding the client accepts ("br", "gzip"), or None."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    wildcard = accepted.get("*", 0.0)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best = max(candidates, key=lambda name: accepted.get(name, wildcard))
+    return best if accepted.get(best, wildcard) > 0 else None
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing text and JSON responses of at least
+    COMPRESSION_MINIMUM_SIZE bytes with brotli or gzip, whichever the client
+    prefers (brotli on ties). Streaming responses are compressed chunk by chunk.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESSION_MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows whether to compress
+                start = message
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                passthrough = "content-encoding" in headers or not content_type.startswith(COMPRESSIBLE_TYPES)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                if start is not None:
+                    await send(start)
+                    start = None
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    start = None
+                    await send(message)
+                    return
+                compressor = _Brotli() if encoding == "br" else _Gzip()
+                headers = MutableHeaders(raw=start["headers"])
+                headers["Content-Encoding"] = compressor.name
+                headers.add_vary_header("Accept-Encoding")
+                if "content-length" in headers:
+                    del headers["Content-Length"]
+
+            compressed = compressor.compress(body, final=not more_body)
+            RESPONSE_BYTES.inc(len(body), encoding=compressor.name, stage="uncompressed")
+            RESPONSE_BYTES.inc(len(compressed), encoding=compressor.name, stage="compressed")
+            if start is not None:
+                if not more_body:
+                    MutableHeaders(raw=start["headers"])["Content-Length"] = str(len(compressed))
+                await send(start)
+                start = None
+            await send({**message, "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
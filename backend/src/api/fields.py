@@ -0,0 +1,181 @@
+from ..archive.archive import EVENT_COLUMNS
+from ..models.models import Event, Transaction, Transaction_Status
+
+
+class FieldError(ValueError):
+    """Unknown field in a fields= parameter."""
+
+
+class Field:
+    """A response field: the SQL columns it needs and how it's formatted from a result row."""
+
+    __slots__ = ("columns", "format")
+
+    def __init__(self, columns, format):
+        self.columns = columns
+        self.format = format
+
+
+class RowContext:
+    """What formatters need besides the row: entities come from the in-memory reference data."""
+
+    __slots__ = ("reference", "db")
+
+    def __init__(self, reference, db):
+        self.reference = reference
+        self.db = db
+
+    def entity(self, entity_id):
+        return self.reference.entity(entity_id, self.db) if entity_id else None
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def _float(value):
+    return float(value) if value else None
+
+
+def _entity_info(entity, fields):
+    return {field: getattr(entity, field) for field in fields} if entity else {}
+
+
+def _attribute(key, format=None, columns=()):
+    """A field that is one attribute of the row, as it is or through `format`."""
+    if format is None:
+        return Field(list(columns), lambda row, context: getattr(row, key))
+    return Field(list(columns), lambda row, context: format(getattr(row, key)))
+
+
+def _column(column, format=None):
+    return _attribute(column.key, format, [column])
+
+
+def parse_fields(resource, fields, available):
+    """
+    The field names requested in a comma separated `fields` parameter, in the
+    order of `available`; all of them when `fields` is empty.
+    """
+    requested = {name.strip() for name in (fields or "").split(",") if name.strip()}
+    if not requested:
+        return list(available)
+    unknown = sorted(requested - set(available))
+    if unknown:
+        raise FieldError(f"Unknown fields for {resource}: {', '.join(unknown)} (choose from {', '.join(available)})")
+    return [name for name in available if name in requested]
+
+
+def select_columns(available, names):
+    """The distinct SQL columns the named fields read, for the SELECT list."""
+    columns = {}
+    for name in names:
+        for column in available[name].columns:
+            columns.setdefault(column.key, column)
+    return list(columns.values())
+
+
+def format_rows(rows, available, names, context):
+    fields = [(name, available[name].format) for name in names]
+    return [{name: format(row, context) for name, format in fields} for row in rows]
+
+
+# /api/transactions. The status fields come from the transaction_status
+# projection; `client_*` and `entity` from the in-memory reference data.
+_status_row = Transaction_Status.transaction_id.label("status_transaction_id")
+
+TRANSACTION_STATUS_FIELDS = {"status", "type", "source", "last_event_at"}
+
+TRANSACTION_FIELDS = {
+    "id": Field([Transaction.transaction_id], lambda row, context: row.transaction_id),
+    "transaction_id": _column(Transaction.transaction_id),
+    "entity_id": _column(Transaction.entity_id),
+    "product_id": _column(Transaction.product_id),
+    "product_name": _column(Transaction.product_name),
+    "industry": _column(Transaction.industry),
+    "amount": _column(Transaction.amount, _float),
+    "currency": _column(Transaction.currency),
+    "country": _column(Transaction.country),
+    "location": _column(Transaction.location),
+    "beneficiary": _column(Transaction.beneficiary),
+    "tenor": _column(Transaction.tenor),
+    "maturity_date": _column(Transaction.maturity_date, _isoformat),
+    "price": _column(Transaction.price, _float),
+    "created_at": _column(Transaction.created_at, _isoformat),
+    "reference_number": Field([Transaction.transaction_id], lambda row, context: f"TXN-{row.transaction_id:05d}"),
+    "client_id": Field([Transaction.entity_id], lambda row, context: row.entity_id),
+    "client_name": Field([Transaction.entity_id], lambda row, context:
+                         getattr(context.entity(row.entity_id), "entity_name", "")),
+    "client_type": Field([Transaction.entity_id], lambda row, context:
+                         getattr(context.entity(row.entity_id), "client_type", "")),
+    "status": Field([_status_row, Transaction_Status.status.label("status")], lambda row, context:
+                    row.status if row.status_transaction_id is not None else "Pending Review"),
+    "type": Field([_status_row, Transaction_Status.type.label("type")], lambda row, context:
+                  row.type if row.status_transaction_id is not None else "Request"),
+    "source": Field([_status_row, Transaction_Status.source.label("source")], lambda row, context:
+                    row.source if row.status_transaction_id is not None else "System"),
+    "last_event_at": Field([Transaction_Status.event_created_at.label("last_event_at")], lambda row, context:
+                           _isoformat(row.last_event_at)),
+    "entity": Field([Transaction.entity_id], lambda row, context: _entity_info(
+        context.entity(row.entity_id), ("entity_id", "entity_name", "country", "client_type", "risk_rating"))),
+}
+
+# /api/events. `transaction` reads the transaction's columns through an outer
+# join, labelled transaction_<column>; `entity` comes from the reference data.
+_EVENT_TRANSACTION_COLUMNS = ("transaction_id", "product_name", "industry", "amount", "currency", "country",
+                              "location", "beneficiary", "maturity_date")
+
+
+def _event_transaction(row, context):
+    if row.transaction_transaction_id is None:
+        return {}
+    info = {column: getattr(row, f"transaction_{column}") for column in _EVENT_TRANSACTION_COLUMNS}
+    info["amount"] = _float(info["amount"])
+    info["maturity_date"] = _isoformat(info["maturity_date"])
+    return info
+
+
+EVENT_FIELDS = {
+    "event_id": _column(Event.event_id),
+    "transaction_id": _column(Event.transaction_id),
+    "entity_id": _column(Event.entity_id),
+    "source": _column(Event.source),
+    "source_content": _column(Event.source_content),
+    "type": _column(Event.type),
+    "created_at": _column(Event.created_at, _isoformat),
+    "status": _column(Event.status),
+    "transaction": Field(
+        [getattr(Transaction, column).label(f"transaction_{column}") for column in _EVENT_TRANSACTION_COLUMNS],
+        _event_transaction,
+    ),
+    "entity": Field([Event.entity_id], lambda row, context: _entity_info(
+        context.entity(row.entity_id), ("entity_name", "entity_address", "country", "client_type", "risk_rating"))),
+}
+
+
+def archived_event_columns(names):
+    """The archive's columns the named event fields read (transaction_id too for `transaction`)."""
+    columns = [column.key for column in select_columns(EVENT_FIELDS, names) if column.key in EVENT_COLUMNS]
+    if "transaction" in names and "transaction_id" not in columns:
+        columns.append("transaction_id")
+    return columns
+
+
+def archived_event_row(event):
+    """An archived event (see load_archived_events) with its transaction flattened like an events query row."""
+    transaction = event.transaction
+    for column in _EVENT_TRANSACTION_COLUMNS:
+        setattr(event, f"transaction_{column}", getattr(transaction, column) if transaction is not None else None)
+    return event
+
+
+# /api/entities, served entirely from the in-memory reference data
+ENTITY_FIELDS = {
+    "entity_id": _attribute("entity_id"),
+    "entity_name": _attribute("entity_name"),
+    "entity_address": _attribute("entity_address"),
+    "country": _attribute("country"),
+    "client_type": _attribute("client_type"),
+    "risk_rating": _attribute("risk_rating"),
+    "onboard_date": _attribute("onboard_date", _isoformat),
+}
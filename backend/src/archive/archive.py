@@ -0,0 +1,297 @@
+import glob
+import os
+import re
+from collections import Counter
+from datetime import date
+from types import SimpleNamespace
+
+from sqlalchemy import text
+
+from ..models.models import Transaction
+
+# Where archived partitions are written, one Parquet file per month
+ARCHIVE_DIR = os.getenv(
+    "ARCHIVE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "archive"),
+)
+EVENT_ARCHIVE_DIR = os.path.join(ARCHIVE_DIR, "event")
+
+# Months of events kept in the database (the current month included). Older
+# monthly partitions are exported and detached by archive_events.py.
+EVENT_HOT_MONTHS = int(os.getenv("EVENT_HOT_MONTHS", "12"))
+
+# Monthly partitions created ahead of the current month
+EVENT_MONTHS_AHEAD = 3
+
+# Rows fetched from the server-side cursor per Parquet record batch
+EXPORT_BATCH_SIZE = 50_000
+
+# Ids per IN (...) lookup when attaching transactions and entities to archived events
+LOOKUP_BATCH_SIZE = 5_000
+
+EVENT_COLUMNS = ["event_id", "transaction_id", "entity_id", "source", "source_content", "type", "created_at", "status"]
+
+_PARTITION_NAME = re.compile(r"^event_(\d{4})_(\d{2})$")
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("pyarrow is required for event archival (pip install pyarrow)")
+    return pyarrow, pyarrow.parquet
+
+
+def _event_schema(pa):
+    return pa.schema([
+        ("event_id", pa.int64()),
+        ("transaction_id", pa.int64()),
+        ("entity_id", pa.int64()),
+        ("source", pa.string()),
+        ("source_content", pa.string()),
+        ("type", pa.string()),
+        ("created_at", pa.timestamp("us")),
+        ("status", pa.string()),
+    ])
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def partition_name(month):
+    return f"event_{month:%Y_%m}"
+
+
+def list_event_partitions(connection):
+    """Monthly partitions currently attached to `event`, oldest first, as (name, month) pairs."""
+    rows = connection.execute(text("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = 'event'
+    """)).fetchall()
+    partitions = []
+    for (name,) in rows:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def is_partitioned(connection):
+    if connection.dialect.name != "postgresql":
+        return False
+    return bool(connection.execute(text(
+        "SELECT 1 FROM pg_partitioned_table JOIN pg_class ON pg_class.oid = partrelid WHERE relname = 'event'"
+    )).scalar())
+
+
+def partition_bounds(month):
+    """The FOR VALUES clause of a month's partition: its first day up to, not including, the next month's."""
+    return f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+
+
+def create_event_partition(connection, month):
+    """
+    Create a month's partition. Rows of that month already in event_default
+    (inserted while the partition was missing) would make a plain CREATE
+    TABLE ... PARTITION OF fail, so they're moved into the new table before
+    it is attached. event_default is locked against inserts until the
+    caller's transaction ends, so none can arrive in between.
+    """
+    name = partition_name(month)
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+    connection.execute(text("LOCK TABLE event_default IN EXCLUSIVE MODE"))
+    stranded = connection.execute(
+        text("SELECT 1 FROM event_default WHERE created_at >= :start AND created_at < :end LIMIT 1"),
+        {"start": start, "end": end},
+    ).scalar()
+    if not stranded:
+        connection.execute(text(f"CREATE TABLE {name} PARTITION OF event {partition_bounds(month)}"))
+        return 0
+
+    columns = ", ".join(EVENT_COLUMNS)
+    connection.execute(text(f"CREATE TABLE {name} (LIKE event INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    moved = connection.execute(text(f"""
+        WITH moved AS (
+            DELETE FROM event_default WHERE created_at >= :start AND created_at < :end
+            RETURNING {columns}
+        )
+        INSERT INTO {name} ({columns}) SELECT {columns} FROM moved
+    """), {"start": start, "end": end}).rowcount
+    # Attaching builds the partition's copies of the parent's indexes and
+    # foreign keys
+    connection.execute(text(f"ALTER TABLE event ATTACH PARTITION {name} {partition_bounds(month)}"))
+    return moved
+
+
+def ensure_event_partitions(connection, months_ahead=EVENT_MONTHS_AHEAD, today=None):
+    """Create any missing monthly partitions from the current month up to `months_ahead` months out."""
+    today = today or date.today()
+    existing = {name for name, _ in list_event_partitions(connection)}
+    created = []
+    month = month_start(today)
+    for _ in range(months_ahead + 1):
+        name = partition_name(month)
+        if name not in existing:
+            create_event_partition(connection, month)
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def hot_window_start(hot_months=EVENT_HOT_MONTHS, today=None):
+    """The first day of the oldest month kept in the database; events before it are archived (or due to be)."""
+    return add_months(month_start(today or date.today()), -(hot_months - 1))
+
+
+# Whether `event` is partitioned, looked up once per process (see event_read_window)
+_event_partitioned = None
+
+
+def event_read_window(connection, include_history=False):
+    """
+    The earliest created_at the event list and stats endpoints read by default:
+    the hot window's start where `event` is partitioned (and its older months
+    get archived), else None. SQLite and unpartitioned databases never archive
+    anything, so there every event is read.
+    """
+    global _event_partitioned
+    if include_history:
+        return None
+    if _event_partitioned is None:
+        _event_partitioned = is_partitioned(connection)
+    return hot_window_start() if _event_partitioned else None
+
+
+def cold_partitions(connection, hot_months=EVENT_HOT_MONTHS, today=None):
+    """Partitions whose whole month lies before the hot window."""
+    cutoff = hot_window_start(hot_months, today)
+    return [(name, month) for name, month in list_event_partitions(connection) if month < cutoff]
+
+
+def archive_path(month):
+    return os.path.join(EVENT_ARCHIVE_DIR, f"{month:%Y_%m}.parquet")
+
+
+def export_partition(connection, name, path):
+    """
+    Stream a partition into a Parquet file through a server-side cursor, one
+    record batch at a time, and return the number of rows written. The file
+    is written under a temporary name and moved into place when complete.
+    """
+    pa, pq = _require_pyarrow()
+    schema = _event_schema(pa)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+
+    rows_written = 0
+    result = connection.execute(
+        text(f"SELECT {', '.join(EVENT_COLUMNS)} FROM {name} ORDER BY created_at, event_id"),
+        execution_options={"stream_results": True},
+    )
+    with pq.ParquetWriter(temp_path, schema, compression="zstd") as writer:
+        for rows in result.partitions(EXPORT_BATCH_SIZE):
+            columns = list(zip(*rows))
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            rows_written += len(rows)
+    os.replace(temp_path, path)
+    return rows_written
+
+
+def archive_partition(engine, name, month, keep_detached=False):
+    """
+    Export one cold partition to Parquet, then detach it from `event` and
+    (unless keep_detached) drop it. Everything happens in one transaction that
+    holds a write lock on the partition, so no row can arrive between the
+    export and the detach.
+    """
+    path = None
+    with engine.begin() as connection:
+        connection.execute(text(f"LOCK TABLE {name} IN SHARE MODE"))
+        expected = connection.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+        written = 0
+        if expected:
+            path = archive_path(month)
+            written = export_partition(connection, name, path)
+        if written != expected:
+            raise RuntimeError(f"Exported {written} rows from {name} but it holds {expected}; not detaching")
+        connection.execute(text(f"ALTER TABLE event DETACH PARTITION {name}"))
+        if not keep_detached:
+            connection.execute(text(f"DROP TABLE {name}"))
+    return {"partition": name, "rows": written, "path": path, "dropped": not keep_detached}
+
+
+def archived_event_files():
+    """Archived monthly Parquet files, newest first."""
+    return sorted(glob.glob(os.path.join(EVENT_ARCHIVE_DIR, "*.parquet")), reverse=True)
+
+
+def read_archived_events(columns=EVENT_COLUMNS):
+    """
+    Events from the Parquet archive as dicts of `columns`, newest first, one
+    list per row group (at most EXPORT_BATCH_SIZE rows), so only one row group
+    is held in memory at a time. export_partition writes each file oldest
+    first, so reading its row groups and their rows backwards is newest first.
+    Archived months are all older than the partitions still in the database,
+    so these rows can be appended after a database result ordered by
+    created_at descending.
+    """
+    files = archived_event_files()
+    if not files:
+        return
+    _, pq = _require_pyarrow()
+    for path in files:
+        parquet_file = pq.ParquetFile(path)
+        for index in reversed(range(parquet_file.num_row_groups)):
+            rows = parquet_file.read_row_group(index, columns=list(columns)).to_pylist()
+            rows.reverse()
+            yield rows
+
+
+def _load_by_ids(db, model, key, ids):
+    found = {}
+    ids = list(ids)
+    for start in range(0, len(ids), LOOKUP_BATCH_SIZE):
+        for row in db.query(model).filter(key.in_(ids[start:start + LOOKUP_BATCH_SIZE])):
+            found[getattr(row, key.key)] = row
+    return found
+
+
+def load_archived_events(db, columns=EVENT_COLUMNS, with_transactions=False):
+    """
+    Archived events shaped like Event rows (attribute access), so they can be
+    formatted by the same code as events still in the database. Yields them
+    in batches as read_archived_events does; with_transactions attaches each
+    event's `transaction` (looked up per batch, so `columns` must include
+    transaction_id).
+    """
+    for rows in read_archived_events(columns):
+        transactions = {}
+        if with_transactions:
+            transactions = _load_by_ids(
+                db, Transaction, Transaction.transaction_id,
+                {row["transaction_id"] for row in rows if row["transaction_id"]},
+            )
+        yield [
+            SimpleNamespace(**row, transaction=transactions.get(row.get("transaction_id"))) for row in rows
+        ]
+
+
+def archived_event_status_counts():
+    """Archived events per status, reading only the status column."""
+    counts = Counter()
+    for rows in read_archived_events(["status"]):
+        counts.update(row["status"] for row in rows)
+    return counts
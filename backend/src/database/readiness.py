@@ -0,0 +1,47 @@
+import logging
+import time
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+
+def ping(connection):
+    connection.execute(text("SELECT 1"))
+
+
+def wait_for_database(engine, timeout, interval=0.5):
+    """
+    Poll the database until it accepts connections, instead of sleeping for a
+    fixed time. Returns the seconds waited; re-raises the last connection
+    error once `timeout` seconds have passed.
+    """
+    started = time.monotonic()
+    while True:
+        try:
+            with engine.connect() as connection:
+                ping(connection)
+            return time.monotonic() - started
+        except Exception:
+            if time.monotonic() - started + interval > timeout:
+                raise
+            time.sleep(interval)
+
+
+def warm_pool(engine, connections):
+    """
+    Open `connections` pooled connections up front, so the first requests
+    don't each pay for a new connection (TCP, authentication, backend start).
+    Returns the number opened.
+    """
+    opened = []
+    try:
+        for _ in range(connections):
+            connection = engine.connect()
+            opened.append(connection)
+            ping(connection)
+    finally:
+        # Closing returns them to the pool, where they stay open
+        for connection in opened:
+            connection.close()
+    return len(opened)
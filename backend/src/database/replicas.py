@@ -0,0 +1,279 @@
+import itertools
+import logging
+import os
+import threading
+import time
+
+from fastapi import Request
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import sessionmaker
+from starlette.datastructures import MutableHeaders
+
+from .database import DB_MAX_OVERFLOW, DB_POOL_SIZE, DB_SESSIONS, SessionLocal, engine as primary_engine
+from .readiness import ping
+from ..instrumentation.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Comma separated read replica URLs. Read-only endpoints take their session
+# from get_read_db, which spreads them over these round-robin; with none
+# configured every read goes to the primary as before.
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+
+# How often a replica's health and lag are re-checked, and how long one that
+# failed is left out before it's tried again
+REPLICA_CHECK_INTERVAL_SECONDS = float(os.getenv("REPLICA_CHECK_INTERVAL_SECONDS", "5"))
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+# So an unreachable replica fails over quickly instead of hanging the request
+REPLICA_CONNECT_TIMEOUT_SECONDS = int(os.getenv("REPLICA_CONNECT_TIMEOUT_SECONDS", "2"))
+
+# Replicas further behind the primary than this don't serve reads
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "30"))
+
+# Read-your-writes: for this long after a client's own write (or the replica's
+# last measured lag, if longer) its reads go to the primary. 0 turns it off.
+READ_AFTER_WRITE_SECONDS = float(os.getenv("READ_AFTER_WRITE_SECONDS", "5"))
+
+# The client's last write time is returned in this header and cookie after
+# every successful write; browsers send the cookie back, other clients echo
+# the header.
+LAST_WRITE_HEADER = "X-Last-Write"
+LAST_WRITE_COOKIE = "tscmf_last_write"
+_SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+# POSTs that only read (the body is just too big for a query string)
+_READ_ONLY_PATHS = {"/api/risk/stress"}
+
+# Replay lag in seconds; 0 on a primary, and on a replica that has replayed
+# everything it received (the last replayed commit can be old on an idle primary)
+_REPLICA_LAG = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+REPLICA_HEALTHY = registry.gauge(
+    "tscmf_db_replica_healthy", "1 if the read replica passed its last health check", ("replica",)
+)
+REPLICA_LAG = registry.gauge(
+    "tscmf_db_replica_lag_seconds", "Replay lag of the read replica at its last health check", ("replica",)
+)
+
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+
+def _replica_name(url):
+    url = make_url(url)
+    if url.host:
+        return f"{url.host}:{url.port or ''}/{url.database or ''}"
+    return url.database or url.render_as_string(hide_password=True)
+
+
+def _create_replica_engine(url):
+    if make_url(url).get_backend_name() == "sqlite":
+        return create_engine(url)
+    return create_engine(
+        url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_pre_ping=True,
+        connect_args={"connect_timeout": REPLICA_CONNECT_TIMEOUT_SECONDS},
+    )
+
+
+class Replica:
+    """A read replica with the result of its last health and lag check."""
+
+    def __init__(self, url, engine=None):
+        self.name = _replica_name(url)
+        self.engine = engine if engine is not None else _create_replica_engine(url)
+        self.healthy = True
+        self.lag = 0.0
+        self.checked_at = None
+        self._lock = threading.Lock()
+
+    def mark_down(self, error):
+        if self.healthy:
+            logger.warning("Read replica %s is unavailable: %s", self.name, error)
+        self.healthy = False
+        self.checked_at = time.monotonic()
+        REPLICA_HEALTHY.set(0, replica=self.name)
+
+    def check(self):
+        try:
+            with self.engine.connect() as connection:
+                if connection.dialect.name == "postgresql":
+                    lag = float(connection.execute(_REPLICA_LAG).scalar() or 0)
+                else:
+                    ping(connection)
+                    lag = 0.0
+        except Exception as e:
+            self.mark_down(e)
+            return
+        if not self.healthy:
+            logger.info("Read replica %s is available again", self.name)
+        self.healthy = True
+        self.lag = lag
+        self.checked_at = time.monotonic()
+        REPLICA_HEALTHY.set(1, replica=self.name)
+        REPLICA_LAG.set(lag, replica=self.name)
+
+    def available(self):
+        """
+        Whether the replica can serve reads, re-checking it when the last
+        check is due. One thread checks while the others go by the last result.
+        """
+        interval = REPLICA_CHECK_INTERVAL_SECONDS if self.healthy else REPLICA_RETRY_SECONDS
+        if (self.checked_at is None or time.monotonic() - self.checked_at >= interval) \
+                and self._lock.acquire(blocking=False):
+            try:
+                self.check()
+            finally:
+                self._lock.release()
+        return self.healthy and self.lag <= REPLICA_MAX_LAG_SECONDS
+
+
+class ReadRouter:
+    """Picks the database a read-only session goes to: the replicas in turn, else the primary."""
+
+    def __init__(self, replicas):
+        self.replicas = replicas
+        self._turn = itertools.count()
+
+    def candidates(self, last_write=None):
+        """
+        The replicas that may serve this read, starting with the next one in
+        round-robin order, and why the primary would serve it if none can.
+        """
+        if not self.replicas:
+            return [], "no_replica"
+        start = next(self._turn)
+        ordered = [self.replicas[(start + i) % len(self.replicas)] for i in range(len(self.replicas))]
+        since_write = time.time() - last_write if last_write is not None else None
+        usable = []
+        reason = "replica_unavailable"
+        for replica in ordered:
+            if not replica.available():
+                continue
+            if since_write is not None and since_write < max(READ_AFTER_WRITE_SECONDS, replica.lag):
+                reason = "read_after_write"
+                continue
+            usable.append(replica)
+        return usable, reason
+
+    def _route(self, last_write, open_replica, open_primary):
+        replicas, reason = self.candidates(last_write)
+        for replica in replicas:
+            try:
+                # Connect now, so a replica that went away fails over here
+                # rather than failing the request
+                opened = open_replica(replica)
+            except DBAPIError as e:
+                replica.mark_down(e)
+                reason = "replica_unavailable"
+                continue
+            DB_SESSIONS.inc(target="replica", reason="read")
+            return opened
+        DB_SESSIONS.inc(target="primary", reason=reason)
+        return open_primary()
+
+    def session(self, last_write=None):
+        return self._route(last_write, _replica_session, SessionLocal)
+
+    def engine(self, last_write=None):
+        """The engine to read from, for code that opens its own connections."""
+        return self._route(last_write, _reachable_engine, lambda: primary_engine)
+
+
+def _replica_session(replica):
+    db = ReadSessionLocal(bind=replica.engine)
+    try:
+        db.connection()
+    except DBAPIError:
+        db.close()
+        raise
+    return db
+
+
+def _reachable_engine(replica):
+    # The connection goes back to the pool for the caller to check out again
+    with replica.engine.connect():
+        pass
+    return replica.engine
+
+
+router = ReadRouter([Replica(url) for url in DATABASE_REPLICA_URLS])
+
+
+def replica_engines():
+    return [replica.engine for replica in router.replicas]
+
+
+def _last_write(request):
+    """The client's last write time (epoch seconds) from the header or cookie, the later of the two."""
+    if READ_AFTER_WRITE_SECONDS <= 0:
+        return None
+    latest = None
+    for value in (request.headers.get(LAST_WRITE_HEADER), request.cookies.get(LAST_WRITE_COOKIE)):
+        try:
+            written = float(value)
+        except (TypeError, ValueError):
+            continue
+        latest = written if latest is None else max(latest, written)
+    return latest
+
+
+# Dependency for read-only endpoints: a session on a replica when one can
+# serve the request, on the primary otherwise
+def get_read_db(request: Request):
+    db = router.session(_last_write(request))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def read_engine(request, since=None):
+    """
+    The engine for a read-only endpoint that opens its own connections
+    (exports, the stress-testing book), chosen like get_read_db's session.
+    `since` is the time of a further write the read must see.
+    """
+    last_write = _last_write(request)
+    if since is not None:
+        last_write = since if last_write is None else max(last_write, since)
+    return router.engine(last_write)
+
+
+class LastWriteMiddleware:
+    """
+    ASGI middleware stamping successful writes (anything but GET, HEAD,
+    OPTIONS and _READ_ONLY_PATHS that didn't fail) with the time, in the X-Last-Write header and
+    a cookie, so the client's next reads can be sent to the primary.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in _SAFE_METHODS or scope["path"] in _READ_ONLY_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_last_write(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                written = f"{time.time():.3f}"
+                # Past the longest window in which the time can still route a read
+                max_age = int(READ_AFTER_WRITE_SECONDS + REPLICA_MAX_LAG_SECONDS) + 1
+                headers = MutableHeaders(scope=message)
+                headers.append(LAST_WRITE_HEADER, written)
+                headers.append("Set-Cookie", f"{LAST_WRITE_COOKIE}={written}; Max-Age={max_age}; Path=/; SameSite=Lax")
+            await send(message)
+
+        await self.app(scope, receive, send_with_last_write)
+
+
+def install_read_routing(app):
+    """Add the middleware recording clients' writes. No-op without replicas or with READ_AFTER_WRITE_SECONDS=0."""
+    if router.replicas and READ_AFTER_WRITE_SECONDS > 0:
+        app.add_middleware(LastWriteMiddleware)
@@ -0,0 +1,508 @@
+import hashlib
+import math
+import os
+import re
+import unicodedata
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import delete, insert, select, tuple_
+
+from ..database.database import SessionLocal
+from ..ingest.events import ingest_events, LOOKUP_BATCH_SIZE, MAX_BATCH_SIZE
+from ..models.models import Event, Transaction, Transaction_Goods, Transaction_Signature, Transaction_Signature_Bucket
+from ..transactions.status import DUPLICATE_EVENT_TYPE
+
+# The same trade submitted twice (say by email and by SWIFT) differs in small
+# ways, so transactions are compared on the Jaccard similarity of normalized
+# features (beneficiary, goods, currency, amount, maturity, client, product),
+# estimated from MinHash signatures. Locality-sensitive hashing splits each
+# signature into bands; only transactions sharing a band's bucket are compared,
+# so a lookup reads a few index entries instead of the whole book.
+#
+# With 20 bands of 5 rows, a pair with similarity 0.7 becomes a candidate 97%
+# of the time and one with similarity 0.3 about 5%. Changing these, or the
+# features, needs a backfill.
+SIGNATURE_BANDS = 20
+SIGNATURE_ROWS_PER_BAND = 5
+SIGNATURE_LENGTH = SIGNATURE_BANDS * SIGNATURE_ROWS_PER_BAND
+
+# A candidate is flagged when its estimated similarity reaches the threshold
+# and it agrees on what a resubmission of the same trade can't change: the
+# currency, the amount and maturity within the tolerances, and any numbers in
+# the beneficiary's name ("Unit 5", "No. 3")
+DUPLICATE_SIMILARITY_THRESHOLD = float(os.getenv("DUPLICATE_SIMILARITY_THRESHOLD", "0.6"))
+DUPLICATE_AMOUNT_TOLERANCE = float(os.getenv("DUPLICATE_AMOUNT_TOLERANCE", "0.05"))
+DUPLICATE_MATURITY_TOLERANCE_DAYS = int(os.getenv("DUPLICATE_MATURITY_TOLERANCE_DAYS", "7"))
+
+# Queue a check for the transactions new events refer to, when the events are
+# the first seen for them (see POST /api/events/batch)
+DUPLICATE_CHECK_ON_INGEST = os.getenv("DUPLICATE_CHECK_ON_INGEST", "true").lower() == "true"
+
+# Buckets with more transactions than this (a template trade booked over and
+# over) would make every pair in them a candidate; they're left out
+MAX_BUCKET_SIZE = 500
+
+# Transactions per process pool task in a backfill
+BACKFILL_CHUNK_SIZE = 5_000
+
+# A flagged pair is recorded as an event on each of its transactions. The
+# status trigger skips events of DUPLICATE_EVENT_TYPE, so a flag never
+# replaces a transaction's status.
+DUPLICATE_EVENT_SOURCE = "System"
+DUPLICATE_EVENT_STATUS = "Possible Duplicate"
+
+# The pair and similarity a flag's source_content states
+_FLAG_CONTENT = re.compile(
+    r"^(?:Possible duplicate of transaction (?P<older>\d+)|Transaction (?P<newer>\d+) is a possible duplicate)"
+    r".*\(similarity (?P<similarity>[0-9.]+)\)$"
+)
+
+# The ingest-time checks share one queued job: a batch arriving while it's
+# still queued adds its transactions to it
+CHECK_JOB_KEY = "detect_duplicates:ingest"
+
+# Dropped from beneficiary names, which are otherwise written out in full or not
+_LEGAL_SUFFIXES = {
+    "ag", "bv", "co", "company", "corp", "corporation", "gmbh", "inc", "incorporated", "llc", "limited",
+    "ltd", "nv", "plc", "pte", "sa", "spa", "srl",
+}
+
+# Amounts and maturities are bucketed on two offset grids, so values closer
+# than half a bucket always share a feature: amounts within about 5%,
+# maturities within a few days
+_AMOUNT_BUCKET_WIDTH = 2 * math.log(1.05)
+_MATURITY_BUCKET_DAYS = 7
+
+# Multiply-shift hashing, the high 32 bits of a * x + b (mod 2**64) for a
+# random odd a, stands in for the random permutations. The seed is fixed so
+# every process, now and later, computes the same signatures.
+_rng = np.random.default_rng(20261019)
+_A = _rng.integers(0, np.iinfo(np.uint64).max, SIGNATURE_LENGTH, dtype=np.uint64, endpoint=True) | np.uint64(1)
+_B = _rng.integers(0, np.iinfo(np.uint64).max, SIGNATURE_LENGTH, dtype=np.uint64, endpoint=True)
+
+
+class TransactionRecord:
+    """The attributes a transaction is compared on."""
+
+    __slots__ = ("transaction_id", "entity_id", "product_id", "beneficiary", "amount", "currency",
+                 "maturity_date", "goods")
+
+    def __init__(self, transaction_id, entity_id, product_id, beneficiary, amount, currency, maturity_date, goods=()):
+        self.transaction_id = transaction_id
+        self.entity_id = entity_id
+        self.product_id = product_id
+        self.beneficiary = beneficiary
+        self.amount = amount
+        self.currency = currency
+        self.maturity_date = maturity_date
+        self.goods = list(goods)
+
+
+def _words(value):
+    value = unicodedata.normalize("NFKD", str(value)).encode("ascii", "ignore").decode().lower()
+    return re.findall(r"[a-z0-9]+", value)
+
+
+def _name_words(name):
+    """Words of a name, dotted abbreviations joined ("G.m.b.H." is "gmbh") and legal suffixes dropped."""
+    value = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode().lower()
+    value = re.sub(r"\b([a-z])\.(?=[a-z]\b)", r"\1", value)
+    return [word for word in re.findall(r"[a-z0-9]+", value) if word not in _LEGAL_SUFFIXES]
+
+
+def _offset_buckets(prefix, value, width):
+    position = value / width
+    return {f"{prefix}:{math.floor(position)}", f"{prefix}~:{math.floor(position + 0.5)}"}
+
+
+def features(record):
+    """
+    The normalized features of a transaction: character trigrams of the
+    beneficiary's name (numbers in it as whole words, legal suffixes dropped),
+    the words of its goods, and its currency, amount, maturity, client and product.
+    """
+    result = set()
+    words = _name_words(record.beneficiary or "")
+    letters = " ".join(word for word in words if not word.isdigit())
+    result.update(f"b:{letters[i:i + 3]}" for i in range(len(letters) - 2))
+    result.update(f"b#{word}" for word in words if word.isdigit())
+    for name in record.goods:
+        result.update(f"g:{word}" for word in _words(name or ""))
+    if record.currency:
+        result.add(f"c:{record.currency.upper()}")
+    if record.amount:
+        result |= _offset_buckets("a", math.log(abs(record.amount)), _AMOUNT_BUCKET_WIDTH)
+    if record.maturity_date:
+        result |= _offset_buckets("m", record.maturity_date.toordinal(), _MATURITY_BUCKET_DAYS)
+    if record.entity_id is not None:
+        result.add(f"e:{record.entity_id}")
+    if record.product_id is not None:
+        result.add(f"p:{record.product_id}")
+    return result
+
+
+def minhash(feature_set):
+    """MinHash signature of a feature set (SIGNATURE_LENGTH uint32 values), or None for an empty set."""
+    if not feature_set:
+        return None
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little") for feature in feature_set),
+        dtype=np.uint64, count=len(feature_set),
+    )
+    # uint64 arithmetic wraps, which is the mod 2**64
+    permuted = (_A[:, None] * hashes[None, :] + _B[:, None]) >> np.uint64(32)
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def band_buckets(signature):
+    """(band, bucket) for each band of a signature; the bucket is a signed 64-bit hash of the band's rows."""
+    data = signature.astype("<u4")
+    return [
+        (band, int.from_bytes(hashlib.blake2b(
+            data[band * SIGNATURE_ROWS_PER_BAND:(band + 1) * SIGNATURE_ROWS_PER_BAND].tobytes(), digest_size=8,
+        ).digest(), "little", signed=True))
+        for band in range(SIGNATURE_BANDS)
+    ]
+
+
+def similarity(first, second):
+    """Estimated Jaccard similarity of the feature sets behind two signatures."""
+    return float(np.mean(first == second))
+
+
+def _amounts_match(first, second):
+    if not first or not second:
+        return not first and not second
+    return abs(first - second) <= DUPLICATE_AMOUNT_TOLERANCE * max(abs(first), abs(second))
+
+
+def _maturities_match(first, second):
+    if first is None or second is None:
+        return first is None and second is None
+    return abs((first - second).days) <= DUPLICATE_MATURITY_TOLERANCE_DAYS
+
+
+def _name_numbers(name):
+    return {word for word in _name_words(name or "") if word.isdigit()}
+
+
+def is_duplicate(first, second, estimated_similarity):
+    """Whether a candidate pair of records is flagged, given their estimated similarity."""
+    return (
+        estimated_similarity >= DUPLICATE_SIMILARITY_THRESHOLD
+        and (first.currency or "").upper() == (second.currency or "").upper()
+        and _amounts_match(first.amount, second.amount)
+        and _maturities_match(first.maturity_date, second.maturity_date)
+        and _name_numbers(first.beneficiary) == _name_numbers(second.beneficiary)
+    )
+
+
+def compute_signatures(records):
+    """(transaction_id, signature bytes or None) per record. Runs in the backfill's worker processes."""
+    result = []
+    for record in records:
+        signature = minhash(features(record))
+        result.append((record.transaction_id, signature.astype("<u4").tobytes() if signature is not None else None))
+    return result
+
+
+def _signature_from_bytes(data):
+    return np.frombuffer(data, dtype="<u4")
+
+
+def _chunks(items, size=LOOKUP_BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _load_records(connection, transaction_ids=None):
+    """Transaction records with their goods; all transactions when `transaction_ids` is None."""
+    columns = (Transaction.transaction_id, Transaction.entity_id, Transaction.product_id, Transaction.beneficiary,
+               Transaction.amount, Transaction.currency, Transaction.maturity_date)
+    if transaction_ids is None:
+        records = {row[0]: TransactionRecord(*row) for row in connection.execute(select(*columns))}
+        goods = connection.execute(select(Transaction_Goods.transaction_id, Transaction_Goods.item_name))
+    else:
+        records = {}
+        for chunk in _chunks(transaction_ids):
+            records.update((row[0], TransactionRecord(*row))
+                           for row in connection.execute(select(*columns).where(Transaction.transaction_id.in_(chunk))))
+        goods = []
+        for chunk in _chunks(records):
+            goods += connection.execute(
+                select(Transaction_Goods.transaction_id, Transaction_Goods.item_name)
+                .where(Transaction_Goods.transaction_id.in_(chunk))
+            ).all()
+    for transaction_id, item_name in goods:
+        if transaction_id in records:
+            records[transaction_id].goods.append(item_name)
+    return records
+
+
+def unchecked_transactions(connection, transaction_ids):
+    """The given transaction ids that aren't in the signature index yet."""
+    checked = set()
+    for chunk in _chunks(transaction_ids):
+        checked.update(connection.execute(
+            select(Transaction_Signature.transaction_id).where(Transaction_Signature.transaction_id.in_(chunk))
+        ).scalars())
+    return set(transaction_ids) - checked
+
+
+def _insert_ignoring_conflicts(connection, table, rows, returning):
+    """Multi-row INSERT skipping rows whose primary key exists; returns the `returning` values of those inserted."""
+    # A Session (check_transactions) or a Connection (backfill)
+    dialect = connection.get_bind().dialect if hasattr(connection, "get_bind") else connection.dialect
+    if dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    statement = dialect_insert(table).on_conflict_do_nothing().returning(returning)
+    inserted = []
+    for chunk in _chunks(rows):
+        inserted += connection.execute(statement.values(chunk)).scalars().all()
+    return inserted
+
+
+def _store_signatures(connection, signatures, now):
+    """
+    Add signatures ({transaction_id: bytes or None}) and their buckets to the
+    index, skipping transactions already in it (a concurrent check may have
+    added them). Returns the transaction ids added.
+    """
+    signature_rows = [{"transaction_id": transaction_id, "signature": data or b"", "created_at": now}
+                      for transaction_id, data in signatures.items()]
+    added = set(_insert_ignoring_conflicts(
+        connection, Transaction_Signature.__table__, signature_rows, Transaction_Signature.transaction_id,
+    ))
+    bucket_rows = [
+        {"band": band, "bucket": bucket, "transaction_id": transaction_id}
+        for transaction_id, data in signatures.items() if data and transaction_id in added
+        for band, bucket in band_buckets(_signature_from_bytes(data))
+    ]
+    _insert_ignoring_conflicts(
+        connection, Transaction_Signature_Bucket.__table__, bucket_rows, Transaction_Signature_Bucket.transaction_id,
+    )
+    return added
+
+
+def _duplicate_events(newer, older, estimated_similarity):
+    """The flag events of a pair: one on the newer transaction, naming the older, and one the other way round."""
+    pair = f"duplicate:{older.transaction_id}:{newer.transaction_id}"
+    event = {"source": DUPLICATE_EVENT_SOURCE, "type": DUPLICATE_EVENT_TYPE, "status": DUPLICATE_EVENT_STATUS}
+    return [{
+        **event,
+        "transaction_id": newer.transaction_id,
+        "entity_id": newer.entity_id,
+        "source_content": f"Possible duplicate of transaction {older.transaction_id} "
+                          f"(similarity {estimated_similarity:.2f})",
+        # One event per pair however often it's found
+        "idempotency_key": pair,
+    }, {
+        **event,
+        "transaction_id": older.transaction_id,
+        "entity_id": older.entity_id,
+        "source_content": f"Transaction {newer.transaction_id} is a possible duplicate of this one "
+                          f"(similarity {estimated_similarity:.2f})",
+        "idempotency_key": f"{pair}:older",
+    }]
+
+
+def _record_pairs(db, pairs):
+    """Record flagged pairs (newer, older, similarity) as events. Returns the number not recorded before."""
+    recorded = 0
+    for chunk in _chunks(pairs, MAX_BATCH_SIZE // 2):
+        results = ingest_events(db, [event for newer, older, score in chunk
+                                     for event in _duplicate_events(newer, older, score)])
+        # The event on the newer transaction comes first
+        recorded += sum(result["status"] == "inserted" for result in results[::2])
+    return recorded
+
+
+def duplicates_of(connection, transaction_id):
+    """
+    The flagged pairs a transaction is in, as the newer or the older one, from
+    its flag events (those archived with its older events aren't listed).
+    """
+    rows = connection.execute(
+        select(Event.source_content, Event.created_at)
+        .where(Event.transaction_id == transaction_id, Event.type == DUPLICATE_EVENT_TYPE)
+        .order_by(Event.created_at, Event.event_id)
+    )
+    flags = []
+    for content, created_at in rows:
+        match = _FLAG_CONTENT.match(content or "")
+        if match is None:
+            continue
+        if match["older"]:
+            pair = {"transaction_id": transaction_id, "duplicate_of": int(match["older"])}
+        else:
+            pair = {"transaction_id": int(match["newer"]), "duplicate_of": transaction_id}
+        flags.append({**pair, "similarity": float(match["similarity"]),
+                      "flagged_at": created_at.isoformat() if created_at else None})
+    return flags
+
+
+def _merge_transaction_ids(queued, payload):
+    return {"transaction_ids": sorted(set(queued["transaction_ids"]) | set(payload["transaction_ids"]))}
+
+
+def queue_check(job_queue, transaction_ids):
+    """Queue a detect_duplicates job for the transactions, adding them to the one already queued if any."""
+    return job_queue.enqueue(
+        "detect_duplicates", {"transaction_ids": sorted(transaction_ids)},
+        unique_key=CHECK_JOB_KEY, merge=_merge_transaction_ids,
+    )
+
+
+def _pair_result(newer, older, score):
+    return {"transaction_id": newer.transaction_id, "duplicate_of": older.transaction_id,
+            "similarity": round(score, 3)}
+
+
+def check_transactions(db, transaction_ids=None):
+    """
+    Add transactions to the signature index and flag those that nearly
+    duplicate a transaction already in it (or another one being added).
+    `transaction_ids` defaults to every transaction not in the index yet;
+    transactions already in it are skipped. Each lookup reads only the
+    buckets of the transaction's bands.
+    """
+    if transaction_ids is None:
+        transaction_ids = db.execute(
+            select(Transaction.transaction_id)
+            .outerjoin(Transaction_Signature, Transaction_Signature.transaction_id == Transaction.transaction_id)
+            .where(Transaction_Signature.transaction_id.is_(None))
+        ).scalars().all()
+    new_records = _load_records(db, unchecked_transactions(db, transaction_ids))
+    if not new_records:
+        return {"checked": 0, "flagged": 0, "recorded": 0, "pairs": []}
+
+    now = datetime.utcnow()
+    signatures = dict(compute_signatures(new_records.values()))
+    # Transactions another check got to first are left to it
+    added = _store_signatures(db, signatures, now)
+    signatures = {transaction_id: data for transaction_id, data in signatures.items() if transaction_id in added}
+    new_records = {transaction_id: new_records[transaction_id] for transaction_id in added}
+
+    # Everything sharing a bucket with a new transaction, the new ones included
+    keys = {key for data in signatures.values() if data for key in band_buckets(_signature_from_bytes(data))}
+    members = defaultdict(set)
+    for chunk in _chunks(keys, LOOKUP_BATCH_SIZE // 2):
+        rows = db.execute(
+            select(Transaction_Signature_Bucket.band, Transaction_Signature_Bucket.bucket,
+                   Transaction_Signature_Bucket.transaction_id)
+            .where(tuple_(Transaction_Signature_Bucket.band, Transaction_Signature_Bucket.bucket).in_(chunk))
+        )
+        for band, bucket, transaction_id in rows:
+            members[(band, bucket)].add(transaction_id)
+
+    candidates = set()
+    for transaction_id, data in signatures.items():
+        if not data:
+            continue
+        for key in band_buckets(_signature_from_bytes(data)):
+            if len(members[key]) <= MAX_BUCKET_SIZE:
+                candidates.update((min(transaction_id, other), max(transaction_id, other))
+                                  for other in members[key] if other != transaction_id)
+
+    known = {transaction_id for pair in candidates for transaction_id in pair} - set(new_records)
+    records = {**_load_records(db, known), **new_records}
+    for chunk in _chunks(known):
+        signatures.update(db.execute(
+            select(Transaction_Signature.transaction_id, Transaction_Signature.signature)
+            .where(Transaction_Signature.transaction_id.in_(chunk))
+        ).tuples().all())
+
+    flagged = []
+    for older_id, newer_id in sorted(candidates):
+        older, newer = records.get(older_id), records.get(newer_id)
+        if older is None or newer is None:
+            continue
+        score = similarity(_signature_from_bytes(signatures[older_id]), _signature_from_bytes(signatures[newer_id]))
+        if is_duplicate(newer, older, score):
+            flagged.append((newer, older, score))
+
+    # ingest_events commits, with the index rows added above
+    recorded = _record_pairs(db, flagged)
+    db.commit()
+    return {
+        "checked": len(new_records),
+        "flagged": len(flagged),
+        "recorded": recorded,
+        "pairs": [_pair_result(newer, older, score) for newer, older, score in flagged],
+    }
+
+
+def backfill(engine, processes=None, progress=None):
+    """
+    Rebuild the signature index for the whole book, computing signatures
+    across `processes` worker processes (default: one per CPU), then flag
+    every near-duplicate pair in it. Pairs flagged before aren't recorded twice.
+    `progress(fraction, message)` is called as the work advances.
+    """
+    report = progress or (lambda fraction, message: None)
+    processes = processes or os.cpu_count() or 1
+
+    with engine.connect() as connection:
+        records = _load_records(connection)
+    chunks = list(_chunks(records.values(), BACKFILL_CHUNK_SIZE))
+    report(0.0, f"Computing signatures of {len(records)} transactions")
+
+    signatures = {}
+    if processes > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for done, computed in enumerate(pool.map(compute_signatures, chunks), start=1):
+                signatures.update(computed)
+                report(0.6 * done / len(chunks), f"Computed {len(signatures)} of {len(records)} signatures")
+    else:
+        for done, chunk in enumerate(chunks, start=1):
+            signatures.update(compute_signatures(chunk))
+            report(0.6 * done / len(chunks), f"Computed {len(signatures)} of {len(records)} signatures")
+
+    # Replaced in one transaction, so ingest-time checks see the old index or the new one
+    report(0.6, "Writing the signature index")
+    with engine.begin() as connection:
+        connection.execute(delete(Transaction_Signature_Bucket.__table__))
+        connection.execute(delete(Transaction_Signature.__table__))
+        _store_signatures(connection, signatures, datetime.utcnow())
+
+    report(0.8, "Comparing candidate pairs")
+    ids = [transaction_id for transaction_id, data in signatures.items() if data]
+    position = {transaction_id: index for index, transaction_id in enumerate(ids)}
+    matrix = np.stack([_signature_from_bytes(signatures[transaction_id]) for transaction_id in ids]) if ids \
+        else np.empty((0, SIGNATURE_LENGTH), dtype=np.uint32)
+
+    buckets = defaultdict(list)
+    for transaction_id in ids:
+        for key in band_buckets(matrix[position[transaction_id]]):
+            buckets[key].append(position[transaction_id])
+    candidates = set()
+    for members in buckets.values():
+        if 1 < len(members) <= MAX_BUCKET_SIZE:
+            candidates.update((members[i], members[j]) for i in range(len(members)) for j in range(i + 1, len(members)))
+
+    flagged = []
+    if candidates:
+        pairs = np.array(sorted(candidates))
+        scores = (matrix[pairs[:, 0]] == matrix[pairs[:, 1]]).mean(axis=1)
+        for (first, second), score in zip(pairs[scores >= DUPLICATE_SIMILARITY_THRESHOLD],
+                                          scores[scores >= DUPLICATE_SIMILARITY_THRESHOLD]):
+            older, newer = sorted((records[ids[first]], records[ids[second]]), key=lambda record: record.transaction_id)
+            if is_duplicate(newer, older, float(score)):
+                flagged.append((newer, older, float(score)))
+
+    report(0.9, f"Recording {len(flagged)} flagged pairs")
+    with SessionLocal(bind=engine) as db:
+        recorded = _record_pairs(db, flagged)
+    return {
+        "checked": len(records),
+        "candidates": len(candidates),
+        "flagged": len(flagged),
+        "recorded": recorded,
+        "processes": processes,
+    }
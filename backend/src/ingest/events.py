@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+from sqlalchemy import insert, select, update, bindparam
+
+from ..models.models import Event, Entity, Transaction, Event_Idempotency_Key
+
+# Events accepted per POST /api/events/batch call
+MAX_BATCH_SIZE = 10_000
+
+# Ids per IN (...) lookup when checking references and existing keys
+LOOKUP_BATCH_SIZE = 5_000
+
+# An event sent with neither an idempotency_key nor a created_at is only a
+# duplicate of an identical one ingested less than this long ago: long enough
+# to cover a client's retries, short enough that the same event legitimately
+# sent again later (a status going A -> B -> A) is stored. 0 turns
+# deduplication off for such events.
+CONTENT_KEY_WINDOW_SECONDS = float(os.getenv("EVENT_CONTENT_KEY_WINDOW_SECONDS", "600"))
+
+
+class EventIn(BaseModel):
+    """One event in a batch. created_at defaults to the time of ingestion."""
+
+    model_config = ConfigDict(extra="forbid")
+
+    transaction_id: Optional[int] = None
+    entity_id: Optional[int] = None
+    source: Optional[str] = Field(None, max_length=255)
+    source_content: Optional[str] = None
+    type: Optional[str] = Field(None, max_length=255)
+    status: Optional[str] = Field(None, max_length=255)
+    created_at: Optional[datetime] = None
+    idempotency_key: Optional[str] = Field(None, min_length=1, max_length=255)
+
+    @field_validator("created_at")
+    @classmethod
+    def naive_utc(cls, value):
+        # event.created_at is a timestamp without time zone holding UTC
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+
+def content_key(event):
+    """
+    Idempotency key for events sent without one: a hash of the event's
+    content. created_at only counts when the client supplied it, so a retry
+    of an event stamped at ingestion still matches; such keys only hold for
+    CONTENT_KEY_WINDOW_SECONDS (see expiring_key).
+    """
+    content = [
+        event.transaction_id, event.entity_id, event.source, event.source_content,
+        event.type, event.status, event.created_at.isoformat() if event.created_at else None,
+    ]
+    return "sha256:" + hashlib.sha256(json.dumps(content).encode()).hexdigest()
+
+
+def expiring_key(event):
+    """Whether the event's key is one that expires after CONTENT_KEY_WINDOW_SECONDS."""
+    return event.idempotency_key is None and event.created_at is None
+
+
+def _existing_ids(db, key, ids):
+    found = set()
+    ids = list(ids)
+    for start in range(0, len(ids), LOOKUP_BATCH_SIZE):
+        found.update(db.execute(select(key).where(key.in_(ids[start:start + LOOKUP_BATCH_SIZE]))).scalars())
+    return found
+
+
+def _existing_keys(db, keys):
+    found = {}
+    keys = list(keys)
+    for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+        rows = db.execute(
+            select(Event_Idempotency_Key.idempotency_key, Event_Idempotency_Key.event_id)
+            .where(Event_Idempotency_Key.idempotency_key.in_(keys[start:start + LOOKUP_BATCH_SIZE]))
+        )
+        found.update(rows.tuples().all())
+    return found
+
+
+def _claim_keys(db, keys, now, expiring=()):
+    """
+    Insert the keys, skipping any that already exist, and return the ones
+    this call inserted. A concurrent batch holding one of the same keys blocks
+    on the primary key until it commits, so each key is claimed exactly once.
+    Keys in `expiring` are also taken over when their existing row is older
+    than CONTENT_KEY_WINDOW_SECONDS.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    table = Event_Idempotency_Key.__table__
+    keep = dialect_insert(table).on_conflict_do_nothing(index_elements=["idempotency_key"])
+    take_over = dialect_insert(table)
+    take_over = take_over.on_conflict_do_update(
+        index_elements=["idempotency_key"],
+        set_={"created_at": take_over.excluded.created_at, "event_id": None},
+        where=table.c.created_at < now - timedelta(seconds=CONTENT_KEY_WINDOW_SECONDS),
+    )
+    claimed = set()
+    for statement, group in (
+        (keep, [key for key in keys if key not in expiring]),
+        (take_over, [key for key in keys if key in expiring]),
+    ):
+        statement = statement.returning(table.c.idempotency_key)
+        for start in range(0, len(group), LOOKUP_BATCH_SIZE):
+            rows = [{"idempotency_key": key, "created_at": now} for key in group[start:start + LOOKUP_BATCH_SIZE]]
+            claimed.update(db.execute(statement.values(rows)).scalars())
+    return claimed
+
+
+def ingest_events(db, items):
+    """
+    Validate and insert a batch of raw event dicts in one transaction.
+
+    Returns one result per item, in order: "inserted" with the new event_id,
+    "duplicate" with the event_id stored under the same idempotency key
+    (earlier in this batch or in an earlier call), or "rejected" with the
+    validation errors. Rows are written with multi-row INSERTs, never one
+    statement per event.
+    """
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        try:
+            event = EventIn.model_validate(item)
+        except ValidationError as e:
+            results[index] = {"index": index, "status": "rejected", "errors": [
+                {"field": ".".join(str(part) for part in error["loc"]), "message": error["msg"]}
+                for error in e.errors()
+            ]}
+            continue
+        valid.append((index, event))
+
+    # References are checked with one IN query per table rather than left to
+    # the foreign keys, which would fail the whole batch on the first bad row
+    transaction_ids = _existing_ids(
+        db, Transaction.transaction_id, {event.transaction_id for _, event in valid if event.transaction_id is not None}
+    )
+    entity_ids = _existing_ids(
+        db, Entity.entity_id, {event.entity_id for _, event in valid if event.entity_id is not None}
+    )
+
+    now = datetime.utcnow()
+    pending = {}
+    expiring = set()
+    unkeyed = []
+    duplicates = []
+    for index, event in valid:
+        errors = []
+        if event.transaction_id is not None and event.transaction_id not in transaction_ids:
+            errors.append({"field": "transaction_id", "message": f"Transaction {event.transaction_id} not found"})
+        if event.entity_id is not None and event.entity_id not in entity_ids:
+            errors.append({"field": "entity_id", "message": f"Entity {event.entity_id} not found"})
+        if errors:
+            results[index] = {"index": index, "status": "rejected", "errors": errors}
+            continue
+        key = event.idempotency_key or content_key(event)
+        if expiring_key(event):
+            if CONTENT_KEY_WINDOW_SECONDS <= 0:
+                unkeyed.append((None, index, event))
+                continue
+            expiring.add(key)
+        if key in pending:
+            duplicates.append((index, key))
+        else:
+            pending[key] = (index, event)
+
+    claimed = _claim_keys(db, list(pending), now, expiring) if pending else set()
+
+    new_events = [(key, index, event) for key, (index, event) in pending.items() if key in claimed] + unkeyed
+    duplicates += [(index, key) for key, (index, event) in pending.items() if key not in claimed]
+
+    if new_events:
+        rows = [{
+            "transaction_id": event.transaction_id,
+            "entity_id": event.entity_id,
+            "source": event.source,
+            "source_content": event.source_content,
+            "type": event.type,
+            "status": event.status,
+            "created_at": event.created_at or now,
+        } for _, _, event in new_events]
+        inserted = db.execute(
+            insert(Event.__table__).returning(Event.event_id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+
+        keyed = [{"key": key, "new_event_id": event_id} for (key, _, _), event_id in zip(new_events, inserted) if key]
+        if keyed:
+            db.execute(
+                update(Event_Idempotency_Key.__table__)
+                .where(Event_Idempotency_Key.idempotency_key == bindparam("key"))
+                .values(event_id=bindparam("new_event_id")),
+                keyed,
+            )
+        for (key, index, _), event_id in zip(new_events, inserted):
+            results[index] = {"index": index, "status": "inserted", "event_id": event_id, "idempotency_key": key}
+
+    if duplicates:
+        existing = _existing_keys(db, {key for _, key in duplicates})
+        for index, key in duplicates:
+            results[index] = {"index": index, "status": "duplicate", "event_id": existing.get(key), "idempotency_key": key}
+
+    db.commit()
+    return results
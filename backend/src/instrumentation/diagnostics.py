@@ -0,0 +1,236 @@
+import math
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+# Columns the API filters, joins or sorts on, which should lead some index
+# (table, column, where)
+FILTERED_COLUMNS = [
+    ("transaction", "created_at", "/api/transactions ORDER BY"),
+    ("transaction_status", "status", "/api/transactions?status="),
+    ("transaction_status", "type", "/api/transactions?type="),
+    ("event", "transaction_id", "/api/transactions/{id} events"),
+    ("event", "created_at", "/api/events ORDER BY"),
+    ("transaction_entity", "transaction_id", "/api/transactions/{id}/details"),
+    ("transaction_goods", "transaction_id", "/api/transactions/{id}/details"),
+    ("entity", "updated_at", "reference data refresh"),
+]
+
+# Thresholds for the warnings
+DEAD_TUPLE_RATIO_WARNING = 0.2
+BLOAT_RATIO_WARNING = 0.3
+CACHE_HIT_RATIO_WARNING = 0.99
+# Tables smaller than this are cheap to scan and vacuum, and unused indexes
+# smaller than this cost little to maintain, so they aren't worth a warning
+SMALL_TABLE_ROWS = 10_000
+SMALL_INDEX_BYTES = 1024 * 1024
+
+# PostgreSQL page layout, for the bloat estimate
+_PAGE_HEADER_BYTES = 24
+_TUPLE_OVERHEAD_BYTES = 24 + 4  # tuple header + line pointer
+
+_DATABASE = text("""
+    SELECT current_database() AS name,
+           current_setting('server_version') AS server_version,
+           current_setting('block_size')::int AS block_size,
+           pg_database_size(current_database()) AS size_bytes,
+           d.blks_hit, d.blks_read, d.xact_commit, d.xact_rollback, d.deadlocks, d.temp_bytes, d.stats_reset
+    FROM pg_stat_database d
+    WHERE d.datname = current_database()
+""")
+
+_TABLES = text("""
+    SELECT c.oid, c.relname AS name, c.relkind = 'p' AS partitioned,
+           (SELECT i.inhparent::regclass::text FROM pg_inherits i WHERE i.inhrelid = c.oid) AS partition_of,
+           c.reltuples::bigint AS estimated_rows, c.relpages,
+           s.n_live_tup, s.n_dead_tup, s.seq_scan, s.seq_tup_read, s.idx_scan,
+           s.n_tup_ins, s.n_tup_upd, s.n_tup_del,
+           s.last_vacuum, s.last_autovacuum, s.last_analyze, s.last_autoanalyze,
+           pg_table_size(c.oid) AS table_bytes, pg_indexes_size(c.oid) AS index_bytes,
+           pg_total_relation_size(c.oid) AS total_bytes,
+           io.heap_blks_hit, io.heap_blks_read, io.idx_blks_hit, io.idx_blks_read
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+    LEFT JOIN pg_statio_user_tables io ON io.relid = c.oid
+    WHERE c.relkind IN ('r', 'p') AND n.nspname = current_schema()
+    ORDER BY pg_total_relation_size(c.oid) DESC, c.relname
+""")
+
+# Average stored width of a row, from the planner statistics gathered by ANALYZE
+_ROW_WIDTHS = text("""
+    SELECT tablename AS name, sum((1 - null_frac) * avg_width) AS row_width
+    FROM pg_stats
+    WHERE schemaname = current_schema()
+    GROUP BY tablename
+""")
+
+_INDEXES = text("""
+    SELECT s.relname AS table, s.indexrelname AS name, s.idx_scan, s.idx_tup_read, s.idx_tup_fetch,
+           pg_relation_size(s.indexrelid) AS size_bytes, i.indisunique AS is_unique,
+           i.indisprimary AS is_primary, i.indisvalid AS is_valid, pg_get_indexdef(s.indexrelid) AS definition
+    FROM pg_stat_user_indexes s
+    JOIN pg_index i ON i.indexrelid = s.indexrelid
+    WHERE s.schemaname = current_schema()
+    ORDER BY pg_relation_size(s.indexrelid) DESC, s.indexrelname
+""")
+
+# (table, first column) of every index, including those on partitioned tables
+_LEADING_COLUMNS = text("""
+    SELECT t.relname AS table, a.attname AS column
+    FROM pg_index i
+    JOIN pg_class t ON t.oid = i.indrelid
+    JOIN pg_namespace n ON n.oid = t.relnamespace
+    JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = i.indkey[0]
+    WHERE n.nspname = current_schema()
+""")
+
+_SAMPLES = {
+    "entity": "SELECT entity_id, entity_name, country, client_type, risk_rating FROM entity LIMIT 3",
+    "transaction": "SELECT transaction_id, product_id, product_name, amount, currency FROM transaction LIMIT 3",
+    "event": "SELECT event_id, transaction_id, entity_id, source, type, status FROM event LIMIT 3",
+}
+
+
+class DiagnosticsError(ValueError):
+    """Diagnostics can't run against this database."""
+
+
+def _ratio(part, whole):
+    return round(part / whole, 4) if whole else None
+
+
+def _hit_ratio(hit, read):
+    if hit is None or read is None:
+        return None
+    return _ratio(hit, hit + read)
+
+
+def _estimated_bloat(row, row_width, block_size):
+    """
+    Heap bytes beyond what the live rows need, from the row count and average
+    row width in the planner statistics. An estimate: accurate to a few pages
+    on tables with fresh statistics, meaningless on tables never analyzed.
+    """
+    if row_width is None or row["estimated_rows"] is None or not row["relpages"]:
+        return None
+    tuple_bytes = _TUPLE_OVERHEAD_BYTES + math.ceil(float(row_width) / 8) * 8
+    expected_pages = math.ceil(row["estimated_rows"] * tuple_bytes / (block_size - _PAGE_HEADER_BYTES))
+    return max(row["relpages"] - expected_pages, 0) * block_size
+
+
+def _table_entry(row, row_width, block_size):
+    # reltuples is -1 until the table is first vacuumed or analyzed
+    estimated_rows = row["estimated_rows"] if row["estimated_rows"] is not None and row["estimated_rows"] >= 0 else None
+    row = {**row, "estimated_rows": estimated_rows}
+    bloat_bytes = None if row["partitioned"] else _estimated_bloat(row, row_width, block_size)
+    live, dead = row["n_live_tup"], row["n_dead_tup"]
+    return {
+        "name": row["name"],
+        "partitioned": row["partitioned"],
+        "partition_of": row["partition_of"],
+        "estimated_rows": estimated_rows,
+        "live_rows": live,
+        "dead_rows": dead,
+        "dead_ratio": _ratio(dead, (live or 0) + (dead or 0)) if dead is not None else None,
+        "table_bytes": row["table_bytes"],
+        "index_bytes": row["index_bytes"],
+        "total_bytes": row["total_bytes"],
+        "estimated_bloat_bytes": bloat_bytes,
+        "estimated_bloat_ratio": _ratio(bloat_bytes, row["table_bytes"]) if bloat_bytes is not None else None,
+        "seq_scans": row["seq_scan"],
+        "seq_rows_read": row["seq_tup_read"],
+        "index_scans": row["idx_scan"],
+        "inserts": row["n_tup_ins"],
+        "updates": row["n_tup_upd"],
+        "deletes": row["n_tup_del"],
+        "heap_cache_hit_ratio": _hit_ratio(row["heap_blks_hit"], row["heap_blks_read"]),
+        "index_cache_hit_ratio": _hit_ratio(row["idx_blks_hit"], row["idx_blks_read"]),
+        "last_vacuum": max(filter(None, (row["last_vacuum"], row["last_autovacuum"])), default=None),
+        "last_analyze": max(filter(None, (row["last_analyze"], row["last_autoanalyze"])), default=None),
+    }
+
+
+def _warnings(database, tables, indexes, missing_indexes):
+    warnings = []
+    if database["cache_hit_ratio"] is not None and database["cache_hit_ratio"] < CACHE_HIT_RATIO_WARNING:
+        warnings.append(f"Cache hit ratio {database['cache_hit_ratio']:.2%} is below {CACHE_HIT_RATIO_WARNING:.0%}")
+    for table in tables:
+        if table["partitioned"] or max(table["estimated_rows"] or 0, table["live_rows"] or 0) < SMALL_TABLE_ROWS:
+            continue
+        if table["estimated_rows"] is None:
+            warnings.append(f"{table['name']}: never analyzed, so row estimates and plans are guesses")
+        if table["dead_ratio"] is not None and table["dead_ratio"] > DEAD_TUPLE_RATIO_WARNING:
+            warnings.append(f"{table['name']}: {table['dead_ratio']:.0%} dead rows, vacuum is falling behind")
+        if table["estimated_bloat_ratio"] is not None and table["estimated_bloat_ratio"] > BLOAT_RATIO_WARNING:
+            warnings.append(f"{table['name']}: about {table['estimated_bloat_ratio']:.0%} of the table is bloat")
+        if (table["seq_scans"] or 0) > (table["index_scans"] or 0):
+            warnings.append(f"{table['name']}: more sequential scans ({table['seq_scans']}) than index scans")
+    for index in indexes:
+        if not index["is_valid"]:
+            warnings.append(f"{index['name']}: invalid index (a failed CREATE INDEX CONCURRENTLY?)")
+        elif index["unused"] and index["size_bytes"] >= SMALL_INDEX_BYTES:
+            warnings.append(f"{index['name']}: never scanned since the statistics were reset")
+    for missing in missing_indexes:
+        if (missing["estimated_rows"] or 0) >= SMALL_TABLE_ROWS:
+            warnings.append(f"{missing['table']}.{missing['column']}: no index, used by {missing['used_by']}")
+    return warnings
+
+
+def collect_diagnostics(connection, exact_counts=None, samples=False):
+    """
+    Database health from the catalog and statistics views: sizes, row
+    estimates, dead rows and estimated bloat per table, index usage, indexes
+    missing on the columns the API filters by, and cache hit ratios. Nothing
+    scans a table unless exact counts are requested for it (`exact_counts`:
+    a list of table names, empty for all tables).
+    """
+    if connection.dialect.name != "postgresql":
+        raise DiagnosticsError("Database diagnostics need PostgreSQL's statistics views")
+
+    database = dict(connection.execute(_DATABASE).mappings().one())
+    block_size = database.pop("block_size")
+    database["cache_hit_ratio"] = _hit_ratio(database.pop("blks_hit"), database.pop("blks_read"))
+
+    row_widths = dict(connection.execute(_ROW_WIDTHS).tuples().all())
+    table_rows = connection.execute(_TABLES).mappings().all()
+    tables = [_table_entry(row, row_widths.get(row["name"]), block_size) for row in table_rows]
+    estimated_rows = {table["name"]: table["estimated_rows"] for table in tables}
+
+    indexes = []
+    for row in connection.execute(_INDEXES).mappings():
+        index = dict(row)
+        index["unused"] = index["idx_scan"] == 0 and not (index["is_unique"] or index["is_primary"])
+        indexes.append(index)
+
+    leading = set(connection.execute(_LEADING_COLUMNS).tuples().all())
+    missing_indexes = [
+        {"table": table, "column": column, "used_by": used_by, "estimated_rows": estimated_rows[table]}
+        for table, column, used_by in FILTERED_COLUMNS
+        if table in estimated_rows and (table, column) not in leading
+    ]
+
+    if exact_counts is not None:
+        wanted = set(exact_counts) or set(estimated_rows)
+        unknown = wanted - set(estimated_rows)
+        if unknown:
+            raise DiagnosticsError(f"Unknown tables: {', '.join(sorted(unknown))}")
+        for table in tables:
+            if table["name"] in wanted:
+                quoted = connection.dialect.identifier_preparer.quote(table["name"])
+                table["exact_rows"] = connection.execute(text(f"SELECT count(*) FROM {quoted}")).scalar()
+
+    result = {
+        "collected_at": datetime.now(timezone.utc).isoformat(),
+        "database": database,
+        "tables": tables,
+        "indexes": indexes,
+        "missing_indexes": missing_indexes,
+        "warnings": _warnings(database, tables, indexes, missing_indexes),
+    }
+    if samples:
+        result["samples"] = {
+            table: [dict(row) for row in connection.execute(text(query)).mappings()]
+            for table, query in _SAMPLES.items() if table in estimated_rows
+        }
+    return result
@@ -0,0 +1,258 @@
+import json
+import logging
+import os
+import threading
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets (seconds) shared by the request and SQL histograms
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Directory shared by the worker processes of one server (gunicorn.conf.py
+# sets it). Each worker writes its metrics there every METRICS_SYNC_SECONDS
+# and when it stops, and /metrics renders those of all workers: counters and
+# histograms summed, gauges per worker with a `worker` label (its pid). Unset,
+# /metrics shows the metrics of the process serving it.
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+METRICS_SYNC_SECONDS = float(os.getenv("METRICS_SYNC_SECONDS", "5"))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        return self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, _format_labels(self.label_names, key), value
+
+    def state(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def merge(self, state, extra_labels=()):
+        """Add another process's values (from state()), with `extra_labels` appended to each key."""
+        with self._lock:
+            for key, value in state:
+                key = tuple(key) + tuple(extra_labels)
+                self._values[key] = self._values.get(key, 0) + value
+
+
+class Gauge(Counter):
+    """Value that can go up and down."""
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    """Cumulative histogram in the Prometheus exposition layout."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts, plus one overflow slot, then sum
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", _format_labels(self.label_names, key, ("le", _format_value(float(bound)))), cumulative
+            yield f"{self.name}_sum", _format_labels(self.label_names, key), total
+            yield f"{self.name}_count", _format_labels(self.label_names, key), cumulative
+
+    def state(self):
+        with self._lock:
+            return [[list(key), list(counts), total] for key, (counts, total) in self._series.items()]
+
+    def merge(self, state):
+        """Add another process's observations (from state())."""
+        with self._lock:
+            for key, counts, total in state:
+                series = self._series.setdefault(tuple(key), [[0] * (len(self.buckets) + 1), 0.0])
+                series[0] = [mine + theirs for mine, theirs in zip(series[0], counts)]
+                series[1] += total
+
+
+class MetricsRegistry:
+    """Process-local collection of metrics rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, label_names=()):
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(self, name, documentation, label_names=()):
+        return self._register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def state(self):
+        """The metrics and their values, JSON-serializable."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return [{
+            "name": metric.name, "kind": metric.kind, "documentation": metric.documentation,
+            "label_names": list(metric.label_names), "buckets": list(getattr(metric, "buckets", ())),
+            "values": metric.state(),
+        } for metric in metrics]
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Shared registry exposed by the /metrics endpoint
+registry = MetricsRegistry()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def write_state(directory=None, pid=None):
+    """Write this process's metrics to `<pid>.json` in the shared directory, replacing the last copy."""
+    path = os.path.join(directory or METRICS_MULTIPROC_DIR, f"{pid or os.getpid()}.json")
+    with open(f"{path}.tmp", "w") as file:
+        json.dump(registry.state(), file)
+    os.replace(f"{path}.tmp", path)
+
+
+def mark_process_dead(pid, directory=None):
+    """
+    Keep a stopped worker's counters and histograms, which stay part of the
+    totals, but drop its gauges. Called by the gunicorn master as workers exit.
+    """
+    path = os.path.join(directory or METRICS_MULTIPROC_DIR, f"{pid}.json")
+    try:
+        os.replace(path, os.path.join(directory or METRICS_MULTIPROC_DIR, f"{pid}.dead.json"))
+    except FileNotFoundError:
+        pass
+
+
+def collect(directory):
+    """A registry holding the metrics written to `directory` by every worker, merged."""
+    merged = MetricsRegistry()
+    for file_name in sorted(os.listdir(directory)):
+        if not file_name.endswith(".json"):
+            continue
+        pid, _, dead = file_name[:-len(".json")].partition(".")
+        try:
+            with open(os.path.join(directory, file_name)) as file:
+                metrics = json.load(file)
+        except (OSError, ValueError):
+            # Removed since listed
+            continue
+        for metric in metrics:
+            name, documentation, label_names = metric["name"], metric["documentation"], metric["label_names"]
+            if metric["kind"] == "histogram":
+                merged.histogram(name, documentation, label_names, metric["buckets"]).merge(metric["values"])
+            elif metric["kind"] == "counter":
+                merged.counter(name, documentation, label_names).merge(metric["values"])
+            elif not dead:
+                merged.gauge(name, documentation, (*label_names, "worker")).merge(metric["values"], (pid,))
+    return merged
+
+
+def render_metrics():
+    """The /metrics body: every worker's metrics with METRICS_MULTIPROC_DIR set, this process's otherwise."""
+    if not METRICS_MULTIPROC_DIR:
+        return registry.render()
+    write_state()
+    return collect(METRICS_MULTIPROC_DIR).render()
+
+
+def start_state_writer(stop):
+    """Write this worker's metrics to METRICS_MULTIPROC_DIR every METRICS_SYNC_SECONDS until `stop` is set."""
+    def run():
+        while not stop.wait(METRICS_SYNC_SECONDS):
+            try:
+                write_state()
+            except OSError:
+                logger.exception("Error writing metrics to %s", METRICS_MULTIPROC_DIR)
+
+    thread = threading.Thread(target=run, name="metrics-writer", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,208 @@
+import collections
+import contextvars
+import functools
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+
+import anyio.to_thread
+
+# On-demand profiling is off unless explicitly enabled. When it is off the
+# middleware and thread pool hook below are never installed.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+
+# Interval between stack samples, in milliseconds
+PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "2"))
+
+# Shared secret for the debug endpoints and profiling header, which requests
+# must send in X-Debug-Token. Unset, both are refused to everyone.
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN", "")
+
+# Request header that asks for a profile instead of the normal response
+PROFILE_HEADER = b"x-profile"
+DEBUG_TOKEN_HEADER = b"x-debug-token"
+
+# Innermost frames that mean a thread is idle rather than doing work
+_IDLE_FRAMES = {("selectors.py", "select"), ("threading.py", "wait"), ("queue.py", "get")}
+
+_current_profile = contextvars.ContextVar("tscmf_profile", default=None)
+_profile_lock = threading.Lock()
+
+
+def token_is_valid(supplied):
+    # Constant time, so the token can't be guessed a character at a time
+    return bool(DEBUG_TOKEN) and hmac.compare_digest(supplied.encode(), DEBUG_TOKEN.encode())
+
+
+class StackSampler:
+    """
+    Statistical profiler: a background thread periodically captures the stacks
+    of the threads serving a request and counts identical stacks.
+
+    The result is rendered in the "collapsed stack" format (one
+    `frame;frame;frame count` line per stack) read by flamegraph.pl, speedscope
+    and inferno.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.threads = set()
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="tscmf-profiler", daemon=True)
+
+    def add_thread(self, ident):
+        self.threads.add(ident)
+
+    def remove_thread(self, ident):
+        self.threads.discard(ident)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in list(self.threads):
+                frame = frames.get(ident)
+                if frame is not None:
+                    self._record(frame)
+
+    def _record(self, frame):
+        code = frame.f_code
+        if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+            return
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _short_path(filename):
+    # Trim site-packages and absolute prefixes so frames stay readable
+    for marker in ("site-packages/", "/src/"):
+        index = filename.rfind(marker)
+        if index != -1:
+            return ("src/" if marker == "/src/" else "") + filename[index + len(marker):]
+    return os.path.basename(filename)
+
+
+def _run_sampled(sampler, func, *args):
+    ident = threading.get_ident()
+    sampler.add_thread(ident)
+    try:
+        return func(*args)
+    finally:
+        sampler.remove_thread(ident)
+
+
+def _sample_worker_threads(run_sync):
+    """
+    Wrap anyio.to_thread.run_sync, through which Starlette and FastAPI run
+    sync handlers, dependencies and iterators in worker threads, so a thread
+    is sampled for as long as it runs work for the profiled request.
+    """
+    @functools.wraps(run_sync)
+    async def sampled_run_sync(func, *args, **kwargs):
+        # The context (and with it the sampler) is that of the calling request
+        sampler = _current_profile.get()
+        if sampler is not None:
+            func = functools.partial(_run_sampled, sampler, func)
+        return await run_sync(func, *args, **kwargs)
+
+    sampled_run_sync.samples_worker_threads = True
+    return sampled_run_sync
+
+
+class ProfilingMiddleware:
+    """
+    Serve a request under the sampling profiler when it carries an `X-Profile`
+    header, returning the collapsed stacks instead of the normal response.
+    Only one request is profiled at a time.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        if PROFILE_HEADER not in headers:
+            await self.app(scope, receive, send)
+            return
+
+        if not token_is_valid(headers.get(DEBUG_TOKEN_HEADER, b"").decode()):
+            await _send_json(send, 403, {"detail": "Invalid debug token"})
+            return
+        if not _profile_lock.acquire(blocking=False):
+            await _send_json(send, 409, {"detail": "Another request is being profiled"})
+            return
+
+        sampler = StackSampler(PROFILING_INTERVAL_MS / 1000)
+        sampler.add_thread(threading.get_ident())
+        token = _current_profile.set(sampler)
+        status_code = 500
+
+        async def discard_response(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, discard_response)
+        finally:
+            sampler.stop()
+            _current_profile.reset(token)
+            _profile_lock.release()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        body = sampler.collapsed().encode()
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-profile-samples", str(sampler.samples).encode()),
+                (b"x-profile-duration-ms", f"{elapsed_ms:.2f}".encode()),
+                (b"x-profiled-status", str(status_code).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+async def _send_json(send, status_code, payload):
+    body = json.dumps(payload).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def install_profiling(app):
+    """Add the profiling middleware and thread pool hook. No-op unless PROFILING_ENABLED."""
+    if not PROFILING_ENABLED:
+        return
+    app.add_middleware(ProfilingMiddleware)
+    if not getattr(anyio.to_thread.run_sync, "samples_worker_threads", False):
+        anyio.to_thread.run_sync = _sample_worker_threads(anyio.to_thread.run_sync)
@@ -0,0 +1,142 @@
+import collections
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import event
+
+from .timing import current_request, NO_ROUTE
+
+logger = logging.getLogger(__name__)
+
+# Statements slower than this many milliseconds are recorded. Unset or 0
+# disables the recorder entirely (no engine hooks are installed).
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "0"))
+
+# Also capture the query plan of each slow SELECT. The EXPLAIN runs later on
+# a background thread with its own pooled connection, never on the request's
+# thread while it holds its connection; the entry's plan is null until then.
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "false").lower() == "true"
+
+# Slow queries waiting for their EXPLAIN. When the thread falls this far
+# behind, new entries are recorded without a plan.
+EXPLAIN_QUEUE_SIZE = 100
+
+# Number of slow queries kept; older entries are discarded first
+SLOW_QUERY_BUFFER_SIZE = int(os.getenv("SLOW_QUERY_BUFFER_SIZE", "200"))
+
+# Longest SQL text / parameter repr stored per entry
+MAX_TEXT_LENGTH = 4000
+
+_records = collections.deque(maxlen=SLOW_QUERY_BUFFER_SIZE)
+_explaining = threading.local()
+_explain_queue = None
+_explain_thread = None
+_explain_lock = threading.Lock()
+
+
+def is_enabled():
+    return SLOW_QUERY_THRESHOLD_MS > 0
+
+
+def recent_slow_queries(limit=None):
+    """Recorded slow queries, most recent first."""
+    records = list(reversed(_records))
+    return records[:limit] if limit else records
+
+
+def clear_slow_queries():
+    _records.clear()
+
+
+def _explain(engine, statement, parameters):
+    if engine.dialect.name == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    else:
+        prefix = "EXPLAIN "
+    _explaining.active = True
+    try:
+        with engine.connect() as connection:
+            rows = connection.exec_driver_sql(prefix + statement, parameters).fetchall()
+        return "\n".join(" ".join(str(value) for value in row) for row in rows)
+    except Exception as e:
+        return f"EXPLAIN failed: {e}"
+    finally:
+        _explaining.active = False
+
+
+def _explain_worker(pending):
+    while True:
+        engine, record, statement, parameters = pending.get()
+        record["plan"] = _explain(engine, statement, parameters)
+
+
+def _queue_explain(engine, record, statement, parameters):
+    global _explain_queue, _explain_thread
+    with _explain_lock:
+        # Started on first use, and again in a process forked after that
+        if _explain_thread is None or not _explain_thread.is_alive():
+            _explain_queue = queue.Queue(maxsize=EXPLAIN_QUEUE_SIZE)
+            _explain_thread = threading.Thread(
+                target=_explain_worker, args=(_explain_queue,), name="tscmf-explain", daemon=True,
+            )
+            _explain_thread.start()
+    record["plan"] = None
+    try:
+        _explain_queue.put_nowait((engine, record, statement, parameters))
+    except queue.Full:
+        record["plan"] = "EXPLAIN skipped: too many slow queries waiting"
+
+
+def _is_query(statement):
+    words = statement.split(None, 1)
+    return bool(words) and words[0].upper() in ("SELECT", "WITH")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("slow_query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration_ms = (time.perf_counter() - conn.info["slow_query_started"].pop()) * 1000
+    if duration_ms < SLOW_QUERY_THRESHOLD_MS or getattr(_explaining, "active", False):
+        return
+
+    timing = current_request()
+    record = {
+        "recorded_at": datetime.utcnow().isoformat(),
+        "duration_ms": round(duration_ms, 3),
+        "route": timing.route if timing else NO_ROUTE,
+        # Which database ran it: the primary or one of the read replicas
+        "database": conn.engine.url.render_as_string(hide_password=True),
+        "statement": statement[:MAX_TEXT_LENGTH],
+        "parameters": repr(parameters)[:MAX_TEXT_LENGTH],
+        "executemany": executemany,
+    }
+    if SLOW_QUERY_EXPLAIN and not executemany and _is_query(statement):
+        _queue_explain(conn.engine, record, statement, parameters)
+    _records.append(record)
+    logger.warning(
+        "slow query",
+        extra={"duration_ms": record["duration_ms"], "route": record["route"], "statement": statement[:200]},
+    )
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute never fires for a failed statement
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("slow_query_started"):
+        connection.info["slow_query_started"].pop()
+
+
+def install_slow_query_log(engine):
+    """Record statements on `engine` slower than the threshold. No-op when disabled."""
+    if not is_enabled():
+        return
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
@@ -0,0 +1,149 @@
+import contextvars
+import logging
+import time
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+from .metrics import registry
+
+logger = logging.getLogger("src.access")
+
+REQUESTS_TOTAL = registry.counter(
+    "tscmf_http_requests_total", "HTTP requests handled", ("method", "route", "status")
+)
+REQUEST_DURATION = registry.histogram(
+    "tscmf_http_request_duration_seconds", "HTTP request duration in seconds", ("method", "route")
+)
+REQUESTS_IN_PROGRESS = registry.gauge(
+    "tscmf_http_requests_in_progress", "HTTP requests currently being handled"
+)
+DB_STATEMENTS_TOTAL = registry.counter(
+    "tscmf_db_statements_total", "SQL statements executed, by the route that issued them", ("route",)
+)
+DB_STATEMENT_DURATION = registry.histogram(
+    "tscmf_db_statement_duration_seconds", "SQL statement execution time in seconds", ("route",)
+)
+
+# Route label used for SQL that runs outside of any request (startup, scripts)
+NO_ROUTE = "none"
+
+_current_request = contextvars.ContextVar("tscmf_request_timing", default=None)
+
+
+class RequestTiming:
+    """Timing data accumulated while serving one request."""
+
+    __slots__ = ("scope", "started", "db_time", "db_statements")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.started = time.perf_counter()
+        self.db_time = 0.0
+        self.db_statements = 0
+
+    @property
+    def route(self):
+        # The router records the matched route in the shared scope, so this
+        # resolves to the path template once routing has happened
+        return _route_label(self.scope)
+
+    def server_timing(self):
+        total = (time.perf_counter() - self.started) * 1000
+        db = self.db_time * 1000
+        return (
+            f'db;dur={db:.2f};desc="{self.db_statements} queries", '
+            f"app;dur={max(total - db, 0.0):.2f}, total;dur={total:.2f}"
+        )
+
+
+def current_request():
+    """The RequestTiming for the request being served, or None outside a request."""
+    return _current_request.get()
+
+
+def _route_label(scope):
+    # Label by path template ("/api/transactions/{transaction_id}") rather
+    # than the raw path, to keep the metric cardinality bounded
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["query_started"].pop()
+    timing = _current_request.get()
+    route = NO_ROUTE
+    if timing is not None:
+        timing.db_time += duration
+        timing.db_statements += 1
+        route = timing.route
+    DB_STATEMENTS_TOTAL.inc(route=route)
+    DB_STATEMENT_DURATION.observe(duration, route=route)
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute never fires for a failed statement
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+
+def instrument_engine(engine):
+    """Attribute SQL statement count and time on `engine` to the current request."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+class RequestTimingMiddleware:
+    """
+    ASGI middleware recording route, status and duration for every HTTP request
+    and adding a Server-Timing header that splits database from application time.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming(scope)
+        token = _current_request.set(timing)
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message).append("Server-Timing", timing.server_timing())
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            duration = time.perf_counter() - timing.started
+            route = timing.route
+            REQUESTS_IN_PROGRESS.dec()
+            REQUESTS_TOTAL.inc(method=scope["method"], route=route, status=str(status_code))
+            REQUEST_DURATION.observe(duration, method=scope["method"], route=route)
+            logger.info(
+                "request",
+                extra={
+                    "method": scope["method"],
+                    "route": route,
+                    "status": status_code,
+                    "duration_ms": round(duration * 1000, 2),
+                    "db_ms": round(timing.db_time * 1000, 2),
+                    "db_statements": timing.db_statements,
+                },
+            )
+            _current_request.reset(token)
+
@@ -0,0 +1,53 @@
+import re
+
+from sqlalchemy import event
+
+# The table a statement writes to: INSERT INTO, UPDATE, DELETE FROM or
+# TRUNCATE [TABLE], with the table name optionally quoted
+_WRITE = re.compile(r'^\s*(?:insert\s+into|update|delete\s+from|truncate(?:\s+table)?)\s+"?(\w+)', re.IGNORECASE)
+
+# (tables, callback) pairs registered by in-process caches
+_callbacks = []
+
+# Key in Connection.info of the tables written in the connection's current
+# transaction. They only count once it commits: a cache reloading earlier
+# would read the data from before the write and keep it.
+_WRITTEN_TABLES = "written_tables"
+
+
+def on_table_write(tables, callback):
+    """Call `callback()` when a transaction that wrote to one of `tables` through a hooked engine commits."""
+    _callbacks.append((frozenset(table.lower() for table in tables), callback))
+
+
+def written_table(statement):
+    """The table `statement` writes to, lower-cased, or None if it isn't a write."""
+    match = _WRITE.match(statement)
+    return match.group(1).lower() if match else None
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    table = written_table(statement)
+    if table is not None:
+        conn.info.setdefault(_WRITTEN_TABLES, set()).add(table)
+
+
+def _commit(conn):
+    written = conn.info.pop(_WRITTEN_TABLES, None)
+    if not written:
+        return
+    for tables, callback in _callbacks:
+        if tables & written:
+            callback()
+
+
+def _rollback(conn):
+    conn.info.pop(_WRITTEN_TABLES, None)
+
+
+def install_write_hooks(engine):
+    """Run the on_table_write callbacks for writes made through `engine`."""
+    for name, listener in (("after_cursor_execute", _after_cursor_execute), ("commit", _commit),
+                           ("rollback", _rollback)):
+        if not event.contains(engine, name, listener):
+            event.listen(engine, name, listener)
@@ -0,0 +1,115 @@
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, Field, ValidationError
+
+from ..database.database import engine, SessionLocal
+from ..duplicates.detector import backfill, check_transactions
+from ..archive.archive import EVENT_HOT_MONTHS, is_partitioned, ensure_event_partitions, cold_partitions, archive_partition
+from ..risk.stress import Scenario, StressError, run_stress_test, MAX_SCENARIOS
+from ..transactions.status import rebuild_transaction_status
+
+# Job kind -> handler(context, payload). A handler returns a JSON-serializable
+# result, reports progress through context.report_progress, and raises to fail
+# the attempt (PermanentJobError to fail the job without retrying).
+JOB_HANDLERS = {}
+
+
+class PermanentJobError(Exception):
+    """A failure retrying can't fix, e.g. an invalid payload."""
+
+
+def job_handler(kind):
+    def register(handler):
+        JOB_HANDLERS[kind] = handler
+        return handler
+    return register
+
+
+@job_handler("rebuild_transaction_status")
+def rebuild_status(context, payload):
+    """Recompute transaction_status from the event table."""
+    with engine.begin() as connection:
+        count = rebuild_transaction_status(connection)
+    return {"transactions": count}
+
+
+@job_handler("archive_events")
+def archive_events(context, payload):
+    """Create upcoming event partitions, then archive the cold ones to Parquet (see archive_events.py)."""
+    hot_months = int(payload.get("hot_months", EVENT_HOT_MONTHS))
+    keep_detached = bool(payload.get("keep_detached", False))
+    with engine.begin() as connection:
+        if not is_partitioned(connection):
+            raise PermanentJobError("The event table is not partitioned")
+        created = ensure_event_partitions(connection)
+        cold = cold_partitions(connection, hot_months)
+
+    archived = []
+    for done, (name, month) in enumerate(cold):
+        context.report_progress(done / len(cold), f"Archiving {name}")
+        archived.append(archive_partition(engine, name, month, keep_detached=keep_detached))
+    return {"created": created, "archived": archived}
+
+
+@job_handler("detect_duplicates")
+def detect_duplicates(context, payload):
+    """
+    Flag near-duplicate transactions (see detect_duplicates.py): those in
+    `transaction_ids`, every transaction not checked yet by default, or the
+    whole book again across a process pool with `backfill`.
+    """
+    if payload.get("backfill"):
+        processes = payload.get("processes")
+        if processes is not None and (not isinstance(processes, int) or processes < 1):
+            raise PermanentJobError("processes must be a positive integer")
+        return backfill(engine, processes=processes, progress=context.report_progress)
+
+    transaction_ids = payload.get("transaction_ids")
+    if transaction_ids is not None and (
+        not isinstance(transaction_ids, list) or not all(isinstance(i, int) for i in transaction_ids)
+    ):
+        raise PermanentJobError("transaction_ids must be a list of integers")
+    with SessionLocal() as db:
+        result = check_transactions(db, transaction_ids)
+    # The pairs are recorded as events; the job result keeps just the first few
+    return {**result, "pairs": result["pairs"][:100]}
+
+
+class StressTestPayload(BaseModel):
+    scenarios: List[Scenario] = Field(min_length=1)
+    group_by: Optional[str] = None
+    as_of: Optional[datetime] = None
+
+
+@job_handler("stress_test")
+def stress_test(context, payload):
+    """
+    Re-price the open book under `scenarios`, as POST /api/risk/stress does,
+    for scenario sets larger than a request takes: MAX_SCENARIOS at a time,
+    reporting progress between them.
+    """
+    try:
+        request = StressTestPayload.model_validate(payload)
+    except ValidationError as e:
+        raise PermanentJobError(str(e))
+    # Fixed once, so every batch values the same open book
+    as_of = request.as_of or datetime.utcnow()
+
+    started = time.perf_counter()
+    scenarios = request.scenarios
+    result = None
+    for start in range(0, len(scenarios), MAX_SCENARIOS):
+        context.report_progress(start / len(scenarios), f"Scenarios {start + 1} to "
+                                f"{min(start + MAX_SCENARIOS, len(scenarios))} of {len(scenarios)}")
+        try:
+            batch = run_stress_test(engine, scenarios[start:start + MAX_SCENARIOS], request.group_by, as_of)
+        except StressError as e:
+            raise PermanentJobError(str(e))
+        if result is None:
+            result = batch
+        else:
+            result["scenarios"] += batch["scenarios"]
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
@@ -0,0 +1,282 @@
+import itertools
+import os
+import random
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, insert, and_
+from sqlalchemy.exc import IntegrityError
+
+from ..models.models import Job
+
+# "database" (the job table, shared by every worker process) or "memory"
+# (a per-process stand-in for tests and local runs without PostgreSQL)
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "database")
+
+# Retry delay after the nth failed attempt: base * 2^(n-1), capped, with jitter
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "5"))
+JOB_RETRY_MAX_SECONDS = float(os.getenv("JOB_RETRY_MAX_SECONDS", "3600"))
+
+# A running job whose worker hasn't heartbeated for this long is assumed dead
+# and goes back on the queue (counting as a failed attempt)
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed")
+
+_JOB_COLUMNS = [column.name for column in Job.__table__.columns]
+
+
+def retry_delay(attempts):
+    """Seconds to wait before retrying a job that has failed `attempts` times."""
+    delay = min(JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1), JOB_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def job_to_dict(job):
+    """API representation of a job row (a mapping of job columns)."""
+    return {
+        "id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "priority": job["priority"],
+        "attempts": job["attempts"],
+        "max_attempts": job["max_attempts"],
+        "progress": job["progress"],
+        "progress_message": job["progress_message"],
+        "payload": job["payload"],
+        "result": job["result"],
+        "error": job["error"],
+        "run_after": job["run_after"].isoformat() if job["run_after"] else None,
+        "created_at": job["created_at"].isoformat() if job["created_at"] else None,
+        "started_at": job["started_at"].isoformat() if job["started_at"] else None,
+        "finished_at": job["finished_at"].isoformat() if job["finished_at"] else None,
+    }
+
+
+class DatabaseJobQueue:
+    """
+    Jobs stored in the job table. Workers in any number of processes claim
+    the highest-priority ready job with SELECT ... FOR UPDATE SKIP LOCKED, so
+    they never wait on each other or run the same job twice. (SQLite has no
+    row locks and ignores the clause; its writes are serialized anyway.)
+
+    Every method runs in its own short transaction.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def enqueue(self, kind, payload=None, priority=0, max_attempts=3, run_after=None, unique_key=None, merge=None):
+        """
+        Queue a job and return its id. With a `unique_key`, a job already
+        queued under that key is reused instead: its payload becomes
+        merge(queued payload, payload) when `merge` is given.
+        """
+        now = datetime.utcnow()
+        # Two enqueuers can both find no queued job; the unique index lets one
+        # insert, and the other merges into its job on the second pass
+        for attempt in range(2):
+            try:
+                with self.engine.begin() as connection:
+                    if unique_key is not None:
+                        queued = connection.execute(
+                            select(Job.id, Job.payload)
+                            .where(Job.unique_key == unique_key, Job.status == "queued")
+                            .with_for_update()
+                        ).first()
+                        if queued is not None:
+                            if merge is not None:
+                                connection.execute(
+                                    update(Job.__table__).where(Job.id == queued.id)
+                                    .values(payload=merge(queued.payload, payload))
+                                )
+                            return queued.id
+                    return connection.execute(insert(Job.__table__).values(
+                        kind=kind, payload=payload, status="queued", priority=priority, attempts=0,
+                        max_attempts=max_attempts, run_after=run_after or now, created_at=now, unique_key=unique_key,
+                    ).returning(Job.id)).scalar()
+            except IntegrityError:
+                if unique_key is None or attempt:
+                    raise
+
+    def get(self, job_id):
+        with self.engine.connect() as connection:
+            row = connection.execute(select(Job.__table__).where(Job.id == job_id)).mappings().first()
+        return dict(row) if row else None
+
+    def claim(self, worker_id):
+        """Mark the next ready job as running for this worker and return it, or None."""
+        now = datetime.utcnow()
+        candidate = (
+            select(Job.id)
+            .where(Job.status == "queued", Job.run_after <= now)
+            .order_by(Job.priority.desc(), Job.run_after, Job.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        with self.engine.begin() as connection:
+            row = connection.execute(
+                update(Job.__table__)
+                .where(Job.id == candidate)
+                .values(status="running", attempts=Job.attempts + 1, locked_by=worker_id, locked_at=now,
+                        started_at=now, progress=0.0, progress_message=None)
+                .returning(*Job.__table__.columns)
+            ).mappings().first()
+        return dict(row) if row else None
+
+    def _update_running(self, job_id, worker_id, **values):
+        # Only the worker holding the lease may update a running job; one that
+        # lost it (e.g. it stalled past JOB_LEASE_SECONDS) changes nothing
+        with self.engine.begin() as connection:
+            return connection.execute(
+                update(Job.__table__)
+                .where(Job.id == job_id, Job.status == "running", Job.locked_by == worker_id)
+                .values(**values)
+            ).rowcount == 1
+
+    def heartbeat(self, job_id, worker_id, progress=None, message=None):
+        values = {"locked_at": datetime.utcnow()}
+        if progress is not None:
+            values["progress"] = progress
+        if message is not None:
+            values["progress_message"] = message
+        return self._update_running(job_id, worker_id, **values)
+
+    def complete(self, job_id, worker_id, result=None):
+        return self._update_running(
+            job_id, worker_id, status="succeeded", result=result, error=None, progress=1.0,
+            locked_by=None, locked_at=None, finished_at=datetime.utcnow(),
+        )
+
+    def fail(self, job_id, worker_id, error, attempts, max_attempts, retry=True):
+        """Requeue the job with backoff, or mark it failed once its attempts are used up."""
+        now = datetime.utcnow()
+        if retry and attempts < max_attempts:
+            return self._update_running(
+                job_id, worker_id, status="queued", error=error, locked_by=None, locked_at=None,
+                run_after=now + timedelta(seconds=retry_delay(attempts)),
+            )
+        return self._update_running(
+            job_id, worker_id, status="failed", error=error, locked_by=None, locked_at=None, finished_at=now,
+        )
+
+    def requeue_expired(self):
+        """Return jobs whose worker stopped heartbeating to the queue, or fail them if out of attempts."""
+        now = datetime.utcnow()
+        expired = and_(Job.status == "running", Job.locked_at < now - timedelta(seconds=JOB_LEASE_SECONDS))
+        with self.engine.begin() as connection:
+            failed = connection.execute(
+                update(Job.__table__).where(expired, Job.attempts >= Job.max_attempts)
+                .values(status="failed", error="Worker lease expired", locked_by=None, locked_at=None,
+                        finished_at=now)
+            ).rowcount
+            requeued = connection.execute(
+                update(Job.__table__).where(expired)
+                .values(status="queued", error="Worker lease expired", locked_by=None, locked_at=None,
+                        run_after=now)
+            ).rowcount
+        return requeued + failed
+
+
+class InMemoryJobQueue:
+    """
+    Drop-in stand-in for DatabaseJobQueue that keeps jobs in a dict. Only
+    workers in the same process (threads) can share it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._ids = itertools.count(1)
+
+    def enqueue(self, kind, payload=None, priority=0, max_attempts=3, run_after=None, unique_key=None, merge=None):
+        now = datetime.utcnow()
+        with self._lock:
+            if unique_key is not None:
+                for job in self._jobs.values():
+                    if job["unique_key"] == unique_key and job["status"] == "queued":
+                        if merge is not None:
+                            job["payload"] = merge(job["payload"], payload)
+                        return job["id"]
+            job_id = next(self._ids)
+            self._jobs[job_id] = {
+                **dict.fromkeys(_JOB_COLUMNS),
+                "id": job_id, "kind": kind, "payload": payload, "status": "queued", "priority": priority,
+                "attempts": 0, "max_attempts": max_attempts, "run_after": run_after or now, "created_at": now,
+                "unique_key": unique_key,
+            }
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def claim(self, worker_id):
+        now = datetime.utcnow()
+        with self._lock:
+            ready = [job for job in self._jobs.values() if job["status"] == "queued" and job["run_after"] <= now]
+            if not ready:
+                return None
+            job = min(ready, key=lambda job: (-job["priority"], job["run_after"], job["id"]))
+            job.update(status="running", attempts=job["attempts"] + 1, locked_by=worker_id, locked_at=now,
+                       started_at=now, progress=0.0, progress_message=None)
+            return dict(job)
+
+    def _update_running(self, job_id, worker_id, **values):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job["status"] != "running" or job["locked_by"] != worker_id:
+                return False
+            job.update(values)
+            return True
+
+    def heartbeat(self, job_id, worker_id, progress=None, message=None):
+        values = {"locked_at": datetime.utcnow()}
+        if progress is not None:
+            values["progress"] = progress
+        if message is not None:
+            values["progress_message"] = message
+        return self._update_running(job_id, worker_id, **values)
+
+    def complete(self, job_id, worker_id, result=None):
+        return self._update_running(
+            job_id, worker_id, status="succeeded", result=result, error=None, progress=1.0,
+            locked_by=None, locked_at=None, finished_at=datetime.utcnow(),
+        )
+
+    def fail(self, job_id, worker_id, error, attempts, max_attempts, retry=True):
+        now = datetime.utcnow()
+        if retry and attempts < max_attempts:
+            return self._update_running(
+                job_id, worker_id, status="queued", error=error, locked_by=None, locked_at=None,
+                run_after=now + timedelta(seconds=retry_delay(attempts)),
+            )
+        return self._update_running(
+            job_id, worker_id, status="failed", error=error, locked_by=None, locked_at=None, finished_at=now,
+        )
+
+    def requeue_expired(self):
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=JOB_LEASE_SECONDS)
+        count = 0
+        with self._lock:
+            for job in self._jobs.values():
+                if job["status"] == "running" and job["locked_at"] < cutoff:
+                    job.update(error="Worker lease expired", locked_by=None, locked_at=None)
+                    if job["attempts"] >= job["max_attempts"]:
+                        job.update(status="failed", finished_at=now)
+                    else:
+                        job.update(status="queued", run_after=now)
+                    count += 1
+        return count
+
+
+def create_queue(engine, backend=None):
+    backend = backend or JOB_QUEUE_BACKEND
+    if backend == "memory":
+        return InMemoryJobQueue()
+    if backend == "database":
+        return DatabaseJobQueue(engine)
+    raise ValueError(f"Unknown JOB_QUEUE_BACKEND '{backend}' (use database or memory)")
@@ -0,0 +1,119 @@
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+
+from .handlers import JOB_HANDLERS, PermanentJobError
+from .queue import JOB_LEASE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Seconds an idle worker waits before polling the queue again
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+
+
+class JobLeaseLost(Exception):
+    """The job was taken back from this worker (its lease expired)."""
+
+
+class JobContext:
+    """Handed to job handlers for reporting progress on the running job."""
+
+    __slots__ = ("job_id", "attempt", "_queue", "_worker_id")
+
+    def __init__(self, queue, worker_id, job):
+        self.job_id = job["id"]
+        self.attempt = job["attempts"]
+        self._queue = queue
+        self._worker_id = worker_id
+
+    def report_progress(self, progress, message=None):
+        """Record progress (0.0 to 1.0). Raises JobLeaseLost if the job was requeued meanwhile."""
+        if not self._queue.heartbeat(self.job_id, self._worker_id, progress=progress, message=message):
+            raise JobLeaseLost(f"Job {self.job_id} is no longer held by {self._worker_id}")
+
+
+def worker_name(index=0):
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+def _heartbeat(queue, worker_id, job_id, done):
+    # Keeps the lease alive for handlers that don't report progress often. A
+    # failed renewal (say the database blipped) is retried at the next beat,
+    # well before the lease runs out.
+    while not done.wait(JOB_LEASE_SECONDS / 3):
+        try:
+            if not queue.heartbeat(job_id, worker_id):
+                # Requeued meanwhile; the handler finds out at its next progress report
+                logger.warning("Lost the lease on job %s", job_id, extra={"job_id": job_id})
+                return
+        except Exception:
+            logger.exception("Error renewing the lease on job %s", job_id, extra={"job_id": job_id})
+
+
+def run_job(queue, worker_id, job):
+    """Run one claimed job to completion, recording its result or failure."""
+    handler = JOB_HANDLERS.get(job["kind"])
+    if handler is None:
+        queue.fail(job["id"], worker_id, f"Unknown job kind '{job['kind']}'", job["attempts"], job["max_attempts"], retry=False)
+        return
+
+    done = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(queue, worker_id, job["id"], done), daemon=True)
+    heartbeat.start()
+    started = time.perf_counter()
+    try:
+        result = handler(JobContext(queue, worker_id, job), job["payload"] or {})
+    except JobLeaseLost:
+        logger.warning("Lost the lease on job %s", job["id"], extra={"job_id": job["id"], "kind": job["kind"]})
+    except Exception as e:
+        logger.exception("Job %s failed", job["id"], extra={"job_id": job["id"], "kind": job["kind"], "attempt": job["attempts"]})
+        queue.fail(
+            job["id"], worker_id, "".join(traceback.format_exception_only(e)).strip(),
+            job["attempts"], job["max_attempts"], retry=not isinstance(e, PermanentJobError),
+        )
+    else:
+        queue.complete(job["id"], worker_id, result)
+        logger.info("Job %s succeeded", job["id"], extra={
+            "job_id": job["id"], "kind": job["kind"], "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+        })
+    finally:
+        done.set()
+        heartbeat.join()
+
+
+def run_worker(queue, worker_id, stop, poll_interval=JOB_POLL_INTERVAL):
+    """
+    Claim and run jobs until `stop` (a threading or multiprocessing Event) is
+    set. The job in progress is always finished first.
+    """
+    last_expiry_check = 0.0
+    while not stop.is_set():
+        try:
+            # Any worker can put jobs abandoned by a dead worker back on the queue
+            if time.monotonic() - last_expiry_check > JOB_LEASE_SECONDS / 2:
+                last_expiry_check = time.monotonic()
+                queue.requeue_expired()
+            job = queue.claim(worker_id)
+        except Exception:
+            logger.exception("Error polling the job queue")
+            stop.wait(poll_interval)
+            continue
+        if job is None:
+            stop.wait(poll_interval)
+            continue
+        run_job(queue, worker_id, job)
+
+
+def start_worker_threads(queue, count, stop):
+    """Run `count` workers as daemon threads in this process (used with the in-memory queue)."""
+    threads = []
+    for index in range(count):
+        thread = threading.Thread(
+            target=run_worker, args=(queue, worker_name(index), stop), name=f"job-worker-{index}", daemon=True
+        )
+        thread.start()
+        threads.append(thread)
+    return threads
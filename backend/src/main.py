@@ -1,12 +1,59 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Response, Header, Query, Request, Body
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from typing import List
-from sqlalchemy import desc
+from typing import Any, Dict, List, Optional
+from sqlalchemy import desc, func, select
 import datetime
+import logging
+import os
+import threading
+import time
+
+from .database.database import get_db, engine, DB_POOL_SIZE
+from .database.readiness import ping, warm_pool
+from .database.replicas import get_read_db, install_read_routing, read_engine, replica_engines, router as read_router
+from .models.models import Transaction, Event, Transaction_Entity, Transaction_Goods, Transaction_Status
+from .archive.archive import archived_event_status_counts, event_read_window, load_archived_events
+from .export.columnar import build_export_query, stream_export, ExportError, FORMATS as EXPORT_FORMATS
+from .jobs.handlers import JOB_HANDLERS
+from .jobs.queue import create_queue, job_to_dict, JOB_QUEUE_BACKEND
+from .jobs.worker import start_worker_threads
+from .risk.stress import Scenario, StressError, book_written_at, run_stress_test
+from .reference.snapshot import get_reference_data, load_reference_data
+from .ingest.events import ingest_events, MAX_BATCH_SIZE as EVENT_BATCH_MAX_SIZE
+from .duplicates.detector import duplicates_of, queue_check, unchecked_transactions, DUPLICATE_CHECK_ON_INGEST
+from .transactions.aggregate import get_transaction_aggregate
+from .api.fields import (
+    FieldError, RowContext, parse_fields, select_columns, format_rows, archived_event_columns, archived_event_row,
+    EVENT_FIELDS, ENTITY_FIELDS, TRANSACTION_FIELDS, TRANSACTION_STATUS_FIELDS,
+)
+from .api.compression import CompressionMiddleware
+from .api.admission import (
+    AdmissionControlMiddleware, RequestCoalescingMiddleware, ADMISSION_CONTROL_ENABLED, REQUEST_COALESCING_ENABLED,
+)
+from .search.search import ensure_fts_index, search, SEARCH_TYPES, MAX_LIMIT as SEARCH_MAX_LIMIT
+from .instrumentation.log import configure_logging
+from .instrumentation.metrics import (
+    render_metrics, start_state_writer, write_state, METRICS_MULTIPROC_DIR, PROMETHEUS_CONTENT_TYPE,
+)
+from .instrumentation.timing import RequestTimingMiddleware, instrument_engine
+from .instrumentation.writes import install_write_hooks
+from .instrumentation.slow_queries import install_slow_query_log, recent_slow_queries, clear_slow_queries, is_enabled as slow_query_log_enabled
+from .instrumentation.profiling import install_profiling, token_is_valid
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# Attribute SQL statement count and time to the request that issued it, and
+# record slow statements (off by default; see SLOW_QUERY_THRESHOLD_MS)
+for any_engine in (engine, *replica_engines()):
+    instrument_engine(any_engine)
+    install_slow_query_log(any_engine)
+# Let the in-process caches (the stress-testing book, the reference data)
+# see this process's writes; all of them go to the primary
+install_write_hooks(engine)
 
-from .database.database import get_db, engine
-from .models.models import Transaction, Event, Entity, Transaction_Entity, Transaction_Goods
 # Create the tables if they don't exist
 # Note: In production, use Alembic migrations instead
 # Base.metadata.create_all(bind=engine)
@@ -17,6 +64,14 @@ app = FastAPI(
     version="0.1.0",
 )
 
+# Per-route and cost-class concurrency limits shedding the excess with
+# 429/503, and identical in-flight list and stats requests sharing one
+# response. Added before CORS, so rejections still carry CORS headers.
+if ADMISSION_CONTROL_ENABLED:
+    app.add_middleware(AdmissionControlMiddleware)
+if REQUEST_COALESCING_ENABLED:
+    app.add_middleware(RequestCoalescingMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -24,15 +79,131 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Last-Write", "Retry-After"],
 )
 
+# Marks clients' writes so their next reads go to the primary; only with
+# DATABASE_REPLICA_URLS set (see READ_AFTER_WRITE_SECONDS)
+install_read_routing(app)
+
+# gzip/brotli for text and JSON responses above COMPRESSION_MINIMUM_SIZE
+app.add_middleware(CompressionMiddleware)
+# Added last so it wraps everything else and times the full request
+app.add_middleware(RequestTimingMiddleware)
+# Off by default; see PROFILING_ENABLED
+install_profiling(app)
+
+# Background jobs. With the in-memory queue (no job table needed) the workers
+# run as threads in this process; otherwise they run in run_workers.py.
+job_queue = create_queue(engine)
+JOB_WORKER_THREADS = int(os.getenv("JOB_WORKER_THREADS", "2"))
+_job_workers_stop = threading.Event()
+
+@app.on_event("startup")
+def start_job_workers():
+    if JOB_QUEUE_BACKEND == "memory":
+        start_worker_threads(job_queue, JOB_WORKER_THREADS, _job_workers_stop)
+
+# Pooled connections opened before the first request
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", str(DB_POOL_SIZE)))
+# Milliseconds each warmup step took (None if it failed), reported by /health
+_warmup = {}
+
+@app.on_event("startup")
+def warm_up():
+    # If the database isn't reachable yet, requests open connections and load
+    # the reference data on demand instead
+    for step, run in (
+        ("connection_pool", lambda: warm_pool(engine, DB_POOL_WARMUP)),
+        ("reference_data", lambda: load_reference_data(engine)),
+        # The SQLite search stand-in's FTS5 table (no-op on PostgreSQL)
+        ("search_index", lambda: ensure_fts_index(engine)),
+    ):
+        started = time.perf_counter()
+        try:
+            run()
+            _warmup[step] = round((time.perf_counter() - started) * 1000, 2)
+        except Exception:
+            logger.exception("Warmup step %s failed", step)
+            _warmup[step] = None
+    logger.info("Warmup finished", extra={"warmup_ms": _warmup})
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    _job_workers_stop.set()
+
+# With several workers, each one's metrics go to the shared METRICS_MULTIPROC_DIR
+_metrics_writer_stop = threading.Event()
+
+@app.on_event("startup")
+def start_metrics_writer():
+    if METRICS_MULTIPROC_DIR:
+        start_state_writer(_metrics_writer_stop)
+
+@app.on_event("shutdown")
+def stop_metrics_writer():
+    if METRICS_MULTIPROC_DIR:
+        _metrics_writer_stop.set()
+        write_state()
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the TSCMF API"}
 
 @app.get("/health")
-def health_check():
-    return {"status": "healthy"}
+def health_check(response: Response):
+    """
+    Readiness: 200 when this worker has started and can reach the database, 503 otherwise
+    """
+    try:
+        with engine.connect() as connection:
+            ping(connection)
+        database = "ok"
+    except Exception as e:
+        database = f"unreachable: {str(e)}"
+    if database != "ok":
+        response.status_code = 503
+    return {
+        "status": "healthy" if database == "ok" else "unavailable",
+        "database": database,
+        "warmup_ms": _warmup,
+        # As of each replica's last check; an unavailable replica fails its
+        # reads over to the primary, so it doesn't make this worker unready
+        "replicas": {
+            replica.name: {"healthy": replica.healthy, "lag_seconds": replica.lag}
+            for replica in read_router.replicas
+        },
+        "pid": os.getpid(),
+    }
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    Request and SQL timing metrics in Prometheus text format, of every
+    worker when METRICS_MULTIPROC_DIR is set
+    """
+    return Response(content=render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+def require_slow_query_log(x_debug_token: str = Header(default="")):
+    if not slow_query_log_enabled():
+        raise HTTPException(status_code=404, detail="Slow query log is disabled")
+    if not token_is_valid(x_debug_token):
+        raise HTTPException(status_code=403, detail="Invalid debug token")
+
+@app.get("/debug/slow-queries", dependencies=[Depends(require_slow_query_log)])
+def get_slow_queries(limit: int = 50):
+    """
+    Most recent statements slower than SLOW_QUERY_THRESHOLD_MS, newest first
+    """
+    return recent_slow_queries(limit)
+
+@app.delete("/debug/slow-queries", dependencies=[Depends(require_slow_query_log)])
+def delete_slow_queries():
+    """
+    Empty the slow query buffer
+    """
+    clear_slow_queries()
+    return {"status": "cleared"}
 
 @app.get("/db-check")
 def db_check(db: Session = Depends(get_db)):
@@ -44,89 +215,108 @@ def db_check(db: Session = Depends(get_db)):
         return {"status": "Database connection failed", "error": str(e)}
 
 @app.get("/api/events")
-def get_events(db: Session = Depends(get_db)):
+def get_events(
+    include_history: bool = False,
+    fields: Optional[str] = Query(None, description="Comma separated fields to return (default: all)"),
+    db: Session = Depends(get_read_db),
+):
     """
     Retrieve all events with related transaction and entity information.
+    Where `event` is partitioned, only events of the last EVENT_HOT_MONTHS
+    months are returned unless include_history is set, which adds older
+    events still in the database and those archived out of it. Only the
+    columns behind the requested `fields` are read.
     """
     try:
-        print("Starting events API endpoint request...")
+        names = parse_fields("events", fields, EVENT_FIELDS)
+    except FieldError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
         # Query events with related information
-        events = db.query(Event).order_by(desc(Event.created_at)).all()
-        print(f"Found {len(events)} events in the database")
+        query = select(*select_columns(EVENT_FIELDS, names)).select_from(Event)
+        if "transaction" in names:
+            query = query.outerjoin(Transaction, Transaction.transaction_id == Event.transaction_id)
+        since = event_read_window(db.connection(), include_history)
+        if since is not None:
+            # Lets PostgreSQL skip the partitions of older months
+            query = query.where(Event.created_at >= since)
+        events = db.execute(query.order_by(desc(Event.created_at))).all()
+        logger.debug("Found %d events in the database", len(events))
         
         # Format the events for the response
-        result = []
-        for event in events:
-            print(f"Processing event {event.event_id}")
-            # Get transaction info if available
-            transaction_info = {}
-            if event.transaction_id:
-                transaction = event.transaction
-                if transaction:
-                    transaction_info = {
-                        "transaction_id": transaction.transaction_id,
-                        "product_name": transaction.product_name,
-                        "industry": transaction.industry,
-                        "amount": float(transaction.amount) if transaction.amount else None,
-                        "currency": transaction.currency,
-                        "country": transaction.country,
-                        "location": transaction.location,
-                        "beneficiary": transaction.beneficiary,
-                        "maturity_date": transaction.maturity_date.isoformat() if transaction.maturity_date else None,
-                    }
-            
-            # Get entity info if available
-            entity_info = {}
-            if event.entity_id:
-                entity = event.entity
-                if entity:
-                    entity_info = {
-                        "entity_name": entity.entity_name,
-                        "entity_address": entity.entity_address,
-                        "country": entity.country,
-                        "client_type": entity.client_type,
-                        "risk_rating": entity.risk_rating,
-                    }
-            
-            # Combine all data
-            event_data = {
-                "event_id": event.event_id,
-                "transaction_id": event.transaction_id,
-                "entity_id": event.entity_id,
-                "source": event.source,
-                "source_content": event.source_content,
-                "type": event.type,
-                "created_at": event.created_at.isoformat(),
-                "status": event.status,
-                "transaction": transaction_info,
-                "entity": entity_info,
-            }
-            
-            result.append(event_data)
-        
-        print(f"Returning {len(result)} events in response")
+        context = RowContext(get_reference_data(engine), db)
+        result = format_rows(events, EVENT_FIELDS, names, context)
+        if include_history:
+            with_transactions = "transaction" in names
+            for archived in load_archived_events(db, archived_event_columns(names), with_transactions):
+                if with_transactions:
+                    archived = [archived_event_row(event) for event in archived]
+                result += format_rows(archived, EVENT_FIELDS, names, context)
         return result
     except Exception as e:
-        print(f"Error retrieving events: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error retrieving events")
         raise HTTPException(status_code=500, detail=f"Error retrieving events: {str(e)}")
 
+@app.post("/api/events/batch")
+def create_events_batch(
+    events: List[Dict[str, Any]] = Body(..., embed=True, max_length=EVENT_BATCH_MAX_SIZE),
+    db: Session = Depends(get_db),
+):
+    """
+    Insert a batch of events. Each event is deduplicated on its
+    idempotency_key (or a hash of its content when none is given), so a
+    retried batch inserts nothing twice. Returns one result per event.
+    """
+    try:
+        results = ingest_events(db, events)
+    except Exception as e:
+        db.rollback()
+        logger.exception("Error ingesting events")
+        raise HTTPException(status_code=500, detail=f"Error ingesting events: {str(e)}")
+
+    counts = {"inserted": 0, "duplicate": 0, "rejected": 0}
+    for result in results:
+        counts[result["status"]] += 1
+
+    if DUPLICATE_CHECK_ON_INGEST:
+        # Events for a transaction not checked yet mean it has just arrived:
+        # look for near duplicates of it in the background
+        try:
+            transaction_ids = {events[result["index"]].get("transaction_id")
+                               for result in results if result["status"] == "inserted"} - {None}
+            unchecked = unchecked_transactions(db, transaction_ids) if transaction_ids else set()
+            if unchecked:
+                queue_check(job_queue, unchecked)
+        except Exception:
+            # The events are stored; detect_duplicates.py picks up unchecked transactions
+            logger.exception("Error queueing the duplicate check")
+    return {
+        "received": len(events),
+        "inserted": counts["inserted"],
+        "duplicates": counts["duplicate"],
+        "rejected": counts["rejected"],
+        "results": results,
+    }
+
 @app.get("/api/events-simple")
-def get_events_simple(db: Session = Depends(get_db)):
+def get_events_simple(include_history: bool = False, db: Session = Depends(get_read_db)):
     """
-    Simplified endpoint to test events retrieval
+    Simplified endpoint to test events retrieval (limited to the hot window
+    as /api/events is)
     """
     try:
-        print("Starting simple events API endpoint request...")
         # Query events without relationships
-        events = db.query(Event).order_by(desc(Event.created_at)).all()
-        print(f"Found {len(events)} events in the database")
+        query = db.query(Event).order_by(desc(Event.created_at))
+        since = event_read_window(db.connection(), include_history)
+        if since is not None:
+            query = query.filter(Event.created_at >= since)
+        events = query.all()
+        logger.debug("Found %d events in the database", len(events))
         
         # Format the events for the response - simple version
-        result = []
-        for event in events:
-            event_data = {
+        def simple_event(event):
+            return {
                 "event_id": event.event_id,
                 "transaction_id": event.transaction_id,
                 "entity_id": event.entity_id,
@@ -135,111 +325,78 @@ def get_events_simple(db: Session = Depends(get_db)):
                 "created_at": event.created_at.isoformat(),
                 "status": event.status,
             }
-            result.append(event_data)
+
+        result = [simple_event(event) for event in events]
+        if include_history:
+            columns = ["event_id", "transaction_id", "entity_id", "source", "type", "created_at", "status"]
+            for archived in load_archived_events(db, columns):
+                result += [simple_event(event) for event in archived]
         
-        print(f"Returning {len(result)} simple events in response")
         return result
     except Exception as e:
-        print(f"Error retrieving simple events: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error retrieving simple events")
         raise HTTPException(status_code=500, detail=f"Error retrieving simple events: {str(e)}")
 
 @app.get("/api/entities")
-def get_entities(db: Session = Depends(get_db)):
+def get_entities(fields: Optional[str] = Query(None, description="Comma separated fields to return (default: all)")):
     """
-    Retrieve all entities (clients)
+    Retrieve all entities (clients), from the in-memory reference data
     """
     try:
-        print("Starting entities API endpoint request...")
-        entities = db.query(Entity).all()
-        print(f"Found {len(entities)} entities in the database")
-        
-        result = []
-        for entity in entities:
-            entity_data = {
-                "entity_id": entity.entity_id,
-                "entity_name": entity.entity_name,
-                "entity_address": entity.entity_address,
-                "country": entity.country,
-                "client_type": entity.client_type,
-                "risk_rating": entity.risk_rating,
-                "onboard_date": entity.onboard_date.isoformat() if entity.onboard_date else None,
-            }
-            result.append(entity_data)
+        names = parse_fields("entities", fields, ENTITY_FIELDS)
+    except FieldError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        entities = sorted(get_reference_data(engine).entities.values(), key=lambda entity: entity.entity_id)
+        logger.debug("Found %d entities in the database", len(entities))
         
-        print(f"Returning {len(result)} entities in response")
-        return result
+        return format_rows(entities, ENTITY_FIELDS, names, None)
     except Exception as e:
-        print(f"Error retrieving entities: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error retrieving entities")
         raise HTTPException(status_code=500, detail=f"Error retrieving entities: {str(e)}")
 
 @app.get("/api/transactions")
-def get_transactions(db: Session = Depends(get_db)):
+def get_transactions(
+    status: Optional[str] = None,
+    event_type: Optional[str] = Query(None, alias="type"),
+    fields: Optional[str] = Query(None, description="Comma separated fields to return (default: all)"),
+    db: Session = Depends(get_read_db),
+):
     """
-    Retrieve all transactions with related entity information
+    Retrieve all transactions with related entity information and the status,
+    type and source of their latest event, optionally filtered by status or
+    type. Only the columns behind the requested `fields` are read.
     """
     try:
-        print("Starting transactions API endpoint request...")
-        transactions = db.query(Transaction).order_by(desc(Transaction.created_at)).all()
-        print(f"Found {len(transactions)} transactions in the database")
-        
-        result = []
-        for transaction in transactions:
-            # Get entity info if available
-            entity_info = {}
-            if transaction.entity_id:
-                entity = transaction.entity
-                if entity:
-                    entity_info = {
-                        "entity_id": entity.entity_id,
-                        "entity_name": entity.entity_name,
-                        "country": entity.country,
-                        "client_type": entity.client_type,
-                        "risk_rating": entity.risk_rating,
-                    }
-            
-            # Format transaction
-            transaction_data = {
-                "id": transaction.transaction_id,
-                "transaction_id": transaction.transaction_id,
-                "entity_id": transaction.entity_id,
-                "product_id": transaction.product_id,
-                "product_name": transaction.product_name,
-                "industry": transaction.industry,
-                "amount": float(transaction.amount) if transaction.amount else None,
-                "currency": transaction.currency,
-                "country": transaction.country,
-                "location": transaction.location,
-                "beneficiary": transaction.beneficiary,
-                "tenor": transaction.tenor,
-                "maturity_date": transaction.maturity_date.isoformat() if transaction.maturity_date else None,
-                "price": float(transaction.price) if transaction.price else None,
-                "created_at": transaction.created_at.isoformat() if transaction.created_at else None,
-                "reference_number": f"TXN-{transaction.transaction_id:05d}",
-                "client_name": entity_info.get("entity_name", ""),
-                "client_type": entity_info.get("client_type", ""),
-                "entity": entity_info
-            }
-            result.append(transaction_data)
+        names = parse_fields("transactions", fields, TRANSACTION_FIELDS)
+    except FieldError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        query = select(*select_columns(TRANSACTION_FIELDS, names)).select_from(Transaction)
+        if status or event_type or TRANSACTION_STATUS_FIELDS.intersection(names):
+            query = query.outerjoin(
+                Transaction_Status, Transaction_Status.transaction_id == Transaction.transaction_id
+            )
+        if status:
+            query = query.where(Transaction_Status.status == status)
+        if event_type:
+            query = query.where(Transaction_Status.type == event_type)
+        transactions = db.execute(query.order_by(desc(Transaction.created_at))).all()
+        logger.debug("Found %d transactions in the database", len(transactions))
         
-        print(f"Returning {len(result)} transactions in response")
-        return result
+        return format_rows(transactions, TRANSACTION_FIELDS, names, RowContext(get_reference_data(engine), db))
     except Exception as e:
-        print(f"Error retrieving transactions: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error retrieving transactions")
         raise HTTPException(status_code=500, detail=f"Error retrieving transactions: {str(e)}")
 
 @app.get("/api/transactions/{transaction_id}")
-def get_transaction_by_id(transaction_id: int, db: Session = Depends(get_db)):
+def get_transaction_by_id(transaction_id: int, db: Session = Depends(get_read_db)):
     """
     Retrieve a single transaction by ID with related entity and event information
     """
     try:
-        print(f"Starting transaction detail API endpoint request for ID: {transaction_id}...")
         
         # Query for the specific transaction
         transaction = db.query(Transaction).filter(Transaction.transaction_id == transaction_id).first()
@@ -250,7 +407,7 @@ def get_transaction_by_id(transaction_id: int, db: Session = Depends(get_db)):
         # Get entity info if available
         entity_info = {}
         if transaction.entity_id:
-            entity = transaction.entity
+            entity = get_reference_data(engine).entity(transaction.entity_id, db)
             if entity:
                 entity_info = {
                     "entity_id": entity.entity_id,
@@ -278,12 +435,9 @@ def get_transaction_by_id(transaction_id: int, db: Session = Depends(get_db)):
             }
             events_data.append(event_data)
         
-        # Determine status and type from most recent event
-        status = "Pending Review"
-        event_type = "Request"
-        if events:
-            status = events[0].status
-            event_type = events[0].type
+        # Status, type and source of the latest event, kept in transaction_status
+        # (it outlives the events themselves when they're archived)
+        latest = transaction.current_status
         
         # Format transaction with detailed information
         transaction_data = {
@@ -308,9 +462,9 @@ def get_transaction_by_id(transaction_id: int, db: Session = Depends(get_db)):
             "client_country": entity_info.get("country", ""),
             "client_address": entity_info.get("entity_address", ""),
             "risk_rating": entity_info.get("risk_rating", ""),
-            "status": status,
-            "type": event_type,
-            "source": events[0].source if events else "System",
+            "status": latest.status if latest else "Pending Review",
+            "type": latest.type if latest else "Request",
+            "source": latest.source if latest else "System",
             "goods_list": [{"name": transaction.industry, "quantity": "1", "unit": "lot"}] if transaction.industry else [],
             "entity": entity_info,
             "events": events_data,
@@ -323,45 +477,54 @@ def get_transaction_by_id(transaction_id: int, db: Session = Depends(get_db)):
             }] if entity_info else []
         }
         
-        print(f"Returning transaction detail for ID: {transaction_id}")
         return transaction_data
     except HTTPException as he:
         raise he
     except Exception as e:
-        print(f"Error retrieving transaction detail: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error retrieving transaction detail")
         raise HTTPException(status_code=500, detail=f"Error retrieving transaction detail: {str(e)}")
 
 @app.get("/api/dashboard/stats")
-def get_dashboard_stats(db: Session = Depends(get_db)):
+def get_dashboard_stats(include_history: bool = False, db: Session = Depends(get_read_db)):
     """
-    Retrieve summary statistics for the dashboard
+    Retrieve summary statistics for the dashboard. Where `event` is
+    partitioned, event counts cover the last EVENT_HOT_MONTHS months unless
+    include_history is set, which counts every event, archived ones included.
     """
     try:
-        print("Starting dashboard stats API endpoint request...")
         
         # Get counts
-        entity_count = db.query(Entity).count()
+        reference = get_reference_data(engine)
+        entity_count = len(reference.entities)
         transaction_count = db.query(Transaction).count()
-        event_count = db.query(Event).count()
         
         # Get unique product count
-        product_count = db.query(Transaction.product_name).distinct().count()
+        product_count = len(reference.product_names())
         
         # Get events by status
-        events = db.query(Event).all()
-        status_counts = {}
-        for event in events:
-            status_counts[event.status] = status_counts.get(event.status, 0) + 1
+        since = event_read_window(db.connection(), include_history)
+        query = db.query(Event.status, func.count()).group_by(Event.status)
+        if since is not None:
+            query = query.filter(Event.created_at >= since)
+        status_counts = dict(query.all())
+        if include_history:
+            for status, count in archived_event_status_counts().items():
+                status_counts[status] = status_counts.get(status, 0) + count
+        event_count = sum(status_counts.values())
         
-        # Approximate status categories for transactions based on events
-        approved_count = sum(count for status, count in status_counts.items() 
-                          if 'Success' in status or 'Booked' in status)
-        processing_count = sum(count for status, count in status_counts.items() 
-                            if 'Pending' in status or 'In Progress' in status)
-        declined_count = sum(count for status, count in status_counts.items() 
-                          if 'Failed' in status or 'Rejected' in status)
+        # Transactions by the status of their latest event
+        transaction_status_counts = dict(
+            db.query(Transaction_Status.status, func.count()).group_by(Transaction_Status.status).all()
+        )
+        
+        # Status categories of transactions, from those counts
+        def count_matching(*words):
+            return sum(count for status, count in transaction_status_counts.items()
+                       if status and any(word in status for word in words))
+
+        approved_count = count_matching('Success', 'Booked')
+        processing_count = count_matching('Pending', 'In Progress')
+        declined_count = count_matching('Failed', 'Rejected')
         
         # Create response
         result = {
@@ -371,29 +534,27 @@ def get_dashboard_stats(db: Session = Depends(get_db)):
                 "total": transaction_count,
                 "approved": approved_count,
                 "processing": processing_count,
-                "declined": declined_count
+                "declined": declined_count,
+                "by_status": transaction_status_counts
             },
             "events": {
                 "total": event_count,
-                "by_status": status_counts
+                "by_status": status_counts,
+                "since": since.isoformat() if since else None
             }
         }
         
-        print(f"Returning dashboard stats")
         return result
     except Exception as e:
-        print(f"Error retrieving dashboard stats: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error retrieving dashboard stats")
         raise HTTPException(status_code=500, detail=f"Error retrieving dashboard stats: {str(e)}")
 
 @app.get("/api/transactions/{transaction_id}/details")
-def get_transaction_details(transaction_id: int, db: Session = Depends(get_db)):
+def get_transaction_details(transaction_id: int, db: Session = Depends(get_read_db)):
     """
     Retrieve transaction entity and goods information by transaction ID
     """
     try:
-        print(f"Starting transaction details API endpoint request for ID: {transaction_id}...")
         
         # Query transaction entities
         transaction_entities = db.query(Transaction_Entity).filter(
@@ -406,9 +567,9 @@ def get_transaction_details(transaction_id: int, db: Session = Depends(get_db)):
         ).all()
         
         if not transaction_entities and not transaction_goods:
-            print(f"No details found for transaction ID: {transaction_id}")
+            logger.debug("No details found for transaction ID: %s", transaction_id)
         else:
-            print(f"Found {len(transaction_entities)} entities and {len(transaction_goods)} goods for transaction ID: {transaction_id}")
+            logger.debug("Found %d entities and %d goods for transaction ID: %s", len(transaction_entities), len(transaction_goods), transaction_id)
         
         # Format the entities data
         entities_data = []
@@ -441,10 +602,151 @@ def get_transaction_details(transaction_id: int, db: Session = Depends(get_db)):
             "goods": goods_data
         }
         
-        print(f"Returning transaction details for ID: {transaction_id}")
         return transaction_details
     except Exception as e:
-        print(f"Error retrieving transaction details: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Error retrieving transaction details: {str(e)}")
\ No newline at end of file
+        logger.exception("Error retrieving transaction details")
+        raise HTTPException(status_code=500, detail=f"Error retrieving transaction details: {str(e)}")
+
+@app.get("/api/transactions/{transaction_id}/aggregate")
+def get_transaction_aggregate_by_id(transaction_id: int, db: Session = Depends(get_read_db)):
+    """
+    Retrieve a transaction with its entity, events, parties and goods in one
+    request (a single SQL statement on PostgreSQL)
+    """
+    try:
+        aggregate = get_transaction_aggregate(db, transaction_id)
+    except Exception as e:
+        logger.exception("Error retrieving transaction aggregate")
+        raise HTTPException(status_code=500, detail=f"Error retrieving transaction aggregate: {str(e)}")
+
+    if aggregate is None:
+        raise HTTPException(status_code=404, detail=f"Transaction with ID {transaction_id} not found")
+    return aggregate
+
+@app.get("/api/transactions/{transaction_id}/duplicates")
+def get_transaction_duplicates(transaction_id: int, db: Session = Depends(get_read_db)):
+    """
+    Retrieve the near-duplicate pairs a transaction was flagged in, as the
+    newer transaction or as the one duplicated
+    """
+    try:
+        if db.get(Transaction, transaction_id) is None:
+            raise HTTPException(status_code=404, detail=f"Transaction with ID {transaction_id} not found")
+        return duplicates_of(db, transaction_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error retrieving transaction duplicates")
+        raise HTTPException(status_code=500, detail=f"Error retrieving transaction duplicates: {str(e)}")
+
+@app.post("/api/jobs", status_code=202)
+def create_job(
+    kind: str = Body(...),
+    payload: Dict[str, Any] = Body(default={}),
+    priority: int = Body(default=0),
+    max_attempts: int = Body(default=3, ge=1, le=20),
+):
+    """
+    Queue a background job. Higher priorities run first; failed attempts are
+    retried with exponential backoff up to max_attempts.
+    """
+    if kind not in JOB_HANDLERS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of: {', '.join(sorted(JOB_HANDLERS))}")
+    try:
+        job_id = job_queue.enqueue(kind, payload, priority=priority, max_attempts=max_attempts)
+        return job_to_dict(job_queue.get(job_id))
+    except Exception as e:
+        logger.exception("Error creating job")
+        raise HTTPException(status_code=500, detail=f"Error creating job: {str(e)}")
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: int):
+    """
+    Retrieve a background job's status, progress and result
+    """
+    try:
+        job = job_queue.get(job_id)
+    except Exception as e:
+        logger.exception("Error retrieving job")
+        raise HTTPException(status_code=500, detail=f"Error retrieving job: {str(e)}")
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job with ID {job_id} not found")
+    return job_to_dict(job)
+
+@app.post("/api/risk/stress")
+def stress_test(
+    request: Request,
+    scenarios: List[Scenario] = Body(...),
+    group_by: Optional[str] = Body(default=None),
+    as_of: Optional[datetime.datetime] = Body(default=None),
+):
+    """
+    Run what-if scenarios (rating downgrades, FX moves, PD/LGD/exposure
+    shocks) against the open book and return exposure and expected loss
+    before and after each one
+    """
+    try:
+        # The book is read (and cached) from a replica unless this process
+        # changed it too recently for the replicas to have caught up
+        return run_stress_test(read_engine(request, since=book_written_at()), scenarios, group_by, as_of)
+    except StressError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("Error running stress test")
+        raise HTTPException(status_code=500, detail=f"Error running stress test: {str(e)}")
+
+@app.get("/api/search")
+def search_records(
+    q: str = Query(..., min_length=2, description="Search text"),
+    types: Optional[str] = Query(None, description="Comma separated subset of: entity, transaction, party, event"),
+    limit: int = Query(20, ge=1, le=SEARCH_MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Ranked full-text and fuzzy search across entity names and addresses,
+    transaction beneficiaries, transaction party addresses and event content
+    """
+    search_types = SEARCH_TYPES
+    if types:
+        search_types = tuple(dict.fromkeys(t.strip() for t in types.split(",") if t.strip()))
+        unknown = [t for t in search_types if t not in SEARCH_TYPES]
+        if unknown or not search_types:
+            raise HTTPException(status_code=400, detail=f"types must be a comma separated subset of: {', '.join(SEARCH_TYPES)}")
+
+    try:
+        return search(db, q, search_types, limit, offset)
+    except Exception as e:
+        logger.exception("Error searching records")
+        raise HTTPException(status_code=500, detail=f"Error searching records: {str(e)}")
+
+@app.get("/api/export/{dataset}")
+def export_dataset(
+    dataset: str,
+    request: Request,
+    format: str = Query("arrow", description="arrow (IPC stream) or parquet"),
+    columns: Optional[str] = Query(None, description="Comma separated columns to export (default: all)"),
+    limit: Optional[int] = Query(None, ge=1),
+):
+    """
+    Stream a dataset (transactions, events or entity_aggregates) as Arrow or
+    Parquet. Any other query parameter is a filter applied in SQL:
+    `column=value` (comma separated for several values), `column_from` and
+    `column_to` for ranges.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    filters = {key: value for key, value in request.query_params.items() if key not in ("format", "columns", "limit")}
+    selected = [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+
+    try:
+        statement, output_columns = build_export_query(dataset, selected, filters, limit)
+    except ExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        stream_export(read_engine(request), statement, output_columns, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{dataset}.{extension}"'},
+    )
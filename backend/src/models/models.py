@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, ARRAY
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, ForeignKey, ARRAY, JSON, LargeBinary, Text, Index, text, event, func
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
 from ..database.database import Base
+from ..transactions.status import install_status_trigger
 
 class Transaction(Base):
     __tablename__ = "transaction"
@@ -25,17 +26,19 @@ class Transaction(Base):
     events = relationship("Event", backref="transaction")
     transaction_entities = relationship("Transaction_Entity", backref="transaction")
     transaction_goods = relationship("Transaction_Goods", backref="transaction")
+    current_status = relationship("Transaction_Status", uselist=False, backref="transaction")
 
 class Event(Base):
     __tablename__ = "event"
 
     event_id = Column(Integer, primary_key=True, autoincrement=True)
-    transaction_id = Column(Integer, ForeignKey("transaction.transaction_id"))
+    transaction_id = Column(Integer, ForeignKey("transaction.transaction_id"), index=True)
     entity_id = Column(Integer, ForeignKey("entity.entity_id"))
     source = Column(String)
     source_content = Column(String)
     type = Column(String)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    # Partition key on PostgreSQL (monthly range partitions, see archive_events.py)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     status = Column(String)
 
 class Entity(Base):
@@ -48,6 +51,9 @@ class Entity(Base):
     client_type = Column(String)
     risk_rating = Column(String)
     onboard_date = Column(DateTime)
+    # Set from the database clock on every change, so the in-memory reference
+    # data (src/reference) can reload only the entities changed since it last looked
+    updated_at = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now(), index=True)
     
     transactions = relationship("Transaction", backref="entity")
     events = relationship("Event", backref="entity")
@@ -68,4 +74,80 @@ class Transaction_Goods(Base):
     transaction_id = Column(Integer, ForeignKey("transaction.transaction_id"))
     item_name = Column(String)
     quantity = Column(Integer)
-    unit = Column(String)
\ No newline at end of file
+    unit = Column(String)
+
+class Transaction_Status(Base):
+    __tablename__ = "transaction_status"
+
+    # Latest event per transaction, maintained by a trigger on event inserts
+    # (see src/transactions/status.py)
+    transaction_id = Column(Integer, ForeignKey("transaction.transaction_id"), primary_key=True)
+    event_id = Column(Integer)
+    status = Column(String, index=True)
+    type = Column(String, index=True)
+    source = Column(String)
+    event_created_at = Column(DateTime)
+
+class Event_Idempotency_Key(Base):
+    __tablename__ = "event_idempotency_key"
+
+    # One row per event ingested through /api/events/batch. Kept outside the
+    # event table because a unique index on the partitioned table would have
+    # to include created_at.
+    idempotency_key = Column(String, primary_key=True)
+    event_id = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class Transaction_Signature(Base):
+    __tablename__ = "transaction_signature"
+
+    # MinHash signature of every transaction checked for near duplicates
+    # (see src/duplicates/detector.py)
+    transaction_id = Column(Integer, ForeignKey("transaction.transaction_id"), primary_key=True)
+    signature = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class Transaction_Signature_Bucket(Base):
+    __tablename__ = "transaction_signature_bucket"
+
+    # LSH index over the signatures: one row per band of each signature.
+    # Transactions sharing a (band, bucket) are duplicate candidates.
+    band = Column(Integer, primary_key=True)
+    bucket = Column(BigInteger, primary_key=True)
+    transaction_id = Column(Integer, ForeignKey("transaction.transaction_id"), primary_key=True, index=True)
+
+class Job(Base):
+    __tablename__ = "job"
+
+    # Background work claimed by run_workers.py (see src/jobs/queue.py)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String, nullable=False)
+    payload = Column(JSON)
+    status = Column(String, nullable=False, default="queued")
+    priority = Column(Integer, nullable=False, default=0)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    progress = Column(Float)
+    progress_message = Column(String)
+    result = Column(JSON)
+    error = Column(Text)
+    locked_by = Column(String)
+    locked_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    # At most one queued job per key; enqueueing another merges into it
+    unique_key = Column(String)
+
+    __table_args__ = (
+        # Only queued jobs are ever scanned for work
+        Index("ix_job_queued", priority.desc(), run_after, id,
+              postgresql_where=text("status = 'queued'"), sqlite_where=text("status = 'queued'")),
+        Index("ix_job_unique_key_queued", unique_key, unique=True,
+              postgresql_where=text("status = 'queued'"), sqlite_where=text("status = 'queued'")),
+    )
+
+# Databases built with create_all (local SQLite databases, benchmarks) get the
+# trigger here; migrated ones get it from the transaction_status migration
+event.listen(Base.metadata, "after_create", lambda target, connection, **kw: install_status_trigger(connection))
@@ -0,0 +1,197 @@
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+from sqlalchemy import func, select
+
+from ..instrumentation.writes import on_table_write
+from ..models.models import Entity, Transaction
+
+logger = logging.getLogger(__name__)
+
+# Seconds between incremental refreshes, which reload the entities updated and
+# the products first seen since the previous one. Writes made through this
+# process trigger one straight away.
+REFERENCE_REFRESH_SECONDS = float(os.getenv("REFERENCE_REFRESH_SECONDS", "30"))
+
+# Seconds between full reloads, which also drop deleted entities and pick up
+# renamed products
+REFERENCE_FULL_RELOAD_SECONDS = float(os.getenv("REFERENCE_FULL_RELOAD_SECONDS", "3600"))
+
+# An incremental refresh re-reads entities updated this close to the previous
+# watermark, in case a slower transaction committed an earlier timestamp
+# after the previous refresh ran
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+ENTITY_FIELDS = ("entity_id", "entity_name", "entity_address", "country", "client_type", "risk_rating", "onboard_date")
+
+
+class EntityRecord:
+    """An entity row held in memory. Same attributes as Entity, no relationships."""
+
+    __slots__ = ENTITY_FIELDS
+
+    def __init__(self, entity_id, entity_name, entity_address, country, client_type, risk_rating, onboard_date):
+        self.entity_id = entity_id
+        self.entity_name = entity_name
+        self.entity_address = entity_address
+        self.country = country
+        self.client_type = client_type
+        self.risk_rating = risk_rating
+        self.onboard_date = onboard_date
+
+
+class ProductRecord:
+    """A product as named on its transactions (there is no product table)."""
+
+    __slots__ = ("product_id", "product_name")
+
+    def __init__(self, product_id, product_name):
+        self.product_id = product_id
+        self.product_name = product_name
+
+
+class ReferenceSnapshot:
+    """
+    Entities by entity_id and products by product_id. A snapshot is never
+    changed once published, except to add an entity looked up after a miss,
+    so readers can use one without locking.
+    """
+
+    __slots__ = ("entities", "products", "entity_watermark", "transaction_watermark",
+                 "version", "refreshed_at", "reloaded_at")
+
+    def __init__(self, entities, products, entity_watermark, transaction_watermark, version, reloaded_at):
+        self.entities = entities
+        self.products = products
+        self.entity_watermark = entity_watermark
+        self.transaction_watermark = transaction_watermark
+        self.version = version
+        self.refreshed_at = time.monotonic()
+        self.reloaded_at = reloaded_at
+
+    def entity(self, entity_id, db=None):
+        """
+        The entity with this id, or None. On a miss (an entity created by
+        another process since the last refresh) it is read through `db`.
+        """
+        if entity_id is None:
+            return None
+        record = self.entities.get(entity_id)
+        if record is None and db is not None:
+            row = db.execute(select(*_entity_columns()).where(Entity.entity_id == entity_id)).first()
+            if row is not None:
+                record = self.entities[entity_id] = EntityRecord(*row[:-1])
+        return record
+
+    def product_names(self):
+        return {product.product_name for product in self.products.values()}
+
+
+_snapshot_lock = threading.Lock()
+_snapshot = None
+_snapshot_version = 0
+
+def invalidate_reference_data():
+    global _snapshot_version
+    _snapshot_version += 1
+
+
+# Refresh the reference data on next use whenever this process commits a
+# write to transaction or entity
+on_table_write(("transaction", "entity"), invalidate_reference_data)
+
+
+def _entity_columns():
+    return [getattr(Entity, field) for field in ENTITY_FIELDS] + [Entity.updated_at]
+
+
+def _read_entities(connection, since=None):
+    statement = select(*_entity_columns())
+    if since is not None:
+        statement = statement.where(Entity.updated_at > since - REFRESH_OVERLAP)
+    records = {}
+    watermark = since
+    for row in connection.execute(statement):
+        records[row.entity_id] = EntityRecord(*row[:-1])
+        if watermark is None or row.updated_at > watermark:
+            watermark = row.updated_at
+    return records, watermark
+
+
+def _read_products(connection, after=0):
+    # New products only arrive with new transactions, so the incremental read
+    # is a range scan on the transaction primary key
+    statement = (
+        select(Transaction.product_id, Transaction.product_name, func.max(Transaction.transaction_id))
+        .where(Transaction.transaction_id > after, Transaction.product_id.is_not(None))
+        .group_by(Transaction.product_id, Transaction.product_name)
+    )
+    records = {}
+    watermark = after
+    for product_id, product_name, last_transaction_id in connection.execute(statement):
+        records[product_id] = ProductRecord(product_id, product_name)
+        watermark = max(watermark, last_transaction_id)
+    return records, watermark
+
+
+def _reload(engine, version):
+    with engine.connect() as connection:
+        entities, entity_watermark = _read_entities(connection)
+        products, transaction_watermark = _read_products(connection)
+    return ReferenceSnapshot(entities, products, entity_watermark, transaction_watermark, version, time.monotonic())
+
+
+def _refresh(engine, snapshot, version):
+    with engine.connect() as connection:
+        changed_entities, entity_watermark = _read_entities(connection, snapshot.entity_watermark)
+        new_products, transaction_watermark = _read_products(connection, snapshot.transaction_watermark)
+    return ReferenceSnapshot(
+        {**snapshot.entities, **changed_entities}, {**snapshot.products, **new_products},
+        entity_watermark, transaction_watermark, version, snapshot.reloaded_at,
+    )
+
+
+def load_reference_data(engine):
+    """Read all entities and products into a new snapshot (run at startup)."""
+    global _snapshot
+    with _snapshot_lock:
+        started = time.perf_counter()
+        snapshot = _snapshot = _reload(engine, _snapshot_version)
+    logger.info("Loaded reference data", extra={
+        "entities": len(snapshot.entities), "products": len(snapshot.products),
+        "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+    })
+    return snapshot
+
+
+def get_reference_data(engine):
+    """
+    The current snapshot, refreshed first if it was invalidated or is due.
+    While one request refreshes, the others keep using the previous snapshot.
+    """
+    global _snapshot
+    snapshot = _snapshot
+    if snapshot is None:
+        with _snapshot_lock:
+            if _snapshot is None:
+                _snapshot = _reload(engine, _snapshot_version)
+            return _snapshot
+
+    now = time.monotonic()
+    full = now - snapshot.reloaded_at > REFERENCE_FULL_RELOAD_SECONDS
+    if not full and snapshot.version == _snapshot_version and now - snapshot.refreshed_at <= REFERENCE_REFRESH_SECONDS:
+        return snapshot
+    if not _snapshot_lock.acquire(blocking=False):
+        return snapshot
+    try:
+        version = _snapshot_version
+        snapshot = _snapshot = _reload(engine, version) if full else _refresh(engine, _snapshot, version)
+    except Exception:
+        # Serve the previous snapshot rather than fail the request
+        logger.exception("Error refreshing reference data")
+    finally:
+        _snapshot_lock.release()
+    return snapshot
@@ -0,0 +1,202 @@
+import re
+
+from sqlalchemy import text
+
+# Searchable document types and the columns each one matches on. On Postgres
+# these are served by the tsvector and pg_trgm GIN indexes created in the
+# search migration; on SQLite by the FTS5 table ensure_fts_index builds at
+# startup.
+SEARCH_TYPES = ("entity", "transaction", "party", "event")
+
+MAX_LIMIT = 100
+SNIPPET_LENGTH = 200
+
+# Each branch is limited to the best :window rows before the union is sorted,
+# so the cost of a page is bounded by offset + limit, not by the match count.
+_POSTGRES_BRANCHES = {
+    "entity": """
+        (SELECT 'entity' AS type, e.entity_id AS id, NULL::integer AS transaction_id,
+                e.entity_name AS title, left(e.entity_address, :snippet_length) AS snippet,
+                ts_rank(to_tsvector('simple', coalesce(e.entity_name, '') || ' ' || coalesce(e.entity_address, '')), q.tsq)
+                    + greatest(similarity(e.entity_name, :q), similarity(e.entity_address, :q)) AS score
+         FROM entity e, q
+         WHERE to_tsvector('simple', coalesce(e.entity_name, '') || ' ' || coalesce(e.entity_address, '')) @@ q.tsq
+            OR e.entity_name % :q OR e.entity_address % :q
+         ORDER BY score DESC LIMIT :window)
+    """,
+    "transaction": """
+        (SELECT 'transaction' AS type, t.transaction_id AS id, t.transaction_id AS transaction_id,
+                t.beneficiary AS title, t.product_name AS snippet,
+                ts_rank(to_tsvector('simple', coalesce(t.beneficiary, '')), q.tsq)
+                    + similarity(t.beneficiary, :q) AS score
+         FROM transaction t, q
+         WHERE to_tsvector('simple', coalesce(t.beneficiary, '')) @@ q.tsq OR t.beneficiary % :q
+         ORDER BY score DESC LIMIT :window)
+    """,
+    "party": """
+        (SELECT 'party' AS type, te.id AS id, te.transaction_id AS transaction_id,
+                te.type AS title, left(te.address, :snippet_length) AS snippet,
+                ts_rank(to_tsvector('simple', coalesce(te.address, '')), q.tsq)
+                    + similarity(te.address, :q) AS score
+         FROM transaction_entity te, q
+         WHERE to_tsvector('simple', coalesce(te.address, '')) @@ q.tsq OR te.address % :q
+         ORDER BY score DESC LIMIT :window)
+    """,
+    "event": """
+        (SELECT 'event' AS type, ev.event_id AS id, ev.transaction_id AS transaction_id,
+                ev.type AS title, left(ev.source_content, :snippet_length) AS snippet,
+                ts_rank(to_tsvector('simple', coalesce(ev.source_content, '')), q.tsq)
+                    + similarity(ev.source_content, :q) AS score
+         FROM event ev, q
+         WHERE to_tsvector('simple', coalesce(ev.source_content, '')) @@ q.tsq OR ev.source_content % :q
+         ORDER BY score DESC LIMIT :window)
+    """,
+}
+
+# SQLite stand-in: one FTS5 table holding every searchable document, kept in
+# sync with the base tables by triggers
+_FTS_TRIGGERS = {
+    "entity": (
+        "entity", "entity_id",
+        "'entity', NEW.entity_id, NULL, NEW.entity_name, coalesce(NEW.entity_name, '') || ' ' || coalesce(NEW.entity_address, '')",
+    ),
+    "transaction": (
+        "transaction", "transaction_id",
+        "'transaction', NEW.transaction_id, NEW.transaction_id, NEW.beneficiary, coalesce(NEW.beneficiary, '')",
+    ),
+    "party": (
+        "transaction_entity", "id",
+        "'party', NEW.id, NEW.transaction_id, NEW.type, coalesce(NEW.address, '')",
+    ),
+    "event": (
+        "event", "event_id",
+        "'event', NEW.event_id, NEW.transaction_id, NEW.type, coalesce(NEW.source_content, '')",
+    ),
+}
+
+
+def _fts_statements():
+    statements = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "type UNINDEXED, ref_id UNINDEXED, transaction_id UNINDEXED, title, body, tokenize='trigram')",
+        "DELETE FROM search_index",
+    ]
+    for search_type, (table, key, values) in _FTS_TRIGGERS.items():
+        statements.append(
+            f'INSERT INTO search_index (type, ref_id, transaction_id, title, body) '
+            f'SELECT {values.replace("NEW.", "")} FROM "{table}"'
+        )
+        delete = f"DELETE FROM search_index WHERE type = '{search_type}' AND ref_id = OLD.{key};"
+        insert = f"INSERT INTO search_index (type, ref_id, transaction_id, title, body) VALUES ({values});"
+        statements += [
+            f'CREATE TRIGGER IF NOT EXISTS search_index_{search_type}_ai AFTER INSERT ON "{table}" BEGIN {insert} END',
+            f'CREATE TRIGGER IF NOT EXISTS search_index_{search_type}_au AFTER UPDATE ON "{table}" BEGIN {delete} {insert} END',
+            f'CREATE TRIGGER IF NOT EXISTS search_index_{search_type}_ad AFTER DELETE ON "{table}" BEGIN {delete} END',
+        ]
+    return statements
+
+
+def ensure_fts_index(engine):
+    """
+    Build the SQLite FTS5 stand-in if it or its triggers are missing (SQLite
+    drops triggers along with their table, e.g. when a dev database is
+    reseeded or a migration recreates a table). Run at startup, not from a
+    request; does nothing on other databases. Returns whether it built it.
+    """
+    if engine.dialect.name != "sqlite":
+        return False
+    with engine.begin() as connection:
+        trigger_count = connection.execute(text(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'search_index_%'"
+        )).scalar()
+        if trigger_count == len(_FTS_TRIGGERS) * 3:
+            return False
+        for statement in _fts_statements():
+            connection.execute(text(statement))
+    return True
+
+
+def _fts_query(query):
+    # The trigram tokenizer only indexes terms of three or more characters;
+    # shorter ones (e.g. "77" in "Beneficiary 77") are applied as LIKE
+    # filters on the rows the indexed terms matched, or on every row when
+    # there are no indexed terms. Every term is quoted so user input can't
+    # inject FTS5 query syntax.
+    terms = re.findall(r"\w+", query)
+    match = " ".join(f'"{term}"' for term in terms if len(term) >= 3)
+    short_terms = [term for term in terms if len(term) < 3]
+    return match, short_terms
+
+
+def _search_sqlite(db, query, types, limit, offset):
+    match, short_terms = _fts_query(query)
+    if not match and not short_terms:
+        return []
+    type_placeholders = ", ".join(f":type_{i}" for i in range(len(types)))
+    short_filters = "".join(f" AND body LIKE :short_{i}" for i in range(len(short_terms)))
+    if match:
+        score, match_filter, order = "-bm25(search_index)", "search_index MATCH :match AND ", "bm25(search_index)"
+    else:
+        # Only short terms: a LIKE scan with nothing to rank by
+        score, match_filter, order = "0.0", "", "type, ref_id"
+    rows = db.execute(text(f"""
+        SELECT type, ref_id AS id, transaction_id, title, substr(body, 1, :snippet_length) AS snippet,
+               {score} AS score
+        FROM search_index
+        WHERE {match_filter}type IN ({type_placeholders}){short_filters}
+        ORDER BY {order} LIMIT :limit OFFSET :offset
+    """), {
+        "match": match,
+        "snippet_length": SNIPPET_LENGTH,
+        "limit": limit + 1,
+        "offset": offset,
+        **{f"type_{i}": search_type for i, search_type in enumerate(types)},
+        **{f"short_{i}": f"%{term}%" for i, term in enumerate(short_terms)},
+    })
+    return rows.fetchall()
+
+
+def _search_postgres(db, query, types, limit, offset):
+    branches = " UNION ALL ".join(_POSTGRES_BRANCHES[search_type] for search_type in types)
+    rows = db.execute(text(f"""
+        WITH q AS (SELECT websearch_to_tsquery('simple', :q) AS tsq)
+        SELECT type, id, transaction_id, title, snippet, score FROM ({branches}) hits
+        ORDER BY score DESC, type, id LIMIT :limit OFFSET :offset
+    """), {
+        "q": query,
+        "snippet_length": SNIPPET_LENGTH,
+        "window": offset + limit + 1,
+        "limit": limit + 1,
+        "offset": offset,
+    })
+    return rows.fetchall()
+
+
+def search(db, query, types=SEARCH_TYPES, limit=20, offset=0):
+    """
+    Ranked full-text and fuzzy search across entities, transaction
+    beneficiaries, transaction parties and event content.
+
+    Returns one page of hits. One extra row is fetched to tell whether another
+    page exists, which avoids counting every match.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        rows = _search_sqlite(db, query, types, limit, offset)
+    else:
+        rows = _search_postgres(db, query, types, limit, offset)
+
+    results = [{
+        "type": row.type,
+        "id": row.id,
+        "transaction_id": row.transaction_id,
+        "title": row.title,
+        "snippet": row.snippet,
+        "score": round(float(row.score), 4),
+    } for row in rows[:limit]]
+    return {
+        "query": query,
+        "limit": limit,
+        "offset": offset,
+        "has_more": len(rows) > limit,
+        "results": results,
+    }
@@ -0,0 +1,145 @@
+from sqlalchemy import text
+from sqlalchemy.orm import joinedload, selectinload
+
+from ..models.models import Transaction
+
+# The whole detail view in one statement: the transaction row plus its
+# entity, latest status, events, parties and goods, each nested as JSON by a
+# correlated subquery, so Postgres does a single round-trip. Timestamps inside the JSON
+# come back as ISO 8601 strings.
+_POSTGRES_AGGREGATE = text("""
+    SELECT t.transaction_id, t.entity_id, t.product_id, t.product_name, t.industry, t.amount,
+           t.currency, t.country, t.location, t.beneficiary, t.tenor, t.maturity_date, t.price,
+           t.created_at,
+           (SELECT json_build_object(
+                       'entity_id', e.entity_id, 'entity_name', e.entity_name,
+                       'entity_address', e.entity_address, 'country', e.country,
+                       'client_type', e.client_type, 'risk_rating', e.risk_rating)
+            FROM entity e WHERE e.entity_id = t.entity_id) AS entity,
+           (SELECT json_build_object('status', s.status, 'type', s.type, 'source', s.source)
+            FROM transaction_status s WHERE s.transaction_id = t.transaction_id) AS latest,
+           coalesce((SELECT json_agg(json_build_object(
+                       'event_id', ev.event_id, 'transaction_id', ev.transaction_id,
+                       'entity_id', ev.entity_id, 'source', ev.source,
+                       'source_content', ev.source_content, 'type', ev.type,
+                       'created_at', ev.created_at, 'status', ev.status)
+                       ORDER BY ev.created_at DESC, ev.event_id DESC)
+                     FROM event ev WHERE ev.transaction_id = t.transaction_id), '[]'::json) AS events,
+           coalesce((SELECT json_agg(json_build_object(
+                       'id', te.id, 'type', te.type, 'address', te.address, 'country', te.country)
+                       ORDER BY te.id)
+                     FROM transaction_entity te WHERE te.transaction_id = t.transaction_id), '[]'::json) AS parties,
+           coalesce((SELECT json_agg(json_build_object(
+                       'id', g.id, 'item_name', g.item_name, 'quantity', g.quantity, 'unit', g.unit)
+                       ORDER BY g.id)
+                     FROM transaction_goods g WHERE g.transaction_id = t.transaction_id), '[]'::json) AS goods
+    FROM transaction t
+    WHERE t.transaction_id = :transaction_id
+""")
+
+_ENTITY_FIELDS = ("entity_id", "entity_name", "entity_address", "country", "client_type", "risk_rating")
+_EVENT_FIELDS = ("event_id", "transaction_id", "entity_id", "source", "source_content", "type", "created_at", "status")
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def _load_postgres(db, transaction_id):
+    row = db.execute(_POSTGRES_AGGREGATE, {"transaction_id": transaction_id}).first()
+    if row is None:
+        return None
+    return row, row.entity, row.latest, row.events, row.parties, row.goods
+
+
+def _load_orm(db, transaction_id):
+    # Portable fallback: one query for the transaction, its entity and status, plus
+    # one IN query per collection
+    transaction = (
+        db.query(Transaction)
+        .options(
+            joinedload(Transaction.entity),
+            joinedload(Transaction.current_status),
+            selectinload(Transaction.events),
+            selectinload(Transaction.transaction_entities),
+            selectinload(Transaction.transaction_goods),
+        )
+        .filter(Transaction.transaction_id == transaction_id)
+        .first()
+    )
+    if transaction is None:
+        return None
+    entity = transaction.entity
+    latest = transaction.current_status
+    events = sorted(transaction.events, key=lambda event: (event.created_at, event.event_id), reverse=True)
+    return (
+        transaction,
+        {field: getattr(entity, field) for field in _ENTITY_FIELDS} if entity else None,
+        {"status": latest.status, "type": latest.type, "source": latest.source} if latest else None,
+        [
+            {**{field: getattr(event, field) for field in _EVENT_FIELDS}, "created_at": _isoformat(event.created_at)}
+            for event in events
+        ],
+        [
+            {"id": party.id, "type": party.type, "address": party.address, "country": party.country}
+            for party in sorted(transaction.transaction_entities, key=lambda party: party.id)
+        ],
+        [
+            {"id": good.id, "item_name": good.item_name, "quantity": good.quantity, "unit": good.unit}
+            for good in sorted(transaction.transaction_goods, key=lambda good: good.id)
+        ],
+    )
+
+
+def get_transaction_aggregate(db, transaction_id):
+    """
+    Everything the transaction detail view needs, or None if the transaction
+    doesn't exist: the fields of /api/transactions/{id}, the parties and goods
+    of /api/transactions/{id}/details, and the real goods as goods_list.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        loaded = _load_postgres(db, transaction_id)
+    else:
+        loaded = _load_orm(db, transaction_id)
+    if loaded is None:
+        return None
+    transaction, entity, latest, events, parties, goods = loaded
+    entity = entity or {}
+
+    goods_data = [
+        {"id": good["id"], "name": good["item_name"], "quantity": good["quantity"], "unit": good["unit"]}
+        for good in goods
+    ]
+    parties_data = [{**party, "name": f"{party['type']} Entity"} for party in parties]
+
+    return {
+        "id": transaction.transaction_id,
+        "transaction_id": transaction.transaction_id,
+        "entity_id": transaction.entity_id,
+        "product_id": transaction.product_id,
+        "product_name": transaction.product_name,
+        "industry": transaction.industry,
+        "amount": float(transaction.amount) if transaction.amount else None,
+        "currency": transaction.currency,
+        "country": transaction.country,
+        "location": transaction.location,
+        "beneficiary": transaction.beneficiary,
+        "tenor": transaction.tenor,
+        "maturity_date": _isoformat(transaction.maturity_date),
+        "price": float(transaction.price) if transaction.price else None,
+        "created_at": _isoformat(transaction.created_at),
+        "reference_number": f"TXN-{transaction.transaction_id:05d}",
+        "client_name": entity.get("entity_name", ""),
+        "client_type": entity.get("client_type", ""),
+        "client_country": entity.get("country", ""),
+        "client_address": entity.get("entity_address", ""),
+        "risk_rating": entity.get("risk_rating", ""),
+        "status": latest["status"] if latest else "Pending Review",
+        "type": latest["type"] if latest else "Request",
+        "source": latest["source"] if latest else "System",
+        "goods_list": goods_data,
+        "goods": goods_data,
+        "entity": entity,
+        "entities": parties_data,
+        "events": events,
+    }
@@ -0,0 +1,107 @@
+from sqlalchemy import text
+
+# transaction_status holds the latest event's status, type, source and time
+# for each transaction. A trigger on event keeps it current as events are
+# inserted (events only ever leave the table by being archived, and archived
+# events are older than any left behind, so inserts are all that can move a
+# transaction's latest event). "Latest" is the greatest (created_at, event_id),
+# the same order the API lists events in.
+
+# Flags raised by the near-duplicate check (src/duplicates) are events on the
+# transactions they concern, but say nothing of where a transaction stands:
+# events of this type never become its status
+DUPLICATE_EVENT_TYPE = "Duplicate Check"
+
+_POSTGRES_TRIGGER = [
+    f"""
+    CREATE OR REPLACE FUNCTION refresh_transaction_status() RETURNS trigger AS $$
+    BEGIN
+        IF NEW.transaction_id IS NOT NULL AND NEW.type IS DISTINCT FROM '{DUPLICATE_EVENT_TYPE}' THEN
+            INSERT INTO transaction_status (transaction_id, event_id, status, type, source, event_created_at)
+            VALUES (NEW.transaction_id, NEW.event_id, NEW.status, NEW.type, NEW.source, NEW.created_at)
+            ON CONFLICT (transaction_id) DO UPDATE SET
+                event_id = EXCLUDED.event_id,
+                status = EXCLUDED.status,
+                type = EXCLUDED.type,
+                source = EXCLUDED.source,
+                event_created_at = EXCLUDED.event_created_at
+            WHERE (transaction_status.event_created_at, transaction_status.event_id)
+                  <= (EXCLUDED.event_created_at, EXCLUDED.event_id);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS event_transaction_status ON event",
+    """
+    CREATE TRIGGER event_transaction_status AFTER INSERT ON event
+    FOR EACH ROW EXECUTE FUNCTION refresh_transaction_status()
+    """,
+]
+
+_SQLITE_TRIGGER = [
+    "DROP TRIGGER IF EXISTS event_transaction_status",
+    f"""
+    CREATE TRIGGER event_transaction_status AFTER INSERT ON event
+    WHEN NEW.transaction_id IS NOT NULL AND NEW.type IS NOT '{DUPLICATE_EVENT_TYPE}'
+    BEGIN
+        INSERT INTO transaction_status (transaction_id, event_id, status, type, source, event_created_at)
+        VALUES (NEW.transaction_id, NEW.event_id, NEW.status, NEW.type, NEW.source, NEW.created_at)
+        ON CONFLICT (transaction_id) DO UPDATE SET
+            event_id = excluded.event_id,
+            status = excluded.status,
+            type = excluded.type,
+            source = excluded.source,
+            event_created_at = excluded.event_created_at
+        WHERE (transaction_status.event_created_at, transaction_status.event_id)
+              <= (excluded.event_created_at, excluded.event_id);
+    END
+    """,
+]
+
+# Rebuilds upsert rather than truncate, so transactions whose events have all
+# been archived keep their last known status
+_UPSERT = """
+    INSERT INTO transaction_status (transaction_id, event_id, status, type, source, event_created_at)
+    {select}
+    ON CONFLICT (transaction_id) DO UPDATE SET
+        event_id = excluded.event_id,
+        status = excluded.status,
+        type = excluded.type,
+        source = excluded.source,
+        event_created_at = excluded.event_created_at
+"""
+
+_POSTGRES_LATEST = f"""
+    SELECT DISTINCT ON (transaction_id) transaction_id, event_id, status, type, source, created_at
+    FROM event
+    WHERE transaction_id IS NOT NULL AND type IS DISTINCT FROM '{DUPLICATE_EVENT_TYPE}'
+    ORDER BY transaction_id, created_at DESC, event_id DESC
+"""
+
+# SQLite has no DISTINCT ON. The WHERE true keeps the upsert's ON CONFLICT
+# from being parsed as a join constraint.
+_SQLITE_LATEST = f"""
+    SELECT transaction_id, event_id, status, type, source, created_at FROM (
+        SELECT transaction_id, event_id, status, type, source, created_at,
+               row_number() OVER (PARTITION BY transaction_id ORDER BY created_at DESC, event_id DESC) AS position
+        FROM event
+        WHERE transaction_id IS NOT NULL AND type IS NOT '{DUPLICATE_EVENT_TYPE}'
+    ) WHERE position = 1 AND true
+"""
+
+
+def install_status_trigger(connection):
+    """Create (or replace) the trigger that maintains transaction_status on event inserts."""
+    statements = _POSTGRES_TRIGGER if connection.dialect.name == "postgresql" else _SQLITE_TRIGGER
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+def rebuild_transaction_status(connection):
+    """
+    Recompute every transaction's latest event from the event table and
+    return the number of transactions written.
+    """
+    latest = _POSTGRES_LATEST if connection.dialect.name == "postgresql" else _SQLITE_LATEST
+    return connection.execute(text(_UPSERT.format(select=latest))).rowcount
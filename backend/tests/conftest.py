@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+# Add the backend directory to the path so the tests can import src, and keep
+# src.database from pointing at a real server when DATABASE_URL isn't set
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.database.database import Base
+import src.models.models  # noqa: F401 (registers the tables)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
@@ -0,0 +1,134 @@
+import asyncio
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from src.api import admission
+from src.api.admission import AdmissionControlMiddleware, Limiter, Rejected
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_slots_are_handed_to_waiters_in_arrival_order():
+    async def scenario():
+        limiter = Limiter("test", limit=1, queue_size=5, timeout=1)
+        assert await limiter.acquire() == 0.0
+        order = []
+
+        async def wait(name):
+            await limiter.acquire()
+            order.append(name)
+
+        waiters = [asyncio.create_task(wait(name)) for name in ("first", "second")]
+        await asyncio.sleep(0)
+        assert limiter.active == 1 and len(limiter.waiters) == 2
+
+        limiter.release(0.1)
+        await asyncio.sleep(0.01)
+        assert order == ["first"]
+        limiter.release(0.1)
+        await asyncio.gather(*waiters)
+        assert order == ["first", "second"]
+        # The slot was passed on, never given back in between
+        assert limiter.active == 1
+
+    run(scenario())
+
+
+def test_a_full_queue_rejects_at_once():
+    async def scenario():
+        limiter = Limiter("test", limit=1, queue_size=1, timeout=1)
+        await limiter.acquire()
+        waiting = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(Rejected) as raised:
+            await limiter.acquire()
+        assert raised.value.reason == "queue_full"
+        waiting.cancel()
+
+    run(scenario())
+
+
+def test_a_timed_out_waiter_leaves_the_queue():
+    async def scenario():
+        limiter = Limiter("test", limit=1, queue_size=5, timeout=0.01)
+        await limiter.acquire()
+        with pytest.raises(Rejected) as raised:
+            await limiter.acquire()
+        assert raised.value.reason == "timeout"
+        assert not limiter.waiters
+        limiter.release(0.1)
+        assert limiter.active == 0
+
+    run(scenario())
+
+
+def test_a_slot_handed_to_a_cancelled_waiter_moves_on():
+    async def scenario():
+        limiter = Limiter("test", limit=1, queue_size=5, timeout=1)
+        await limiter.acquire()
+        cancelled = asyncio.create_task(limiter.acquire())
+        next_in_line = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+
+        # The client goes away in the same tick its slot is handed over
+        limiter.release(0.1)
+        cancelled.cancel()
+        await asyncio.sleep(0.01)
+        if cancelled.cancelled():
+            # The slot moved on to the next waiter
+            await asyncio.wait_for(next_in_line, 1)
+        else:
+            # Some Pythons' wait_for keeps a result over a late cancellation:
+            # the request holds the slot and releases it when done
+            assert not next_in_line.done()
+            limiter.release(0.1)
+            await asyncio.wait_for(next_in_line, 1)
+        assert limiter.active == 1
+        limiter.release(0.1)
+        assert limiter.active == 0
+
+    run(scenario())
+
+
+def test_retry_after_is_bounded():
+    limiter = Limiter("test", limit=2, queue_size=100, timeout=1)
+    assert limiter.retry_after() == admission.RETRY_AFTER_MIN_SECONDS
+    limiter.average_hold = 0.01
+    assert limiter.retry_after() == admission.RETRY_AFTER_MIN_SECONDS
+    limiter.average_hold = 1000
+    assert limiter.retry_after() == admission.RETRY_AFTER_MAX_SECONDS
+
+
+def test_the_route_limiter_answers_429_and_the_class_limiter_503(monkeypatch):
+    monkeypatch.setattr(admission, "ADMISSION_ROUTE_CONCURRENCY", 1)
+    monkeypatch.setattr(admission, "ADMISSION_ROUTE_QUEUE", 0)
+    monkeypatch.setattr(admission, "ADMISSION_CLASSES", {"heavy": (1, 0, 1), "light": (10, 10, 1)})
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def slow(request):
+            await release.wait()
+            return PlainTextResponse("done")
+
+        app = Starlette(routes=[Route("/api/search", slow), Route("/api/events", slow)])
+        app.add_middleware(AdmissionControlMiddleware)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            held = asyncio.create_task(client.get("/api/search"))
+            await asyncio.sleep(0.05)
+            same_route = await client.get("/api/search")
+            other_heavy_route = await client.get("/api/events")
+            release.set()
+            assert (await held).status_code == 200
+
+        assert same_route.status_code == 429
+        assert other_heavy_route.status_code == 503
+        assert int(same_route.headers["retry-after"]) >= admission.RETRY_AFTER_MIN_SECONDS
+
+    run(scenario())
@@ -0,0 +1,77 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from src.archive import archive
+from src.archive.archive import (
+    add_months, cold_partitions, hot_window_start, month_start, partition_bounds, partition_name,
+)
+
+
+@pytest.mark.parametrize("month, count, expected", [
+    (date(2026, 1, 1), 1, date(2026, 2, 1)),
+    (date(2026, 11, 1), 2, date(2027, 1, 1)),
+    (date(2026, 12, 1), 1, date(2027, 1, 1)),
+    (date(2026, 1, 1), -1, date(2025, 12, 1)),
+    (date(2026, 3, 1), -14, date(2025, 1, 1)),
+    (date(2026, 3, 1), 0, date(2026, 3, 1)),
+])
+def test_add_months(month, count, expected):
+    assert add_months(month, count) == expected
+
+
+def test_partition_name_and_bounds():
+    assert month_start(datetime(2026, 12, 31, 23, 59)) == date(2026, 12, 1)
+    assert partition_name(date(2026, 3, 1)) == "event_2026_03"
+    # From the first of the month up to, not including, the first of the next
+    assert partition_bounds(date(2026, 12, 1)) == "FOR VALUES FROM ('2026-12-01') TO ('2027-01-01')"
+
+
+def test_hot_window_includes_the_current_month():
+    assert hot_window_start(1, today=date(2026, 10, 19)) == date(2026, 10, 1)
+    assert hot_window_start(12, today=date(2026, 10, 19)) == date(2025, 11, 1)
+
+
+def test_cold_partitions_lie_wholly_before_the_hot_window(monkeypatch):
+    months = [date(2025, 9, 1), date(2025, 10, 1), date(2025, 11, 1), date(2026, 10, 1)]
+    monkeypatch.setattr(archive, "list_event_partitions",
+                        lambda connection: [(partition_name(month), month) for month in months])
+    assert cold_partitions(None, hot_months=12, today=date(2026, 10, 19)) == [
+        ("event_2025_09", date(2025, 9, 1)), ("event_2025_10", date(2025, 10, 1)),
+    ]
+
+
+def test_archived_events_are_read_newest_first_one_row_group_at_a_time(tmp_path, monkeypatch):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    monkeypatch.setattr(archive, "EVENT_ARCHIVE_DIR", str(tmp_path))
+    schema = archive._event_schema(pa)
+    started = datetime(2025, 1, 1)
+    for month in (1, 2):
+        # Written oldest first in row groups of 3, as export_partition does
+        rows = [(month * 100 + i, started.replace(month=month) + timedelta(hours=i)) for i in range(7)]
+        with pq.ParquetWriter(archive.archive_path(date(2025, month, 1)), schema) as writer:
+            for start in range(0, len(rows), 3):
+                batch = rows[start:start + 3]
+                writer.write_batch(pa.RecordBatch.from_pydict({
+                    "event_id": [event_id for event_id, _ in batch],
+                    "created_at": [created_at for _, created_at in batch],
+                    **{name: [None] * len(batch) for name in archive.EVENT_COLUMNS
+                       if name not in ("event_id", "created_at")},
+                }, schema=schema))
+
+    batches = list(archive.read_archived_events(["event_id", "created_at"]))
+    assert [len(rows) for rows in batches] == [1, 3, 3, 1, 3, 3]
+    event_ids = [row["event_id"] for rows in batches for row in rows]
+    assert event_ids == [206, 205, 204, 203, 202, 201, 200, 106, 105, 104, 103, 102, 101, 100]
+    assert set(batches[0][0]) == {"event_id", "created_at"}
+
+
+def test_the_hot_window_applies_only_to_a_partitioned_event_table(engine, monkeypatch):
+    monkeypatch.setattr(archive, "_event_partitioned", None)
+    with engine.connect() as connection:
+        # Nothing is archived out of an unpartitioned table: every event is read
+        assert archive.event_read_window(connection) is None
+    monkeypatch.setattr(archive, "_event_partitioned", True)
+    assert archive.event_read_window(None) == hot_window_start()
+    assert archive.event_read_window(None, include_history=True) is None
@@ -0,0 +1,86 @@
+from datetime import datetime
+
+import numpy as np
+
+from src.duplicates.detector import (
+    TransactionRecord, _load_records, _record_pairs, band_buckets, check_transactions, duplicates_of, features,
+    is_duplicate, minhash, similarity, SIGNATURE_BANDS, SIGNATURE_LENGTH,
+)
+from src.models.models import Event, Transaction, Transaction_Status
+from src.transactions.status import DUPLICATE_EVENT_TYPE, rebuild_transaction_status
+
+
+def _record(transaction_id, beneficiary="Hamburg Steel Trading GmbH", amount=250_000.0, currency="EUR",
+            maturity_date=datetime(2027, 3, 1), goods=("hot rolled steel coils",)):
+    return TransactionRecord(transaction_id, 7, 3, beneficiary, amount, currency, maturity_date, goods)
+
+
+def test_features_ignore_case_accents_punctuation_and_legal_suffixes():
+    assert features(_record(1, "Hamburg Steel Trading GmbH")) == features(_record(2, "HAMBURG STEEL TRADING G.m.b.H."))
+    assert features(_record(1, "Société Générale Ltd")) == features(_record(2, "societe generale"))
+
+
+def test_minhash_estimates_jaccard_similarity():
+    first = {f"f{i}" for i in range(100)}
+    second = {f"f{i}" for i in range(50, 150)}  # Jaccard similarity 1/3
+    estimate = similarity(minhash(first), minhash(second))
+    assert abs(estimate - 1 / 3) < 0.15
+    assert similarity(minhash(first), minhash(set(first))) == 1.0
+    assert minhash(set()) is None
+
+
+def test_signatures_and_buckets_are_deterministic():
+    signature = minhash(features(_record(1)))
+    assert signature.shape == (SIGNATURE_LENGTH,) and signature.dtype == np.uint32
+    assert np.array_equal(signature, minhash(features(_record(2))))
+    buckets = band_buckets(signature)
+    assert [band for band, _ in buckets] == list(range(SIGNATURE_BANDS))
+    assert buckets == band_buckets(signature.copy())
+
+
+def test_is_duplicate_requires_what_a_resubmission_cant_change():
+    older = _record(1)
+    assert is_duplicate(_record(2, amount=251_000.0), older, 0.9)
+    assert not is_duplicate(_record(2), older, 0.5)
+    assert not is_duplicate(_record(2, currency="USD"), older, 0.9)
+    assert not is_duplicate(_record(2, amount=300_000.0), older, 0.9)
+    assert not is_duplicate(_record(2, maturity_date=datetime(2027, 6, 1)), older, 0.9)
+    assert not is_duplicate(_record(2, beneficiary="Hamburg Steel Trading Unit 5"),
+                            _record(1, beneficiary="Hamburg Steel Trading Unit 6"), 0.9)
+
+
+def _add_transaction(db, transaction_id, beneficiary, amount, currency="EUR"):
+    db.add(Transaction(transaction_id=transaction_id, entity_id=None, product_id=3, beneficiary=beneficiary,
+                       amount=amount, currency=currency, maturity_date=datetime(2027, 3, 1)))
+    db.add(Event(transaction_id=transaction_id, type="Request", status="Booked", created_at=datetime(2026, 1, 1)))
+
+
+def test_check_transactions_flags_pairs_without_touching_the_status(db):
+    _add_transaction(db, 1, "Hamburg Steel Trading GmbH", 250_000.0)
+    _add_transaction(db, 2, "Lagos Cocoa Exporters Ltd", 80_000.0, "USD")
+    db.commit()
+    assert check_transactions(db)["flagged"] == 0
+
+    _add_transaction(db, 3, "HAMBURG STEEL TRADING G.M.B.H.", 250_500.0)
+    db.commit()
+    result = check_transactions(db)
+    assert result["checked"] == 1
+    assert [(pair["transaction_id"], pair["duplicate_of"]) for pair in result["pairs"]] == [(3, 1)]
+    assert result["recorded"] == 1
+    # Both transactions list the pair
+    for transaction_id in (1, 3):
+        flags = duplicates_of(db, transaction_id)
+        assert [(flag["transaction_id"], flag["duplicate_of"]) for flag in flags] == [(3, 1)]
+        assert flags[0]["similarity"] == round(result["pairs"][0]["similarity"], 2)
+    assert db.query(Event).filter(Event.type == DUPLICATE_EVENT_TYPE).count() == 2
+
+    # The flags are the latest events, but the current status stays the latest other event's
+    assert {status.status for status in db.query(Transaction_Status)} == {"Booked"}
+    # Checked transactions are skipped, and a pair is recorded once
+    assert check_transactions(db, [1, 2, 3])["checked"] == 0
+    records = _load_records(db, [1, 3])
+    assert _record_pairs(db, [(records[3], records[1], 0.9)]) == 0
+
+    # Nor does a rebuild pick the flags up
+    rebuild_transaction_status(db.connection())
+    assert {status.status for status in db.query(Transaction_Status)} == {"Booked"}
@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.api.fields import (
+    EVENT_FIELDS, TRANSACTION_FIELDS, FieldError, archived_event_columns, format_rows, parse_fields, select_columns,
+)
+
+
+def test_parse_fields_defaults_to_every_field():
+    assert parse_fields("transactions", None, TRANSACTION_FIELDS) == list(TRANSACTION_FIELDS)
+    assert parse_fields("transactions", " , ", TRANSACTION_FIELDS) == list(TRANSACTION_FIELDS)
+
+
+def test_parse_fields_keeps_the_available_order_and_drops_repeats():
+    names = parse_fields("transactions", " status,id ,amount,id", TRANSACTION_FIELDS)
+    assert names == ["id", "amount", "status"]
+
+
+def test_parse_fields_rejects_unknown_names():
+    with pytest.raises(FieldError) as raised:
+        parse_fields("transactions", "id,event_type,client", TRANSACTION_FIELDS)
+    assert "client, event_type" in str(raised.value)
+
+
+def test_select_columns_reads_shared_columns_once():
+    # id, reference_number and transaction_id all come from transaction_id
+    columns = select_columns(TRANSACTION_FIELDS, ["id", "reference_number", "transaction_id", "client_id"])
+    assert [column.key for column in columns] == ["transaction_id", "entity_id"]
+
+
+def test_format_rows_returns_only_the_requested_fields():
+    row = SimpleNamespace(transaction_id=7, entity_id=3, amount=None, status_transaction_id=None, status=None)
+    assert format_rows([row], TRANSACTION_FIELDS, ["reference_number", "client_id", "amount", "status"], None) == [
+        {"reference_number": "TXN-00007", "client_id": 3, "amount": None, "status": "Pending Review"},
+    ]
+
+
+def test_archived_event_columns():
+    assert archived_event_columns(["created_at", "status"]) == ["created_at", "status"]
+    # The transaction is looked up by id, and the entity comes from the reference data
+    assert archived_event_columns(["transaction", "entity"]) == ["entity_id", "transaction_id"]
+    assert set(archived_event_columns(list(EVENT_FIELDS))) == {
+        "event_id", "transaction_id", "entity_id", "source", "source_content", "type", "created_at", "status",
+    }
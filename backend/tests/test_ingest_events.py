@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from src.ingest import events
+from src.ingest.events import EventIn, content_key, ingest_events
+from src.models.models import Event, Event_Idempotency_Key, Transaction
+
+
+def _statuses(results):
+    return [result["status"] for result in results]
+
+
+def test_created_at_is_stored_as_naive_utc():
+    event = EventIn(transaction_id=1, created_at="2026-01-01T12:00:00+02:00")
+    assert event.created_at == datetime(2026, 1, 1, 10, 0)
+    assert event.created_at.tzinfo is None
+
+
+def test_content_key_is_the_same_for_the_same_instant_in_any_offset():
+    local = EventIn(transaction_id=1, status="Booked", created_at="2026-01-01T12:00:00+02:00")
+    utc = EventIn(transaction_id=1, status="Booked", created_at="2026-01-01T10:00:00Z")
+    naive = EventIn(transaction_id=1, status="Booked", created_at="2026-01-01T10:00:00")
+    assert content_key(local) == content_key(utc) == content_key(naive)
+
+
+def test_content_key_depends_on_the_content():
+    booked = EventIn(transaction_id=1, status="Booked")
+    assert content_key(booked) == content_key(EventIn(transaction_id=1, status="Booked"))
+    assert content_key(booked) != content_key(EventIn(transaction_id=1, status="Closed"))
+    assert content_key(booked) != content_key(EventIn(transaction_id=2, status="Booked"))
+
+
+def test_retried_batch_inserts_nothing_twice(db):
+    db.add(Transaction(transaction_id=1))
+    db.commit()
+    batch = [
+        {"transaction_id": 1, "status": "Booked", "idempotency_key": "swift-1"},
+        {"transaction_id": 1, "status": "Booked", "created_at": "2026-01-01T10:00:00"},
+        {"transaction_id": 1, "status": "Closed"},
+        {"transaction_id": 99, "status": "Booked"},
+    ]
+
+    first = ingest_events(db, batch)
+    assert _statuses(first) == ["inserted", "inserted", "inserted", "rejected"]
+    retry = ingest_events(db, batch)
+    assert _statuses(retry) == ["duplicate", "duplicate", "duplicate", "rejected"]
+    assert [result["event_id"] for result in retry[:3]] == [result["event_id"] for result in first[:3]]
+    assert db.query(Event).count() == 3
+
+
+def test_content_keys_without_created_at_expire(db):
+    db.add(Transaction(transaction_id=1))
+    db.commit()
+    booked = {"transaction_id": 1, "status": "Booked"}
+    stamped = {"transaction_id": 1, "status": "Booked", "created_at": "2026-01-01T10:00:00"}
+    assert _statuses(ingest_events(db, [booked, stamped])) == ["inserted", "inserted"]
+
+    # The same event sent again after the retry window is a new event; one
+    # with its own created_at is still the same event
+    db.execute(update(Event_Idempotency_Key).values(
+        created_at=datetime.utcnow() - timedelta(seconds=events.CONTENT_KEY_WINDOW_SECONDS + 60)
+    ))
+    db.commit()
+    assert _statuses(ingest_events(db, [booked, stamped])) == ["inserted", "duplicate"]
+    assert _statuses(ingest_events(db, [booked])) == ["duplicate"]
+    assert db.query(Event).count() == 3
@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+from src.jobs import worker
+from src.jobs.queue import DatabaseJobQueue, InMemoryJobQueue
+
+
+def _merge(queued, payload):
+    return {"ids": sorted(set(queued["ids"]) | set(payload["ids"]))}
+
+
+@pytest.fixture(params=["database", "memory"])
+def queue(request, engine):
+    return DatabaseJobQueue(engine) if request.param == "database" else InMemoryJobQueue()
+
+
+def test_unique_key_merges_into_the_queued_job(queue):
+    first = queue.enqueue("check", {"ids": [1, 2]}, unique_key="check", merge=_merge)
+    assert queue.enqueue("check", {"ids": [2, 3]}, unique_key="check", merge=_merge) == first
+    assert queue.get(first)["payload"] == {"ids": [1, 2, 3]}
+    # Jobs without the key are never merged
+    assert queue.enqueue("check", {"ids": [4]}) != first
+
+
+def test_unique_key_starts_a_new_job_once_the_queued_one_runs(queue):
+    first = queue.enqueue("check", {"ids": [1]}, unique_key="check", merge=_merge)
+    assert queue.claim("worker-1")["id"] == first
+    second = queue.enqueue("check", {"ids": [2]}, unique_key="check", merge=_merge)
+    assert second != first
+    assert queue.get(second)["payload"] == {"ids": [2]}
+
+
+def test_heartbeat_survives_a_failed_renewal(monkeypatch):
+    class FlakyQueue:
+        def __init__(self):
+            self.beats = 0
+
+        def heartbeat(self, job_id, worker_id):
+            self.beats += 1
+            if self.beats == 1:
+                raise RuntimeError("connection reset")
+            if self.beats == 3:
+                done.set()
+            return True
+
+    monkeypatch.setattr(worker, "JOB_LEASE_SECONDS", 0.03)
+    queue = FlakyQueue()
+    done = threading.Event()
+    thread = threading.Thread(target=worker._heartbeat, args=(queue, "worker-1", 1, done))
+    thread.start()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert queue.beats == 3
@@ -0,0 +1,32 @@
+from src.instrumentation import metrics
+from src.instrumentation.metrics import MetricsRegistry, collect, mark_process_dead, write_state
+
+
+def _worker(tmp_path, monkeypatch, pid, requests, in_flight, latency):
+    registry = MetricsRegistry()
+    registry.counter("requests_total", "Requests", ("route",)).inc(requests, route="/api/events")
+    registry.gauge("in_flight", "Requests in flight").set(in_flight)
+    registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0)).observe(latency)
+    monkeypatch.setattr(metrics, "registry", registry)
+    write_state(str(tmp_path), pid=pid)
+
+
+def test_workers_metrics_are_merged(tmp_path, monkeypatch):
+    _worker(tmp_path, monkeypatch, 101, requests=3, in_flight=2, latency=0.05)
+    _worker(tmp_path, monkeypatch, 102, requests=4, in_flight=1, latency=0.5)
+
+    rendered = collect(str(tmp_path)).render()
+    # Counters and histograms are summed, gauges kept per worker
+    assert 'requests_total{route="/api/events"} 7' in rendered
+    assert 'latency_seconds_bucket{le="0.1"} 1' in rendered
+    assert 'latency_seconds_bucket{le="1"} 2' in rendered
+    assert "latency_seconds_count 2" in rendered
+    assert 'in_flight{worker="101"} 2' in rendered
+    assert 'in_flight{worker="102"} 1' in rendered
+
+    # A stopped worker's counts stay in the totals, its gauges go
+    mark_process_dead(102, str(tmp_path))
+    rendered = collect(str(tmp_path)).render()
+    assert 'requests_total{route="/api/events"} 7' in rendered
+    assert 'in_flight{worker="101"} 2' in rendered
+    assert 'worker="102"' not in rendered
@@ -0,0 +1,72 @@
+import time
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from src.database import replicas
+from src.database.replicas import (
+    LAST_WRITE_COOKIE, LAST_WRITE_HEADER, LastWriteMiddleware, ReadRouter, Replica, get_read_db,
+)
+
+
+@pytest.fixture
+def router(tmp_path, monkeypatch):
+    router = ReadRouter([Replica(f"sqlite:///{tmp_path / name}.db") for name in ("first", "second")])
+    monkeypatch.setattr(replicas, "router", router)
+    yield router
+    for replica in router.replicas:
+        replica.engine.dispose()
+
+
+def _names(router, count, last_write=None):
+    engines = {replica.engine: replica.name for replica in router.replicas}
+    return [engines.get(router.engine(last_write), "primary") for _ in range(count)]
+
+
+def test_reads_go_round_robin_over_the_replicas(router):
+    first, second = (replica.name for replica in router.replicas)
+    assert _names(router, 4) == [first, second, first, second]
+
+
+def test_reads_fall_back_to_the_primary(router, monkeypatch):
+    first, second = router.replicas
+    first.mark_down(Exception("connection refused"))
+    assert _names(router, 2) == [second.name, second.name]
+
+    # Too far behind the primary
+    monkeypatch.setattr(replicas, "REPLICA_MAX_LAG_SECONDS", 30)
+    second.lag = 31
+    assert _names(router, 2) == ["primary", "primary"]
+    assert router.candidates() == ([], "replica_unavailable")
+
+
+def test_reads_after_a_write_go_to_the_primary(router, monkeypatch):
+    monkeypatch.setattr(replicas, "READ_AFTER_WRITE_SECONDS", 5)
+    app = FastAPI()
+
+    @app.get("/read")
+    def read(db=Depends(get_read_db)):
+        return {"database": db.get_bind().url.database}
+
+    @app.post("/write")
+    def write():
+        return {}
+
+    app.add_middleware(LastWriteMiddleware)
+    client = TestClient(app)
+    replica_databases = {replica.engine.url.database for replica in router.replicas}
+
+    assert client.get("/read").json()["database"] in replica_databases
+    response = client.post("/write")
+    assert LAST_WRITE_HEADER in response.headers and LAST_WRITE_COOKIE in client.cookies
+    # The cookie sends the client's next read to the primary
+    assert client.get("/read").json()["database"] not in replica_databases
+
+    # So does the header, for clients that don't keep cookies
+    client.cookies.clear()
+    headers = {LAST_WRITE_HEADER: response.headers[LAST_WRITE_HEADER]}
+    assert client.get("/read", headers=headers).json()["database"] not in replica_databases
+    # Once the window has passed, reads go back to the replicas
+    headers = {LAST_WRITE_HEADER: f"{time.time() - 60:.3f}"}
+    assert client.get("/read", headers=headers).json()["database"] in replica_databases
@@ -0,0 +1,54 @@
+import warnings
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text
+
+from src.risk import stress
+
+
+def test_stress_test_accepts_a_timezone_aware_as_of(engine):
+    with engine.begin() as connection:
+        connection.execute(text(
+            'INSERT INTO "transaction" (transaction_id, amount, currency, maturity_date) '
+            "VALUES (1, 100, 'USD', '2030-01-01 12:00:00')"
+        ))
+    stress.invalidate_book()
+    # 13:00 in UTC+2 is 11:00 UTC, before the transaction matures
+    as_of = datetime(2030, 1, 1, 13, tzinfo=timezone(timedelta(hours=2)))
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        result = stress.run_stress_test(engine, [], as_of=as_of)
+    assert result["as_of"] == "2030-01-01T11:00:00"
+    assert result["open_transactions"] == 1
+
+
+def test_the_stress_test_job_runs_scenarios_in_batches(engine, monkeypatch):
+    from src.jobs import handlers
+    from src.jobs.handlers import JOB_HANDLERS, PermanentJobError
+
+    with engine.begin() as connection:
+        connection.execute(text(
+            'INSERT INTO "transaction" (transaction_id, amount, currency, maturity_date) '
+            "VALUES (1, 100, 'EUR', '2030-01-01 12:00:00')"
+        ))
+    stress.invalidate_book()
+    monkeypatch.setattr(handlers, "engine", engine)
+    monkeypatch.setattr(handlers, "MAX_SCENARIOS", 2)
+    progress = []
+
+    class Context:
+        def report_progress(self, fraction, message=None):
+            progress.append(fraction)
+
+    scenarios = [{"name": f"EUR +{i}%", "shocks": [{"type": "fx", "currency": "EUR", "change": i / 100}]}
+                 for i in range(5)]
+    result = JOB_HANDLERS["stress_test"](Context(), {"scenarios": scenarios, "as_of": "2029-01-01T00:00:00"})
+    assert progress == [0.0, 0.4, 0.8]
+    assert [scenario["name"] for scenario in result["scenarios"]] == [scenario["name"] for scenario in scenarios]
+    assert result["open_transactions"] == 1
+    assert result["scenarios"][4]["exposure_change"] == round(100 * stress.FX_RATES["EUR"] * 0.04, 2)
+
+    for payload in ({"scenarios": []}, {"scenarios": scenarios, "group_by": "colour"}):
+        with pytest.raises(PermanentJobError):
+            JOB_HANDLERS["stress_test"](Context(), payload)
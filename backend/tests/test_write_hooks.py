@@ -0,0 +1,54 @@
+import pytest
+from sqlalchemy import text
+
+from src.instrumentation.writes import install_write_hooks, on_table_write, written_table
+from src.reference import snapshot
+from src.risk import stress
+
+
+@pytest.mark.parametrize("statement, table", [
+    ('INSERT INTO entity (entity_id) VALUES (1)', "entity"),
+    ('  update "transaction" SET amount = 1', "transaction"),
+    ('DELETE FROM Entity WHERE entity_id = 1', "entity"),
+    ('TRUNCATE TABLE transaction', "transaction"),
+    # A table whose name starts with another's is a different table
+    ('INSERT INTO transaction_status (transaction_id) VALUES (1)', "transaction_status"),
+    ('SELECT * FROM entity', None),
+    ('WITH moved AS (DELETE FROM entity RETURNING *) SELECT 1', None),
+])
+def test_written_table(statement, table):
+    assert written_table(statement) == table
+
+
+def test_writes_invalidate_the_registered_caches(engine):
+    install_write_hooks(engine)
+    written = []
+    on_table_write(["entity"], lambda: written.append("entity"))
+    book_version, reference_version = stress._book_version, snapshot._snapshot_version
+
+    with engine.begin() as connection:
+        connection.execute(text("SELECT count(*) FROM entity"))
+        connection.execute(text('INSERT INTO transaction_status (transaction_id) VALUES (1)'))
+    assert written == []
+    assert stress._book_version == book_version
+    assert snapshot._snapshot_version == reference_version
+
+    # Nothing happens until the write commits, and a rolled back write never counts
+    with engine.connect() as connection:
+        connection.execute(text("INSERT INTO entity (entity_id, entity_name) VALUES (1, 'Acme')"))
+        assert written == []
+        connection.rollback()
+        connection.execute(text("SELECT count(*) FROM entity"))
+        connection.commit()
+    assert written == []
+
+    with engine.connect() as connection:
+        connection.execute(text("INSERT INTO entity (entity_id, entity_name) VALUES (1, 'Acme')"))
+        connection.execute(text("UPDATE entity SET entity_name = 'Acme Ltd' WHERE entity_id = 1"))
+        assert written == []
+        connection.commit()
+    # Once per transaction
+    assert written == ["entity"]
+    assert stress._book_version == book_version + 1
+    assert snapshot._snapshot_version == reference_version + 1
+
@@ -0,0 +1,29 @@
+import os
+import sys
+import argparse
+
+# Add the backend directory to the path so we can import our models
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.database.database import engine
+from src.database.readiness import wait_for_database
+
+def wait_for_db(timeout):
+    """
+    Block until the database accepts connections, for at most `timeout`
+    seconds. Used by the container before running migrations.
+    """
+    print("Waiting for database to be ready...")
+    try:
+        waited = wait_for_database(engine, timeout)
+        print(f"Database ready after {waited:.1f}s.")
+
+    except Exception as e:
+        print(f"Database not ready after {timeout:.0f}s: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Wait until the database accepts connections.")
+    parser.add_argument("--timeout", type=float, default=float(os.getenv("DB_WAIT_TIMEOUT", "60")), help="Seconds to wait before giving up")
+    args = parser.parse_args()
+    wait_for_db(args.timeout)
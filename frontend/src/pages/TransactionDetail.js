@@ -2,7 +2,6 @@ import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 import { useParams, useNavigate, Link } from 'react-router-dom';
 import { MOCK_TRANSACTION_DATA } from '../data/mockTransactionData';
-import DashboardService from '../services/dashboardService';
 import { 
   normalizeTransaction, 
   normalizeGoodsList, 
@@ -162,41 +161,17 @@ const TransactionDetail = () => {
         const apiUrl = process.env.REACT_APP_API_URL || 'http://localhost:5000';
         
         try {
-          // Fetch transaction from the API
-          const response = await axios.get(`${apiUrl}/api/transactions/${id}`);
+          // Fetch the transaction with its entity, events, parties and goods in one request
+          const response = await axios.get(`${apiUrl}/api/transactions/${id}/aggregate`);
           const data = response.data;
           
           // Normalize the transaction data
           const normalizedData = normalizeTransaction(data);
           setTransaction(normalizedData);
           
-          // Fetch additional transaction details (entities and goods)
-          try {
-            const transactionDetails = await DashboardService.fetchTransactionDetails(id);
-            
-            // Set real entities from API response if available
-            if (transactionDetails.entities && transactionDetails.entities.length > 0) {
-              setEntities(transactionDetails.entities);
-            } else {
-              // Fall back to entities from the transaction response
-              setEntities(normalizedData.entities || []);
-            }
-            
-            // Set real trade goods from API response if available
-            if (transactionDetails.goods && transactionDetails.goods.length > 0) {
-              setTradeGoods(transactionDetails.goods);
-            } else {
-              // Fall back to goods from the transaction response
-              setTradeGoods(normalizedData.goods_list || []);
-            }
-            
-          } catch (detailsError) {
-            console.error('Error fetching transaction details:', detailsError);
-            // Fall back to entities from the transaction response
-            setEntities(normalizedData.entities || []);
-            // Fall back to goods from the transaction response
-            setTradeGoods(normalizedData.goods_list || []);
-          }
+          // Parties and trade goods come with the aggregate
+          setEntities(data.entities || []);
+          setTradeGoods(data.goods || []);
           
           // Initialize form data from transaction
           if (normalizedData) {
@@ -20,8 +20,10 @@ const Transactions = () => {
         let url = `${apiUrl}/api/transactions`;
         const params = new URLSearchParams();
         
+        // Every field the table below renders, by its backend name
+        params.append('fields', 'id,reference_number,client_id,product_id,type,amount,currency,status,created_at');
         if (filters.status) params.append('status', filters.status);
-        if (filters.eventType) params.append('event_type', filters.eventType);
+        if (filters.eventType) params.append('type', filters.eventType);
         
         if (params.toString()) {
           url += `?${params.toString()}`;
@@ -157,7 +159,7 @@ const Transactions = () => {
                   <td className="px-6 py-4 whitespace-nowrap text-sm font-medium text-gray-900">{transaction.reference_number}</td>
                   <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-500">{transaction.client_id}</td>
                   <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-500">{transaction.product_id}</td>
-                  <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-500">{transaction.event_type}</td>
+                  <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-500">{transaction.type}</td>
                   <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-500">{transaction.amount} {transaction.currency}</td>
                   <td className="px-6 py-4 whitespace-nowrap">
                     <span className={`px-2 inline-flex text-xs leading-5 font-semibold rounded-full ${getStatusClass(transaction.status)}`}>
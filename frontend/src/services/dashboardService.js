@@ -1,5 +1,10 @@
 import axios from 'axios';
 
+const DASHBOARD_TRANSACTION_FIELDS = [
+  'id', 'reference_number', 'client_id', 'client_name', 'client_type', 'product_name', 'industry',
+  'amount', 'currency', 'created_at', 'status', 'type', 'source',
+].join(',');
+
 // Dashboard data service
 const DashboardService = {
   // Get API URL from environment or default to localhost
@@ -10,41 +15,21 @@ const DashboardService = {
     try {
       const apiUrl = DashboardService.getApiUrl();
       
-      // Fetch data from the API endpoints
-      const [dashboardStatsRes, transactionsRes, eventsRes] = await Promise.all([
+      // Fetch data from the API endpoints, asking only for the transaction
+      // fields the dashboard table, tooltip and charts use
+      const [dashboardStatsRes, transactionsRes] = await Promise.all([
         axios.get(`${apiUrl}/api/dashboard/stats`),
-        axios.get(`${apiUrl}/api/transactions`),
-        axios.get(`${apiUrl}/api/events`)
+        axios.get(`${apiUrl}/api/transactions`, { params: { fields: DASHBOARD_TRANSACTION_FIELDS } })
       ]);
       
       // Extract dashboard stats
       const dashboardStats = dashboardStatsRes.data;
       
-      // Extract and process transactions
-      const transactionsData = transactionsRes.data.map(t => {
-        // Associate events with transactions to get status and type
-        const transactionEvents = eventsRes.data.filter(e => e.transaction_id === t.transaction_id);
-        let status = 'Pending Review'; // Default status
-        let type = 'Request'; // Default type
-        
-        // If there are events for this transaction, use the latest one's status and type
-        if (transactionEvents.length > 0) {
-          const latestEvent = transactionEvents.sort((a, b) => 
-            new Date(b.created_at) - new Date(a.created_at)
-          )[0];
-          
-          status = latestEvent.status;
-          type = latestEvent.type;
-        }
-        
-        return {
-          ...t,
-          status,
-          type,
-          source: transactionEvents.length > 0 ? transactionEvents[0].source : 'System',
-          goods_list: t.industry ? [t.industry] : [],
-        };
-      });
+      // Transactions come with the status, type and source of their latest event
+      const transactionsData = transactionsRes.data.map(t => ({
+        ...t,
+        goods_list: t.industry ? [t.industry] : [],
+      }));
       
       // Get 5 most recent transactions
       const recentTransactions = [...transactionsData]